@@ -0,0 +1,760 @@
+# ir2solve_backend.py
+# Solver backends: ModelIR -> backend model -> SolveOutcome
+#
+# - "gurobi": ir_to_gurobi + gurobipy (needs a license token per model)
+# - "highs":  pure-Python linear compiler + HiGHS via scipy.optimize.milp
+#             (license-free; linear objective/constraints only)
+#
+# Status codes in SolveOutcome always use Gurobi's numbering (GRB.OPTIMAL, ...)
+# so callers and traces do not depend on the backend that produced them.
+#
+# Gurobi models are created in environments leased from a process-wide
+# GurobiEnvPool (OutputFlag off, fixed Threads), so repeated solves do not pay
+# for environment startup and parallel workers do not each use every core.
+
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+from gurobipy import GRB
+
+from ir2solve_ir import (
+    BuildProfiler,
+    LazyVarBlock,
+    ModelIR,
+    VarBlock,
+    block_var_names,
+    build_param_env,
+    build_set_env,
+    compile_expr,
+    iter_constraint_rows,
+    ir_to_gurobi,
+    lazy_var_report,
+    make_eval_globals,
+    var_block_dims,
+)
+
+
+# -----------------------------------------------------------------------------
+# Results
+# -----------------------------------------------------------------------------
+INTEGRALITY_TOL = 1e-6  # relaxation values this close to an integer count as integral
+
+_STATUS_NAMES = {
+    GRB.OPTIMAL: "OPTIMAL",
+    GRB.INFEASIBLE: "INFEASIBLE",
+    GRB.UNBOUNDED: "UNBOUNDED",
+    GRB.INF_OR_UNBD: "INF_OR_UNBD",
+    GRB.TIME_LIMIT: "TIME_LIMIT",
+    GRB.INTERRUPTED: "INTERRUPTED",
+    GRB.SUBOPTIMAL: "SUBOPTIMAL",
+    GRB.NUMERIC: "NUMERIC",
+}
+
+
+def status_name(code: int) -> str:
+    return _STATUS_NAMES.get(code, str(code))
+
+
+@dataclass
+class SolveOutcome:
+    status: int  # Gurobi numbering
+    status_name: str
+    obj_value: Optional[float] = None  # set when status is OPTIMAL
+    sol_count: int = 0
+    runtime_sec: float = 0.0
+    solution: Optional[Dict[str, float]] = None  # var name -> value (want_solution=True)
+    start_vars: int = 0  # vars given a MIP start value (solve(start=...))
+
+
+@dataclass
+class BuiltModel:
+    backend: str
+    model: Any
+    build_info: Dict[str, Any] = field(default_factory=dict)
+    env: Any = None  # leased gp.Env (returned to env_pool on dispose)
+    env_pool: Optional["GurobiEnvPool"] = None
+
+
+class SolverBackend:
+    name: str = "?"
+
+    def build(
+        self,
+        ir: ModelIR,
+        build_mode: str = "expr",
+        build_info: Optional[Dict[str, Any]] = None,
+        profile: bool = False,
+        lazy_vars: bool = False,
+        expr_eval: str = "eval",
+    ) -> BuiltModel:
+        raise NotImplementedError
+
+    def solve(
+        self,
+        built: BuiltModel,
+        time_limit: float,
+        log: bool = True,
+        want_solution: bool = False,
+        start: Optional[Dict[str, float]] = None,
+    ) -> SolveOutcome:
+        """start: var name -> value, used as a MIP start where the backend supports it."""
+        raise NotImplementedError
+
+    def solve_relaxation(self, built: BuiltModel, time_limit: float, log: bool = False) -> Tuple[SolveOutcome, bool]:
+        """
+        Solve the continuous relaxation (integrality dropped). Returns
+        (outcome, integral) where integral is True when the relaxation is
+        OPTIMAL and its solution already satisfies integrality (so it is also
+        optimal for the original model). `built` itself is not modified.
+        """
+        raise NotImplementedError
+
+    def dispose(self, built: BuiltModel) -> None:
+        pass
+
+
+def _is_integral(values: Iterable[float], tol: float = INTEGRALITY_TOL) -> bool:
+    return all(abs(x - round(x)) <= tol for x in values)
+
+
+def _set_mip_start(m: Any, start: Dict[str, float]) -> int:
+    """
+    Set Var.Start from `start` (by VarName), projected onto the current bounds
+    and rounded for integer/binary vars. Vars not in `start` keep no start
+    value. No-op for continuous models. Returns the number of vars set.
+    """
+    m.update()
+    if not m.IsMIP:
+        return 0
+    n = 0
+    for v in m.getVars():
+        x = start.get(v.VarName)
+        if x is None:
+            continue
+        if v.VType != GRB.CONTINUOUS:
+            x = float(round(x))
+        x = min(max(float(x), v.LB), v.UB)
+        v.Start = x
+        n += 1
+    return n
+
+
+# -----------------------------------------------------------------------------
+# Gurobi environment pool
+# -----------------------------------------------------------------------------
+DEFAULT_ENV_POOL_SIZE = 2
+
+
+class GurobiEnvPool:
+    """
+    Bounded pool of started gp.Env objects with OutputFlag=0 and a fixed
+    Threads budget (0 = Gurobi default, i.e. all cores).
+
+    Environments are created lazily up to `size`; acquire() blocks when all
+    of them are leased. Each leased env holds one license token.
+    """
+
+    def __init__(self, size: int = DEFAULT_ENV_POOL_SIZE, threads: int = 0) -> None:
+        self.size = max(1, int(size))
+        self.threads = max(0, int(threads))
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._leases = 0
+        self._closed = False
+
+    def _new_env(self) -> Any:
+        import gurobipy as gp
+
+        env = gp.Env(empty=True)
+        env.setParam("OutputFlag", 0)
+        if self.threads > 0:
+            env.setParam("Threads", self.threads)
+        env.start()
+        return env
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        if self._closed:
+            raise RuntimeError("GurobiEnvPool is closed.")
+        try:
+            env = self._idle.get_nowait()
+        except queue.Empty:
+            env = None
+
+        if env is None:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    env = self._new_env()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    env = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Gurobi environment available within {timeout}s.") from None
+
+        with self._lock:
+            self._leases += 1
+        return env
+
+    def release(self, env: Any) -> None:
+        with self._lock:
+            self._leases -= 1
+        if self._closed:
+            env.dispose()
+            return
+        self._idle.put(env)
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        env = self.acquire(timeout=timeout)
+        try:
+            yield env
+        finally:
+            self.release(env)
+
+    def close(self) -> None:
+        """Dispose idle environments; envs still leased are disposed on release."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().dispose()
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.size, "threads": self.threads, "created": self._created, "leased": self._leases}
+
+
+_ENV_POOL: Optional[GurobiEnvPool] = None
+_ENV_POOL_LOCK = threading.Lock()
+
+
+def threads_per_worker(workers: int) -> int:
+    """Threads budget that lets `workers` concurrent solves share the cores."""
+    return max(1, (os.cpu_count() or 1) // max(1, int(workers)))
+
+
+def configure_env_pool(size: int = DEFAULT_ENV_POOL_SIZE, threads: int = 0) -> GurobiEnvPool:
+    """Return the shared pool, replacing it if size/threads changed."""
+    global _ENV_POOL
+    with _ENV_POOL_LOCK:
+        pool = _ENV_POOL
+        if pool is not None and pool.size == max(1, int(size)) and pool.threads == max(0, int(threads)):
+            return pool
+        if pool is not None:
+            pool.close()
+        _ENV_POOL = GurobiEnvPool(size=size, threads=threads)
+        return _ENV_POOL
+
+
+def get_env_pool() -> GurobiEnvPool:
+    """Shared process-wide pool (created with defaults on first use)."""
+    global _ENV_POOL
+    with _ENV_POOL_LOCK:
+        if _ENV_POOL is None:
+            _ENV_POOL = GurobiEnvPool()
+        return _ENV_POOL
+
+
+# -----------------------------------------------------------------------------
+# Gurobi
+# -----------------------------------------------------------------------------
+class GurobiBackend(SolverBackend):
+    name = "gurobi"
+
+    def __init__(self, env_pool: Optional[GurobiEnvPool] = None, model_cache: Optional[Any] = None) -> None:
+        # env_pool None -> the shared pool at build time (see configure_env_pool)
+        # model_cache: optional ir2solve_cache.ModelCache (compiled models as MPS)
+        self.env_pool = env_pool
+        self.model_cache = model_cache
+
+    def build(
+        self,
+        ir: ModelIR,
+        build_mode: str = "expr",
+        build_info: Optional[Dict[str, Any]] = None,
+        profile: bool = False,
+        lazy_vars: bool = False,
+        expr_eval: str = "eval",
+    ) -> BuiltModel:
+        info = build_info if build_info is not None else {}
+        pool = self.env_pool or get_env_pool()
+        env = pool.acquire()
+        try:
+            cache = self.model_cache
+            key = ""
+            if cache is not None:
+                from ir2solve_cache import ir_content_hash
+
+                key = ir_content_hash(ir, extra="lazy" if lazy_vars else "")
+                m = cache.load(key, env=env)
+                if m is not None:
+                    m.ModelName = ir.meta.problem_id or "ir2solve_model"
+                    info.update(
+                        {
+                            "build_mode": build_mode,
+                            "num_vars": int(m.NumVars),
+                            "num_constrs": int(m.NumConstrs),
+                            "model_cache": "hit",
+                        }
+                    )
+                    return BuiltModel(self.name, m, info, env=env, env_pool=pool)
+
+            m = ir_to_gurobi(
+                ir,
+                build_mode=build_mode,
+                build_info=info,
+                env=env,
+                profile=profile,
+                lazy_vars=lazy_vars,
+                expr_eval=expr_eval,
+            )
+            if cache is not None:
+                info["model_cache"] = "stored" if cache.store(key, m) else "store_failed"
+        except Exception:
+            pool.release(env)
+            raise
+        return BuiltModel(self.name, m, info, env=env, env_pool=pool)
+
+    def wrap(self, model: Any) -> BuiltModel:
+        """
+        Wrap an already-built gurobipy model (e.g. from llm2code). It was
+        created in the default environment, so it is copied into a leased
+        pool environment (OutputFlag off, the pool's Threads budget).
+        """
+        if model is None:
+            return BuiltModel(self.name, model)
+        pool = self.env_pool or get_env_pool()
+        env = pool.acquire()
+        try:
+            model.update()  # copy() leaves out pending changes
+            m = model.copy(env=env)
+        except Exception:
+            pool.release(env)
+            raise
+        finally:
+            model.dispose()
+        return BuiltModel(self.name, m, env=env, env_pool=pool)
+
+    def solve(
+        self,
+        built: BuiltModel,
+        time_limit: float,
+        log: bool = True,
+        want_solution: bool = False,
+        start: Optional[Dict[str, float]] = None,
+    ) -> SolveOutcome:
+        m = built.model
+        m.Params.OutputFlag = 1 if log else 0
+        m.setParam("TimeLimit", float(time_limit))
+        n_start = _set_mip_start(m, start) if start else 0
+        m.optimize()
+
+        st = int(m.Status)
+        out = SolveOutcome(status=st, status_name=status_name(st), runtime_sec=float(m.Runtime))
+        out.start_vars = n_start
+        out.sol_count = int(m.SolCount)
+        if st == GRB.OPTIMAL:
+            out.obj_value = float(m.ObjVal)
+        if want_solution and out.sol_count > 0:
+            out.solution = {v.VarName: float(v.X) for v in m.getVars()}
+        return out
+
+    def solve_relaxation(self, built: BuiltModel, time_limit: float, log: bool = False) -> Tuple[SolveOutcome, bool]:
+        m = built.model
+        m.update()
+        int_mask = [v.VType != GRB.CONTINUOUS for v in m.getVars()]
+        r = m.relax()
+        try:
+            r.Params.OutputFlag = 1 if log else 0
+            r.setParam("TimeLimit", float(time_limit))
+            r.optimize()
+            st = int(r.Status)
+            out = SolveOutcome(status=st, status_name=status_name(st), runtime_sec=float(r.Runtime))
+            out.sol_count = int(r.SolCount)
+            integral = False
+            if st == GRB.OPTIMAL:
+                out.obj_value = float(r.ObjVal)
+                xs = r.getAttr("X", r.getVars())
+                integral = _is_integral(x for x, is_int in zip(xs, int_mask) if is_int)
+        finally:
+            r.dispose()
+        return out, integral
+
+    def dispose(self, built: BuiltModel) -> None:
+        try:
+            built.model.dispose()
+        except Exception:
+            pass
+        if built.env is not None and built.env_pool is not None:
+            built.env_pool.release(built.env)
+            built.env = None
+
+
+# -----------------------------------------------------------------------------
+# Solver-free linear evaluation (HiGHS backend, IR presolve)
+# -----------------------------------------------------------------------------
+class LinExpr:
+    """
+    Minimal linear expression over column ids: sum(coeff * col) + const.
+    Anything nonlinear (expr * expr, expr / expr, ...) raises TypeError.
+    """
+
+    __slots__ = ("terms", "const")
+
+    def __init__(self, terms: Optional[Dict[int, float]] = None, const: float = 0.0) -> None:
+        self.terms = terms if terms is not None else {}
+        self.const = const
+
+    def copy(self) -> "LinExpr":
+        return LinExpr(dict(self.terms), self.const)
+
+    def _iadd(self, other: Any, scale: float = 1.0) -> "LinExpr":
+        # in place; only used on fresh expressions
+        if isinstance(other, LinExpr):
+            t = self.terms
+            for j, a in other.terms.items():
+                t[j] = t.get(j, 0.0) + scale * a
+            self.const += scale * other.const
+        elif isinstance(other, (int, float, np.number)):
+            self.const += scale * float(other)
+        else:
+            return NotImplemented
+        return self
+
+    def __add__(self, other: Any) -> "LinExpr":
+        return self.copy()._iadd(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Any) -> "LinExpr":
+        return self.copy()._iadd(other, -1.0)
+
+    def __rsub__(self, other: Any) -> "LinExpr":
+        return (-self)._iadd(other)
+
+    def __mul__(self, other: Any) -> "LinExpr":
+        if isinstance(other, LinExpr):
+            if other.terms and self.terms:
+                raise TypeError("only linear expressions are supported (got a product of variables).")
+            if not other.terms:
+                other = other.const
+            else:
+                return other * self.const
+        if not isinstance(other, (int, float, np.number)):
+            return NotImplemented
+        a = float(other)
+        return LinExpr({j: a * c for j, c in self.terms.items()}, a * self.const)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Any) -> "LinExpr":
+        if isinstance(other, LinExpr):
+            if other.terms:
+                raise TypeError("only linear expressions are supported (got division by a variable).")
+            other = other.const
+        if not isinstance(other, (int, float, np.number)):
+            return NotImplemented
+        return self * (1.0 / float(other))
+
+    def __neg__(self) -> "LinExpr":
+        return self * -1.0
+
+    def __pos__(self) -> "LinExpr":
+        return self
+
+
+def linear_quicksum(items: Iterable[Any]) -> LinExpr:
+    acc = LinExpr()
+    for it in items:
+        if acc._iadd(it) is NotImplemented:
+            raise TypeError(f"Cannot add {type(it).__name__} to a linear expression.")
+    return acc
+
+
+def as_linear(x: Any) -> LinExpr:
+    if isinstance(x, LinExpr):
+        return x
+    if isinstance(x, (int, float, np.number)):
+        return LinExpr(None, float(x))
+    raise TypeError(f"Expected a linear expression or number, got {type(x).__name__}.")
+
+
+@dataclass
+class LinearColumns:
+    names: List[str]
+    owner: List[str]  # var name per column
+    lb: List[float]
+    ub: List[float]
+    integrality: List[int]
+    lazy_blocks: List[LazyVarBlock] = field(default_factory=list)
+
+
+def build_linear_env(
+    ir: ModelIR,
+    lazy_vars: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, List[Any]], LinearColumns]:
+    """
+    Solver-free eval environment: every variable cell is a LinExpr over its
+    column id, so IR expressions evaluate to (terms, const) pairs.
+    With lazy_vars, indexed cells get a column only when first accessed.
+    Returns (eval globals, set env, column table).
+    """
+    env_sets = build_set_env(ir)
+    env_params = build_param_env(ir.params or [], env_sets)
+    cols = LinearColumns([], [], [], [], [])
+
+    def _add_cols(col_names: List[str], v: Any) -> List[LinExpr]:
+        start = len(cols.names)
+        n = len(col_names)
+        cols.names.extend(col_names)
+        cols.owner.extend([v.name] * n)
+        lo = float(v.lb)
+        hi = float(v.ub) if v.ub is not None else np.inf
+        if v.vartype == "binary":
+            lo, hi = max(lo, 0.0), min(hi, 1.0)
+        cols.lb.extend([lo] * n)
+        cols.ub.extend([hi] * n)
+        cols.integrality.extend([0 if v.vartype == "continuous" else 1] * n)
+        return [LinExpr({start + k: 1.0}) for k in range(n)]
+
+    env_vars: Dict[str, Any] = {}
+    for v in ir.vars or []:
+        dims = var_block_dims(v, env_sets)
+        if not dims:
+            env_vars[v.name] = _add_cols([v.name], v)[0]
+            continue
+        if lazy_vars:
+            block = LazyVarBlock(v.name, dims, lambda cell, v=v: _add_cols([cell], v)[0], quicksum=linear_quicksum)
+            cols.lazy_blocks.append(block)
+            env_vars[v.name] = block.view()
+            continue
+        flat = _add_cols(block_var_names(v.name, dims), v)
+        env_vars[v.name] = VarBlock(v.name, dims, flat, quicksum=linear_quicksum).view()
+
+    return make_eval_globals(env_sets, env_params, env_vars, linear_quicksum), env_sets, cols
+
+
+# -----------------------------------------------------------------------------
+# HiGHS (scipy.optimize.milp)
+# -----------------------------------------------------------------------------
+_HIGHS_ROW_BOUNDS = {"<=": (-np.inf, 0.0), ">=": (0.0, np.inf), "==": (0.0, 0.0)}
+
+
+@dataclass
+class _HighsModel:
+    names: List[str]
+    lb: List[float]
+    ub: List[float]
+    integrality: List[int]
+    c: np.ndarray
+    obj_const: float
+    maximize: bool
+    rows: List[int]
+    cols: List[int]
+    vals: List[float]
+    row_lb: List[float]
+    row_ub: List[float]
+    row_names: List[str]
+
+
+class HighsBackend(SolverBackend):
+    name = "highs"
+
+    def build(
+        self,
+        ir: ModelIR,
+        build_mode: str = "expr",
+        build_info: Optional[Dict[str, Any]] = None,
+        profile: bool = False,
+        lazy_vars: bool = False,
+        expr_eval: str = "eval",
+    ) -> BuiltModel:
+        # build_mode / expr_eval are Gurobi-specific; rows are always collected as sparse triplets here
+        prof = BuildProfiler() if profile else None
+        with prof.phase("env") if prof is not None else nullcontext():
+            global_env, env_sets, columns = build_linear_env(ir, lazy_vars=lazy_vars)
+        names = columns.names
+
+        with prof.phase("objective") if prof is not None else nullcontext():
+            obj = as_linear(eval(compile_expr(ir.objective.expr), global_env, {}))
+
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        row_lb: List[float] = []
+        row_ub: List[float] = []
+        row_names: List[str] = []
+        with prof.phase("constraints") if prof is not None else nullcontext():
+            for con in ir.constraints or []:
+                b0 = sys.getallocatedblocks()
+                t0 = time.perf_counter()
+                r0 = len(row_names)
+                for cname, lhs, sense, rhs in iter_constraint_rows([con], global_env, env_sets):
+                    if sense not in _HIGHS_ROW_BOUNDS:
+                        raise ValueError(f"Unknown constraint sense '{sense}' in '{cname}'.")
+                    row = as_linear(lhs) - as_linear(rhs)
+                    lo, hi = _HIGHS_ROW_BOUNDS[sense]
+                    r = len(row_names)
+                    for j, a in row.terms.items():
+                        rows.append(r)
+                        cols.append(j)
+                        vals.append(a)
+                    row_lb.append(lo - row.const)
+                    row_ub.append(hi - row.const)
+                    row_names.append(cname)
+                if prof is not None:
+                    prof.constraint(
+                        con.name, len(row_names) - r0, time.perf_counter() - t0, sys.getallocatedblocks() - b0
+                    )
+
+        # sized after the constraints: lazy columns may be added while evaluating them
+        c = np.zeros(len(names))
+        for j, a in obj.terms.items():
+            c[j] += a
+
+        model = _HighsModel(
+            names=names,
+            lb=columns.lb,
+            ub=columns.ub,
+            integrality=columns.integrality,
+            c=c,
+            obj_const=obj.const,
+            maximize=ir.objective.sense.lower() != "min",
+            rows=rows,
+            cols=cols,
+            vals=vals,
+            row_lb=row_lb,
+            row_ub=row_ub,
+            row_names=row_names,
+        )
+
+        info = build_info if build_info is not None else {}
+        info.update(
+            {
+                "build_mode": "highs",
+                "num_vars": len(names),
+                "num_constrs": len(row_names),
+                "matrix_rows": len(row_names),
+                "matrix_nnz": len(vals),
+                "scalar_rows": 0,
+            }
+        )
+        if lazy_vars:
+            info["lazy_vars"] = lazy_var_report(columns.lazy_blocks)
+        if prof is not None:
+            info["profile"] = prof.report()
+        return BuiltModel(self.name, model, info)
+
+    def solve(
+        self,
+        built: BuiltModel,
+        time_limit: float,
+        log: bool = True,
+        want_solution: bool = False,
+        start: Optional[Dict[str, float]] = None,
+    ) -> SolveOutcome:
+        # scipy.optimize.milp takes no initial solution: `start` is ignored
+        return self._milp(built, time_limit, log, want_solution)
+
+    def solve_relaxation(self, built: BuiltModel, time_limit: float, log: bool = False) -> Tuple[SolveOutcome, bool]:
+        hm: _HighsModel = built.model
+        out = self._milp(built, time_limit, log, want_solution=True, relax=True)
+        integral = False
+        if out.status == GRB.OPTIMAL and out.solution is not None:
+            xs = out.solution.values()
+            integral = _is_integral(x for x, kind in zip(xs, hm.integrality) if kind)
+        out.solution = None
+        return out, integral
+
+    def _milp(
+        self,
+        built: BuiltModel,
+        time_limit: float,
+        log: bool,
+        want_solution: bool,
+        relax: bool = False,
+    ) -> SolveOutcome:
+        import scipy.sparse as sp
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        hm: _HighsModel = built.model
+        n = len(hm.names)
+        c = -hm.c if hm.maximize else hm.c
+
+        constraints = []
+        if hm.row_names:
+            A = sp.csr_matrix(
+                (np.asarray(hm.vals, dtype=float), (np.asarray(hm.rows), np.asarray(hm.cols))),
+                shape=(len(hm.row_names), n),
+            )
+            constraints.append(LinearConstraint(A, np.asarray(hm.row_lb), np.asarray(hm.row_ub)))
+
+        t0 = time.perf_counter()
+        res = milp(
+            c,
+            integrality=np.zeros(n) if relax else np.asarray(hm.integrality),
+            bounds=Bounds(np.asarray(hm.lb, dtype=float), np.asarray(hm.ub, dtype=float)),
+            constraints=constraints,
+            options={"disp": bool(log), "time_limit": float(time_limit)},
+        )
+        runtime = time.perf_counter() - t0
+
+        st, sol_count = _milp_status(res)
+        out = SolveOutcome(status=st, status_name=status_name(st), sol_count=sol_count, runtime_sec=runtime)
+        if st == GRB.OPTIMAL:
+            obj = float(res.fun)
+            out.obj_value = (-obj if hm.maximize else obj) + hm.obj_const
+        if want_solution and sol_count > 0:
+            out.solution = dict(zip(hm.names, (float(x) for x in res.x)))
+        return out
+
+
+def _milp_status(res: Any) -> Tuple[int, int]:
+    """Map scipy.optimize.milp status to (Gurobi status, solution count)."""
+    has_x = getattr(res, "x", None) is not None
+    if res.status == 0:
+        return GRB.OPTIMAL, 1
+    if res.status == 1:
+        # iteration/time limit; milp returns x when a feasible point was found
+        return GRB.TIME_LIMIT, 1 if has_x else 0
+    if res.status == 2:
+        return GRB.INFEASIBLE, 0
+    if res.status == 3:
+        return GRB.UNBOUNDED, 0
+    return GRB.NUMERIC, 1 if has_x else 0
+
+
+# -----------------------------------------------------------------------------
+# Registry
+# -----------------------------------------------------------------------------
+BACKENDS = {
+    GurobiBackend.name: GurobiBackend,
+    HighsBackend.name: HighsBackend,
+}
+
+
+def get_backend(name: str = "gurobi", model_cache: Optional[Any] = None) -> SolverBackend:
+    """model_cache is only used by backends that can reload a compiled model (Gurobi)."""
+    key = (name or "gurobi").lower()
+    if key not in BACKENDS:
+        raise ValueError(f"Unknown solver backend '{name}' (expected one of {sorted(BACKENDS)}).")
+    if key == GurobiBackend.name:
+        return GurobiBackend(model_cache=model_cache)
+    return BACKENDS[key]()
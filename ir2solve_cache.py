@@ -0,0 +1,593 @@
+# ir2solve_cache.py
+# On-disk caches:
+#   - ModelCache: compiled models, IR content hash -> MPS file;
+#   - SolveCache: solve results, IR fingerprint + solver params -> SQLite row.
+#
+# ModelCache
+# ----------
+# Ablation sweeps and replays of saved ir_outputs_* JSON often build the same
+# model many times. The Gurobi backend writes each compiled model to
+# <root>/<hash>.mps and reloads it on the next build of an identical IR
+# instead of re-evaluating every expression.
+#
+# MPS does not keep every name: "x[New York]" reads back as "C0(1)". The
+# variable and constraint names are written next to the model
+# (<hash>.names.json) and restored on load, so solutions and MIP starts keyed
+# by VarName still match after a hit. A model without its names file is a miss.
+#
+# Eviction (on every store):
+#   - files older than max_age_sec are removed;
+#   - then least-recently-used files (by mtime, refreshed on hit) are removed
+#     until the total size is <= max_bytes.
+#
+# Cache failures never fail a build: load() returns None and store() returns
+# False on any error.
+#
+# SolveCache
+# ----------
+# Keyed by ir_fingerprint (ir2solve_fingerprint) plus the backend and the
+# solver settings passed as `params` (the pipeline passes the time limit and
+# thread count), so runs with other settings do not share entries. Only
+# OPTIMAL / INFEASIBLE / UNBOUNDED / INF_OR_UNBD outcomes are stored. Rows
+# hold status, objective and the solution vector (JSON).
+# Like ModelCache, errors never fail a solve: get() returns None, put() False.
+#
+# find_start() returns the most recent OPTIMAL solution of a model with the
+# same structure-only fingerprint (same template, different numbers), used
+# as a MIP start on a cache miss.
+#
+# LLMResponseCache
+# ----------------
+# chat.completions.create responses, keyed by a hash of the request (model,
+# temperature, messages and any other JSON-able arguments), stored as the
+# response JSON in SQLite. attach_llm_response_cache() wraps a client the same
+# way attach_llm_usage_tracker does; attach it AFTER the usage tracker so hits
+# are not counted as calls. Only deterministic requests (temperature 0, n=1,
+# no streaming) are cached by default. Like the other caches, errors never
+# fail a call: the request simply goes to the API. With an AsyncOpenAI client
+# the SQLite get/put run in a worker thread (asyncio.to_thread), so lookups
+# do not stall the event loop the other instances are waiting on.
+
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ir2solve_ir import ModelIR
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_SEC = 7 * 24 * 3600.0
+_SUFFIX = ".mps"
+_NAMES_SUFFIX = ".names.json"
+
+# bump when the IR -> model compilation changes in a way that alters the model
+CACHE_FORMAT_VERSION = 1
+
+
+def ir_content_hash(ir: ModelIR, extra: str = "") -> str:
+    """sha256 over the canonical JSON of the IR; meta is excluded since it does not affect the model."""
+    d = asdict(ir)
+    d.pop("meta", None)
+    payload = json.dumps(
+        {"v": CACHE_FORMAT_VERSION, "ir": d, "extra": extra},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ModelCache:
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_sec: float = DEFAULT_MAX_AGE_SEC,
+    ) -> None:
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.max_age_sec = float(max_age_sec)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key + _SUFFIX)
+
+    def names_path(self, key: str) -> str:
+        return os.path.join(self.root, key + _NAMES_SUFFIX)
+
+    def load(self, key: str, env: Any = None) -> Optional[Any]:
+        """Read the cached model for `key` (None on miss or unreadable file)."""
+        path = self.path(key)
+        if not os.path.exists(path) or not os.path.exists(self.names_path(key)):
+            with self._lock:
+                self.misses += 1
+            return None
+        m = None
+        try:
+            import gurobipy as gp
+
+            with open(self.names_path(key), "r", encoding="utf-8") as f:
+                names = json.load(f)
+            m = gp.read(path, env=env)
+            vars_, constrs = m.getVars(), m.getConstrs()
+            if len(vars_) != len(names["vars"]) or len(constrs) != len(names["constrs"]):
+                raise ValueError("names file does not match the model")
+            if vars_:
+                m.setAttr("VarName", vars_, names["vars"])
+            if constrs:
+                m.setAttr("ConstrName", constrs, names["constrs"])
+            m.update()
+            os.utime(path, None)  # LRU: refresh on hit
+        except Exception:
+            if m is not None:
+                m.dispose()
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return m
+
+    def store(self, key: str, model: Any) -> bool:
+        path = self.path(key)
+        # write-then-rename so concurrent readers never see a partial file;
+        # the temp name keeps the .mps suffix (Gurobi picks the format from it)
+        tmp = os.path.join(self.root, f".{key}.{os.getpid()}.{threading.get_ident()}{_SUFFIX}")
+        tmp_names = tmp + _NAMES_SUFFIX
+        try:
+            model.update()
+            names = {"vars": model.getAttr("VarName", model.getVars()), "constrs": model.getAttr("ConstrName", model.getConstrs())}
+            with open(tmp_names, "w", encoding="utf-8") as f:
+                json.dump(names, f, ensure_ascii=False, separators=(",", ":"))
+            model.write(tmp)
+            # names first: a model file is only ever visible next to its names
+            os.replace(tmp_names, self.names_path(key))
+            os.replace(tmp, path)
+        except Exception:
+            for t in (tmp, tmp_names):
+                try:
+                    os.remove(t)
+                except OSError:
+                    pass
+            return False
+        with self._lock:
+            self.stores += 1
+        self.evict()
+        return True
+
+    def evict(self) -> int:
+        """Apply the age and size limits; returns the number of files removed."""
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.endswith(_SUFFIX) or name.startswith("."):
+                continue
+            p = os.path.join(self.root, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            try:
+                size = st.st_size + os.path.getsize(p[: -len(_SUFFIX)] + _NAMES_SUFFIX)
+            except OSError:
+                size = st.st_size
+            entries.append((st.st_mtime, size, p))
+
+        removed = 0
+        keep = []
+        for mtime, size, p in entries:
+            if now - mtime > self.max_age_sec:
+                removed += _try_remove_entry(p)
+            else:
+                keep.append((mtime, size, p))
+
+        total = sum(size for _, size, _ in keep)
+        for mtime, size, p in sorted(keep):
+            if total <= self.max_bytes:
+                break
+            removed += _try_remove_entry(p)
+            total -= size
+
+        with self._lock:
+            self.evicted += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evicted": self.evicted,
+        }
+
+
+def _try_remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
+
+
+def _try_remove_entry(mps_path: str) -> int:
+    """Remove a cached model and its names file; counts the model only."""
+    _try_remove(mps_path[: -len(_SUFFIX)] + _NAMES_SUFFIX)
+    return _try_remove(mps_path)
+
+
+_CACHES: Dict[str, ModelCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_model_cache(
+    root: str,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_age_sec: float = DEFAULT_MAX_AGE_SEC,
+) -> ModelCache:
+    """Process-wide ModelCache per directory (limits are updated on each call)."""
+    key = os.path.abspath(root)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = ModelCache(root, max_bytes=max_bytes, max_age_sec=max_age_sec)
+            _CACHES[key] = cache
+        else:
+            cache.max_bytes = int(max_bytes)
+            cache.max_age_sec = float(max_age_sec)
+        return cache
+
+
+# -----------------------------------------------------------------------------
+# Solve-result cache (SQLite)
+# -----------------------------------------------------------------------------
+# bump when keys or fingerprints change; databases of another version are
+# cleared on open (v2: fingerprints keep set element order)
+SOLVE_CACHE_FORMAT_VERSION = 2
+CACHEABLE_STATUSES = ("OPTIMAL", "INFEASIBLE", "UNBOUNDED", "INF_OR_UNBD")
+
+_SOLVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS solves (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    structure TEXT,
+    backend TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    status_name TEXT NOT NULL,
+    obj_value REAL,
+    sol_count INTEGER NOT NULL,
+    runtime_sec REAL NOT NULL,
+    solution TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS solves_structure ON solves (structure, backend);
+"""
+
+
+def solve_cache_key(fingerprint: str, backend: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps(
+        {"v": SOLVE_CACHE_FORMAT_VERSION, "fp": fingerprint, "backend": backend, "params": params or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SolveCache:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        # one connection shared by the pipeline threads, serialized by _lock
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SOLVE_SCHEMA)
+            # rows of an older format would still serve warm starts (find_start)
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SOLVE_CACHE_FORMAT_VERSION:
+                self._conn.execute("DELETE FROM solves")
+                self._conn.execute(f"PRAGMA user_version = {int(SOLVE_CACHE_FORMAT_VERSION)}")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result as a dict (SolveOutcome fields + fingerprint), or None."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT status, status_name, obj_value, sol_count, runtime_sec, solution, fingerprint "
+                    "FROM solves WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        status, name, obj, sol_count, runtime, solution, fp = row
+        return {
+            "status": int(status),
+            "status_name": name,
+            "obj_value": obj,
+            "sol_count": int(sol_count),
+            "runtime_sec": float(runtime),
+            "solution": json.loads(solution) if solution else None,
+            "fingerprint": fp,
+        }
+
+    def put(
+        self,
+        key: str,
+        outcome: Any,
+        fingerprint: str,
+        backend: str,
+        structure: Optional[str] = None,
+    ) -> bool:
+        """Store a SolveOutcome; outcomes that depend on the time limit are skipped (False)."""
+        if outcome.status_name not in CACHEABLE_STATUSES:
+            return False
+        try:
+            solution = json.dumps(outcome.solution, separators=(",", ":")) if outcome.solution else None
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO solves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        fingerprint,
+                        structure,
+                        backend,
+                        int(outcome.status),
+                        outcome.status_name,
+                        outcome.obj_value,
+                        int(outcome.sol_count),
+                        float(outcome.runtime_sec),
+                        solution,
+                        time.time(),
+                    ),
+                )
+                self._conn.commit()
+                self.stores += 1
+        except (sqlite3.Error, TypeError, ValueError):
+            return False
+        return True
+
+    def find_start(self, structure: str, backend: str, exclude: str = "") -> Optional[Dict[str, Any]]:
+        """{"fingerprint", "solution"} of the latest OPTIMAL solve with this structure, or None."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT fingerprint, solution FROM solves "
+                    "WHERE structure = ? AND backend = ? AND status_name = 'OPTIMAL' "
+                    "AND solution IS NOT NULL AND fingerprint != ? "
+                    "ORDER BY created DESC LIMIT 1",
+                    (structure, backend, exclude),
+                ).fetchone()
+            if row is None:
+                return None
+            return {"fingerprint": row[0], "solution": json.loads(row[1])}
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_SOLVE_CACHES: Dict[str, SolveCache] = {}
+
+
+def get_solve_cache(path: str) -> SolveCache:
+    """Process-wide SolveCache per database file."""
+    key = os.path.abspath(path)
+    with _CACHES_LOCK:
+        cache = _SOLVE_CACHES.get(key)
+        if cache is None:
+            cache = SolveCache(path)
+            _SOLVE_CACHES[key] = cache
+        return cache
+
+
+# -----------------------------------------------------------------------------
+# LLM response cache (SQLite)
+# -----------------------------------------------------------------------------
+LLM_CACHE_FORMAT_VERSION = 1
+
+_LLM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def llm_cache_key(request: Dict[str, Any]) -> Optional[str]:
+    """sha256 of the request arguments; None if they are not JSON-serializable."""
+    try:
+        payload = json.dumps(
+            {"v": LLM_CACHE_FORMAT_VERSION, "request": request},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _usage_tokens(resp: Any) -> Tuple[int, int]:
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return 0, 0
+    return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, deterministic_only: bool = True) -> None:
+        self.path = path
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_LLM_SCHEMA)
+            self._conn.commit()
+
+    def cacheable(self, request: Dict[str, Any]) -> bool:
+        if request.get("stream") or int(request.get("n") or 1) != 1:
+            return False
+        temperature = request.get("temperature")
+        # the API default temperature is 1
+        return not self.deterministic_only or (temperature is not None and float(temperature) == 0.0)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached response rebuilt as a ChatCompletion, or None."""
+        try:
+            from openai.types.chat import ChatCompletion
+
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            resp = ChatCompletion.model_validate(json.loads(row[0])) if row is not None else None
+        except (sqlite3.Error, ImportError, ValueError):
+            row, resp = None, None
+        with self._lock:
+            if resp is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_prompt_tokens += int(row[1])
+            self.saved_completion_tokens += int(row[2])
+        return resp
+
+    def put(self, key: str, request: Dict[str, Any], resp: Any) -> bool:
+        """Store a response object (anything with model_dump, e.g. ChatCompletion)."""
+        try:
+            data = json.dumps(resp.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":"))
+            prompt_tokens, completion_tokens = _usage_tokens(resp)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, str(request.get("model", "")), data, prompt_tokens, completion_tokens, time.time()),
+                )
+                self._conn.commit()
+                self.stores += 1
+        except (sqlite3.Error, AttributeError, TypeError, ValueError):
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+            "saved_total_tokens": self.saved_prompt_tokens + self.saved_completion_tokens,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _wrap_create_with_cache(method: Any, cache: LLMResponseCache) -> Any:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        key = llm_cache_key(kwargs) if not args and cache.cacheable(kwargs) else None
+        if key is None:
+            return method(*args, **kwargs)
+        resp = cache.get(key)
+        if resp is None:
+            resp = method(*args, **kwargs)
+            cache.put(key, kwargs, resp)
+        return resp
+
+    return wrapper
+
+
+def _wrap_async_create_with_cache(method: Any, cache: LLMResponseCache) -> Any:
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        key = llm_cache_key(kwargs) if not args and cache.cacheable(kwargs) else None
+        if key is None:
+            return await method(*args, **kwargs)
+        # sqlite3 blocks: keep it off the event loop
+        resp = await asyncio.to_thread(cache.get, key)
+        if resp is None:
+            resp = await method(*args, **kwargs)
+            await asyncio.to_thread(cache.put, key, kwargs, resp)
+        return resp
+
+    return wrapper
+
+
+def attach_llm_response_cache(client: Any, cache: LLMResponseCache) -> None:
+    """Monkey-patch client.chat.completions.create (OpenAI or AsyncOpenAI) to serve repeated requests from `cache`."""
+    from openai import AsyncOpenAI
+
+    wrap = _wrap_async_create_with_cache if isinstance(client, AsyncOpenAI) else _wrap_create_with_cache
+    try:
+        completions = client.chat.completions
+        completions.create = wrap(completions.create, cache)  # type: ignore
+    except AttributeError:
+        pass
+
+
+_LLM_CACHES: Dict[str, LLMResponseCache] = {}
+
+
+def get_llm_cache(path: str) -> LLMResponseCache:
+    """Process-wide LLMResponseCache per database file."""
+    key = os.path.abspath(path)
+    with _CACHES_LOCK:
+        cache = _LLM_CACHES.get(key)
+        if cache is None:
+            cache = LLMResponseCache(path)
+            _LLM_CACHES[key] = cache
+        return cache
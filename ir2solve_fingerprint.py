@@ -0,0 +1,202 @@
+# ir2solve_fingerprint.py
+# Canonical fingerprints of a ModelIR.
+#
+# Two IRs get the same fingerprint when they describe the same model up to:
+#   - the order of sets / params / vars / constraints, and repeated set elements;
+#   - constraint / objective names, descriptions and meta;
+#   - whitespace and redundant parentheses in expressions (compared by AST);
+#   - `a >= b` vs `b <= a`, and int vs float literals of the same value used
+#     as numbers (2*x vs 2.0*x). Literals in subscripts and in arguments of
+#     calls like range() keep their type: T[0] and T[0.0] differ.
+#
+# Variants:
+#   - ir_fingerprint(ir)                       -> full model (numbers included)
+#   - ir_fingerprint(ir, structure_only=True)  -> param values / defaults are
+#     ignored (the index structure of sparse params is kept), so instances of the
+#     same template with different data share a fingerprint.
+#
+# Set, param and var names are part of the model (expressions refer to them)
+# and are not renamed. Set element order is kept: expressions like T[0],
+# T[k-1] or enumerate(T) make it part of the model.
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List
+import ast
+import hashlib
+import json
+import math
+
+from ir2solve_ir import ModelIR, forall_bindings
+
+
+# bump when the canonical form changes
+FINGERPRINT_VERSION = 3
+
+_SENSE_ALIASES = {"=": "==", "<": "<=", ">": ">=", "=<": "<=", "=>": ">="}
+
+
+# -----------------------------------------------------------------------------
+# Canonical pieces
+# -----------------------------------------------------------------------------
+@lru_cache(maxsize=8192)
+def canonical_expr(expr: str) -> str:
+    """AST dump of the expression (no positions); unparseable input is whitespace-normalized."""
+    try:
+        tree = ast.parse((expr or "").strip(), mode="eval")
+    except SyntaxError:
+        return " ".join(str(expr).split())
+    return ast.dump(_LiteralNormalizer().visit(tree), annotate_fields=False)
+
+
+# calls whose arguments are plain numbers (elsewhere, e.g. range(2), int vs float matters)
+_NUMERIC_CALLS = frozenset(["sum", "quicksum", "min", "max", "abs"])
+
+
+class _LiteralNormalizer(ast.NodeTransformer):
+    # 2 and 2.0 are the same coefficient, but T[0] and T[0.0] are not the same lookup
+    def __init__(self) -> None:
+        self._keep_type = 0
+
+    def _visit_kept(self, node: ast.AST) -> ast.AST:
+        self._keep_type += 1
+        try:
+            return self.visit(node)
+        finally:
+            self._keep_type -= 1
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        node.value = self.visit(node.value)
+        node.slice = self._visit_kept(node.slice)
+        return node
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        node.func = self.visit(node.func)
+        if isinstance(node.func, ast.Name) and node.func.id in _NUMERIC_CALLS:
+            visit = self.visit
+        else:
+            visit = self._visit_kept
+        node.args = [visit(a) for a in node.args]
+        node.keywords = [visit(k) for k in node.keywords]
+        return node
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        v = node.value
+        if not self._keep_type and isinstance(v, int) and not isinstance(v, bool):
+            return ast.Constant(float(v))
+        return node
+
+
+def _num(x: Any) -> Any:
+    if isinstance(x, bool) or not isinstance(x, (int, float)):
+        return x if x is None else str(x)
+    x = float(x)
+    return repr(x) if math.isfinite(x) else str(x)
+
+
+def _elem_key(x: Any) -> Any:
+    # str elements stay as-is (the common case); others are tagged with their type
+    return x if type(x) is str else [type(x).__name__, str(x)]
+
+
+def _unique_elems(elements: Any) -> List[Any]:
+    """Elements in declared order without duplicates, as the build sees them (ir2solve_ir._unique)."""
+    try:
+        return list(dict.fromkeys(elements or []))
+    except TypeError:  # unhashable elements: the build rejects them, keep them as-is
+        return list(elements or [])
+
+
+def _elem_sort_key(x: Any) -> Any:
+    return ("", x) if type(x) is str else (type(x).__name__, str(x))
+
+
+def _canonical_values(v: Any, structure_only: bool) -> Any:
+    """Nested dicts -> key-sorted pair lists; leaves -> canonical numbers (or None for structure)."""
+    if isinstance(v, dict):
+        if all(type(k) is str for k in v):
+            keys = sorted(v)
+        else:
+            keys = sorted(v, key=_elem_sort_key)
+        return [[_elem_key(k), _canonical_values(v[k], structure_only)] for k in keys]
+    if isinstance(v, (list, tuple)):
+        return [_canonical_values(x, structure_only) for x in v]
+    if structure_only:
+        return None
+    if type(v) is float and math.isfinite(v):
+        return repr(v)
+    return _num(v)
+
+
+def _sorted(items: Any) -> List[Any]:
+    # ordering by the serialized form never compares mixed types
+    return sorted(items, key=lambda x: json.dumps(x, separators=(",", ":")))
+
+
+def _canonical_constraint(c: Any) -> List[Any]:
+    lhs, rhs = canonical_expr(c.expr_lhs), canonical_expr(c.expr_rhs)
+    sense = str(c.sense).strip()
+    sense = _SENSE_ALIASES.get(sense, sense)
+    if sense == ">=":
+        lhs, rhs, sense = rhs, lhs, "<="
+    try:
+        bindings = [list(b) for b in forall_bindings(c)]
+    except ValueError:
+        bindings = [str(c.forall)]
+    return [bindings, lhs, sense, rhs]
+
+
+def canonical_ir(ir: ModelIR, structure_only: bool = False) -> Dict[str, Any]:
+    """JSON-able canonical form of the IR (the input of ir_fingerprint)."""
+    sets = _sorted(
+        [s.name, [_elem_key(e) for e in _unique_elems(s.elements)]]
+        for s in ir.sets or []
+    )
+    params = _sorted(
+        [
+            p.name,
+            list(p.indices or []),
+            _canonical_values(p.values, structure_only),
+            None if structure_only else _num(p.default),
+        ]
+        for p in ir.params or []
+    )
+    vars_ = _sorted(
+        [v.name, list(v.indices or []), str(v.vartype).lower(), _num(v.lb), _num(v.ub)]
+        for v in ir.vars or []
+    )
+    objective = None
+    if ir.objective is not None:
+        objective = [str(ir.objective.sense).lower(), canonical_expr(ir.objective.expr)]
+    constraints = _sorted(_canonical_constraint(c) for c in ir.constraints or [])
+    return {
+        "v": FINGERPRINT_VERSION,
+        "structure_only": bool(structure_only),
+        "sets": sets,
+        "params": params,
+        "vars": vars_,
+        "objective": objective,
+        "constraints": constraints,
+    }
+
+
+# -----------------------------------------------------------------------------
+# Public API
+# -----------------------------------------------------------------------------
+def ir_fingerprint(ir: ModelIR, structure_only: bool = False) -> str:
+    """sha256 hex digest of canonical_ir(ir, structure_only)."""
+    payload = json.dumps(
+        canonical_ir(ir, structure_only=structure_only),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ir_fingerprints(ir: ModelIR) -> Dict[str, str]:
+    """Both variants, as recorded in the pipeline trace."""
+    return {
+        "full": ir_fingerprint(ir),
+        "structure": ir_fingerprint(ir, structure_only=True),
+    }
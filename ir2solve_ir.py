@@ -3,17 +3,32 @@
 
 from __future__ import annotations
 
+import heapq
+import itertools
+import sys
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from types import CodeType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
 
+from ir2solve_lineval import EXPR_EVAL_MODES, LinearEvaluator, LinearTerms, as_expr
+
 
 # -----------------------------------------------------------------------------
 # Core IR
 # -----------------------------------------------------------------------------
-@dataclass
+# Slotted where supported (dataclass(slots=True) needs Python 3.10+): no
+# per-instance __dict__, which matters when thousands of IRs are held at once.
+_IR_DATACLASS_KW: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_IR_DATACLASS_KW)
 class MetaInfo:
     problem_id: str
     source: Optional[str] = None
@@ -22,32 +37,34 @@ class MetaInfo:
     version: int = 1
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class SetDef:
     name: str
     elements: List[Any]
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class ParamDef:
     name: str
-    indices: List[str]  # [], [S], or [S1,S2]
+    indices: List[str]  # [], [S], [S1,S2], ... (any rank)
     values: Any = None
     description: Optional[str] = None
+    # value of entries omitted from `values` (sparse params); None = every entry is listed
+    default: Optional[float] = None
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class VarDef:
     name: str
-    indices: List[str]  # [], [S], or [S1,S2]
+    indices: List[str]  # [], [S], [S1,S2], ... (any rank)
     vartype: str        # "binary" | "integer" | "continuous"
     lb: float = 0.0
     ub: Optional[float] = None
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class ObjectiveDef:
     name: str
     sense: str          # "min" | "max"
@@ -55,16 +72,19 @@ class ObjectiveDef:
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class ConstraintDef:
     name: str
     expr_lhs: str
     sense: str          # "<=" | ">=" | "=="
     expr_rhs: str
     description: Optional[str] = None
+    # optional "for all" binding, e.g. [["i","I"],["j","J"]]:
+    # the constraint is instantiated once per element of I x J with i/j bound
+    forall: Optional[List[List[str]]] = None
 
 
-@dataclass
+@dataclass(**_IR_DATACLASS_KW)
 class ModelIR:
     meta: MetaInfo
     sets: List[SetDef]
@@ -74,55 +94,950 @@ class ModelIR:
     constraints: List[ConstraintDef]
 
 
+def forall_bindings(c: Any) -> List[Tuple[str, str]]:
+    """
+    Normalize ConstraintDef.forall into [(symbol, set_name), ...].
+    Accepts [["i","I"], ...] (canonical) and {"i": "I", ...}.
+    """
+    raw = getattr(c, "forall", None)
+    if not raw:
+        return []
+    if isinstance(raw, dict):
+        raw = list(raw.items())
+    out: List[Tuple[str, str]] = []
+    for b in raw:
+        if not isinstance(b, (list, tuple)) or len(b) != 2:
+            raise ValueError(f"Constraint '{getattr(c, 'name', '?')}': forall entry {b!r} must be [symbol, set].")
+        sym, set_name = str(b[0]), str(b[1])
+        if not sym.isidentifier():
+            raise ValueError(f"Constraint '{getattr(c, 'name', '?')}': forall symbol {sym!r} is not an identifier.")
+        out.append((sym, set_name))
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Compiled expression cache
+# -----------------------------------------------------------------------------
+# Process-wide LRU: expression text -> code object. Unrolled constraints,
+# replays, ablations and L3 acceptance builds keep producing the same strings,
+# so each distinct expression is tokenized/compiled only once.
+EXPR_CACHE_MAXSIZE = 8192
+
+
+@lru_cache(maxsize=EXPR_CACHE_MAXSIZE)
+def compile_expr(expr: str) -> CodeType:
+    """Compile an IR expression string in eval mode (cached)."""
+    return compile(expr, "<ir-expr>", "eval")
+
+
+def expr_cache_info() -> Dict[str, int]:
+    """Snapshot of the compiled-expression cache counters."""
+    info = compile_expr.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize or 0,
+    }
+
+
+def expr_cache_delta(before: Dict[str, int], after: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Hits/misses accumulated between two `expr_cache_info()` snapshots."""
+    if after is None:
+        after = expr_cache_info()
+    return {
+        "hits": after["hits"] - before.get("hits", 0),
+        "misses": after["misses"] - before.get("misses", 0),
+        "size": after["size"],
+        "maxsize": after["maxsize"],
+    }
+
+
+def clear_expr_cache() -> None:
+    compile_expr.cache_clear()
+
+
+def eval_expr(expr: str, global_env: Dict[str, Any]) -> Any:
+    """eval() of an IR expression in the restricted globals (the default evaluator)."""
+    return eval(compile_expr(expr), global_env, {})
+
+
+# -----------------------------------------------------------------------------
+# Variable blocks
+# -----------------------------------------------------------------------------
+def _unique(elems: List[Any]) -> List[Any]:
+    """Set elements in order, without duplicates (one variable per element)."""
+    return list(dict.fromkeys(elems))
+
+
+# names are set in chunks of this many cells: the full list of a large block
+# would briefly cost more than the block itself
+BLOCK_NAME_CHUNK = 16384
+
+
+def iter_block_var_names(name: str, dims: List[List[Any]]) -> Iterator[str]:
+    """Row-major Gurobi names name[i,j,...] for every cell of a block."""
+    heads = [""]
+    for d in dims[:-1]:
+        heads = [f"{h}{e}," for h in heads for e in d]
+    for h in heads:
+        for e in dims[-1]:
+            yield f"{name}[{h}{e}]"
+
+
+def block_var_names(name: str, dims: List[List[Any]]) -> List[str]:
+    return list(iter_block_var_names(name, dims))
+
+
+class VarBlock:
+    """
+    Dense indexed variable block over a product of sets.
+
+    Gurobi blocks are created with ONE addMVar call (VarBlock.create); other
+    backends pass their own column handles. Handles are kept in a flat list
+    (row-major) and addressed through an element -> position index per
+    dimension, so no dict-of-dict / tuple-key structure is built. The Var
+    objects themselves are gurobipy's (an MVar holds one per cell as well).
+    """
+
+    __slots__ = ("name", "dims", "pos", "strides", "flat", "quicksum")
+
+    def __init__(
+        self,
+        name: str,
+        dims: List[List[Any]],
+        flat: List[Any],
+        quicksum: Callable[..., Any] = gp.quicksum,
+    ) -> None:
+        self.name = name
+        self.quicksum = quicksum
+        self.dims = dims
+        self.pos = [{e: k for k, e in enumerate(d)} for d in dims]
+        strides: List[int] = []
+        acc = 1
+        for d in reversed(dims):
+            strides.append(acc)
+            acc *= len(d)
+        self.strides = list(reversed(strides))
+        self.flat = flat
+
+    @classmethod
+    def create(cls, m: gp.Model, name: str, dims: List[List[Any]], lb: float, ub: float, vtype: str) -> "VarBlock":
+        size = 1
+        for d in dims:
+            size *= len(d)
+        if not size:
+            return cls(name, dims, [])
+        flat = m.addMVar(size, lb=lb, ub=ub, vtype=vtype).tolist()
+        names = iter_block_var_names(name, dims)
+        for k in range(0, size, BLOCK_NAME_CHUNK):
+            chunk = flat[k : k + BLOCK_NAME_CHUNK]
+            m.setAttr("VarName", chunk, list(itertools.islice(names, len(chunk))))
+        return cls(name, dims, flat)
+
+    @property
+    def size(self) -> int:
+        return len(self.flat)
+
+    def offset(self, depth: int, key: Any) -> int:
+        """Flat offset contributed by `key` at dimension `depth` (KeyError if not an element)."""
+        return self.pos[depth][key] * self.strides[depth]
+
+    def at(self, flat_index: int) -> Any:
+        return self.flat[flat_index]
+
+    def view(self) -> "VarView":
+        return VarView(self, 0, 0)
+
+
+class LazyVarBlock(VarBlock):
+    """
+    VarBlock whose cells are created on first access: factory(cell_name) -> handle.
+    Cells never touched by the objective/constraints are never created.
+    """
+
+    __slots__ = ("factory", "created")
+
+    def __init__(
+        self,
+        name: str,
+        dims: List[List[Any]],
+        factory: Callable[[str], Any],
+        quicksum: Callable[..., Any] = gp.quicksum,
+    ) -> None:
+        size = 1
+        for d in dims:
+            size *= len(d)
+        super().__init__(name, dims, [None] * size, quicksum=quicksum)
+        self.factory = factory
+        self.created = 0
+
+    def cell_name(self, flat_index: int) -> str:
+        keys = [self.dims[d][(flat_index // st) % len(self.dims[d])] for d, st in enumerate(self.strides)]
+        return f"{self.name}[{','.join(str(k) for k in keys)}]"
+
+    def at(self, flat_index: int) -> Any:
+        v = self.flat[flat_index]
+        if v is None:
+            v = self.factory(self.cell_name(flat_index))
+            self.flat[flat_index] = v
+            self.created += 1
+        return v
+
+
+def lazy_var_report(blocks: Iterable[LazyVarBlock]) -> Dict[str, Any]:
+    per_var = {b.name: {"declared": b.size, "created": b.created} for b in blocks}
+    declared = sum(v["declared"] for v in per_var.values())
+    created = sum(v["created"] for v in per_var.values())
+    return {"declared": declared, "created": created, "unused": declared - created, "per_var": per_var}
+
+
+class VarView:
+    """
+    Read-only view over a VarBlock (or a sub-block after partial indexing).
+
+    Supports the indexing styles LLM expressions rely on:
+      x[i], x[i][j], x[i, j], x[i] as a row view, iteration over keys,
+      keys()/values()/items()/get(), len(), `in`,
+    plus tupledict-style select()/sum()/prod() with '*' patterns.
+    Rows are never materialized; a row view is just (block, offset, depth).
+    """
+
+    __slots__ = ("_block", "_offset", "_depth")
+
+    def __init__(self, block: VarBlock, offset: int, depth: int) -> None:
+        self._block = block
+        self._offset = offset
+        self._depth = depth
+
+    def _rest(self) -> int:
+        return len(self._block.dims) - self._depth
+
+    def __getitem__(self, key: Any) -> Any:
+        keys = key if isinstance(key, tuple) and len(key) > 1 else (key,)
+        rest = self._rest()
+        if len(keys) > rest:
+            raise KeyError(key)
+        off = self._offset
+        for d, k in enumerate(keys, start=self._depth):
+            off += self._block.offset(d, k)
+        if len(keys) == rest:
+            return self._block.at(off)
+        return VarView(self._block, off, self._depth + len(keys))
+
+    def lookup(self, path: List[Any]) -> Any:
+        """self[path[0]][path[1]]... without building the intermediate row views."""
+        b = self._block
+        n = len(b.dims)
+        off, depth = self._offset, self._depth
+        if len(path) == n - depth:
+            # common case: one scalar key per remaining dimension
+            for d, k in enumerate(path, start=depth):
+                if k.__class__ is tuple:
+                    break
+                off += b.pos[d][k] * b.strides[d]
+            else:
+                return b.at(off)
+            off = self._offset
+        for i, key in enumerate(path):
+            if depth == n:
+                # indexing into a cell: whatever the Var itself raises
+                obj = b.at(off)
+                for k in path[i:]:
+                    obj = obj[k]
+                return obj
+            keys = key if isinstance(key, tuple) and len(key) > 1 else (key,)
+            if depth + len(keys) > n:
+                raise KeyError(key)
+            for k in keys:
+                off += b.pos[depth][k] * b.strides[depth]
+                depth += 1
+        if depth == n:
+            return b.at(off)
+        return VarView(b, off, depth)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except (KeyError, TypeError):
+            return default
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._block.pos[self._depth]
+
+    def __iter__(self):
+        return iter(self._block.dims[self._depth])
+
+    def __len__(self) -> int:
+        return len(self._block.dims[self._depth])
+
+    def keys(self) -> List[Any]:
+        return list(self._block.dims[self._depth])
+
+    def values(self) -> List[Any]:
+        return [self[k] for k in self._block.dims[self._depth]]
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        return [(k, self[k]) for k in self._block.dims[self._depth]]
+
+    # tupledict-style helpers, scoped to this view
+    def _matches(self, pattern: Tuple[Any, ...]):
+        rest = self._rest()
+        pattern = tuple(pattern) + ("*",) * (rest - len(pattern))
+        if len(pattern) != rest:
+            raise KeyError(pattern)
+        choices = [
+            self._block.dims[d] if p == "*" else [p]
+            for d, p in enumerate(pattern, start=self._depth)
+        ]
+        for key in itertools.product(*choices):
+            yield key, self[key] if len(key) > 1 else self[key[0]]
+
+    def select(self, *pattern: Any) -> List[Any]:
+        return [v for _, v in self._matches(pattern)]
+
+    def sum(self, *pattern: Any) -> Any:
+        return self._block.quicksum(v for _, v in self._matches(pattern))
+
+    def prod(self, coeff: Dict[Any, float], *pattern: Any) -> Any:
+        return self._block.quicksum(
+            coeff[key if len(key) > 1 else key[0]] * v
+            for key, v in self._matches(pattern)
+            if (key if len(key) > 1 else key[0]) in coeff
+        )
+
+    def __repr__(self) -> str:
+        return f"VarView({self._block.name}, depth={self._depth}, size={len(self)})"
+
+
+# -----------------------------------------------------------------------------
+# Indexed params (rank >= 2)
+# -----------------------------------------------------------------------------
+# Stored as a dense float array (NaN = missing entry) or, when mostly empty,
+# as sparse COO data: sorted row-major flat positions + values. Set elements
+# are mapped to positions once per dimension. With a declared default,
+# missing entries read as the default and are never materialized. A param
+# whose values (and default) are all ints reads back as ints, like the nested
+# dict it replaces (range(p[i][j]) and the like keep working).
+DENSE_MIN_FILL = 0.5
+
+
+class _Unpackable(Exception):
+    """Param values cannot be mapped onto the declared sets."""
+
+
+def _split_tuple_key(k: Any) -> Tuple[Any, ...]:
+    """'a,b' / '(a, b)' / 'a|b' / ('a','b') -> ('a','b')."""
+    if isinstance(k, tuple):
+        return k
+    if not isinstance(k, str):
+        return (k,)
+    s = k.strip()
+    if s.startswith("(") and s.endswith(")"):
+        s = s[1:-1]
+    sep = "," if "," in s else ("|" if "|" in s else None)
+    if sep is None:
+        return (k,)
+    parts = []
+    for x in s.split(sep):
+        x = x.strip()
+        if len(x) >= 2 and x[0] == x[-1] and x[0] in "'\"":
+            x = x[1:-1]
+        parts.append(x)
+    return tuple(parts)
+
+
+def _iter_param_entries(values: Dict[Any, Any], rank: int, prefix: Tuple[Any, ...] = ()):
+    """Yield (key_tuple, value) from nested and/or tuple-key dicts of a rank-N param."""
+    for k, v in values.items():
+        if isinstance(v, dict):
+            key = prefix + _split_tuple_key(k)
+            if len(key) >= rank:
+                raise _Unpackable(k)
+            yield from _iter_param_entries(v, rank, key)
+            continue
+        key = prefix + (k,)
+        if len(key) < rank:
+            key = prefix + _split_tuple_key(k)
+        if len(key) != rank:
+            raise _Unpackable(k)
+        yield key, v
+
+
+class IndexedParam:
+    """Rank-N numeric param over a product of sets (dense ndarray or sparse COO)."""
+
+    __slots__ = ("name", "dims", "pos", "shape", "strides", "dense", "flat_keys", "flat_vals", "default", "integral")
+
+    def __init__(self, name: str, dims: List[List[Any]], default: Optional[float] = None) -> None:
+        self.name = name
+        self.default = default
+        self.dims = dims
+        self.pos = [{e: k for k, e in enumerate(d)} for d in dims]
+        self.shape = tuple(len(d) for d in dims)
+        self.strides = tuple(int(np.prod(self.shape[d + 1:])) for d in range(len(dims)))
+        self.dense: Optional[np.ndarray] = None
+        self.flat_keys: Optional[np.ndarray] = None
+        self.flat_vals: Optional[np.ndarray] = None
+        self.integral = default is None or isinstance(default, int)
+
+    @classmethod
+    def from_values(
+        cls,
+        name: str,
+        dims: List[List[Any]],
+        values: Dict[Any, Any],
+        default: Optional[float] = None,
+    ) -> "IndexedParam":
+        """Raises _Unpackable if a key is not a set element or a value is not a number."""
+        p = cls(name, dims, default)
+        coords: List[Tuple[int, ...]] = []
+        vals: List[Any] = []
+        for key, v in _iter_param_entries(values, len(dims)):
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                raise _Unpackable(key)
+            try:
+                coords.append(tuple(p.pos[d][k] for d, k in enumerate(key)))
+            except (KeyError, TypeError):
+                raise _Unpackable(key)
+            p.integral = p.integral and isinstance(v, int)
+            vals.append(v)
+
+        size = int(np.prod(p.shape)) if p.shape else 0
+        if coords:
+            idx = np.ravel_multi_index(tuple(np.asarray(coords).T), p.shape)
+        else:
+            idx = np.zeros(0, dtype=np.int64)
+        if size and len(coords) >= DENSE_MIN_FILL * size:
+            dense = np.full(size, np.nan)
+            dense[idx] = vals
+            p.dense = dense.reshape(p.shape)
+        else:
+            order = np.argsort(idx, kind="stable")
+            keys = idx[order]
+            v_arr = np.asarray(vals, dtype=np.int64 if p.integral else float)[order]
+            # duplicate keys (e.g. nested + tuple-key forms): last one wins
+            last = np.ones(len(keys), dtype=bool)
+            last[:-1] = keys[1:] != keys[:-1]
+            p.flat_keys = keys[last]
+            p.flat_vals = v_arr[last]
+        return p
+
+    @property
+    def nbytes(self) -> int:
+        if self.dense is not None:
+            return int(self.dense.nbytes)
+        return int(self.flat_keys.nbytes + self.flat_vals.nbytes)
+
+    def has(self, coords: Tuple[int, ...]) -> bool:
+        """Whether the entry at `coords` is listed explicitly (defaults do not count)."""
+        if self.dense is not None:
+            v = self.dense[coords]
+            return v == v  # not NaN
+        flat = sum(c * st for c, st in zip(coords, self.strides))
+        k = int(np.searchsorted(self.flat_keys, flat))
+        return k < len(self.flat_keys) and self.flat_keys[k] == flat
+
+    def value(self, coords: Tuple[int, ...]) -> Any:
+        """Entry at position tuple `coords`; the default (or KeyError) if missing."""
+        if self.dense is not None:
+            v = self.dense.item(coords)
+            if v == v:  # not NaN
+                return int(v) if self.integral else v
+        else:
+            flat = sum(c * st for c, st in zip(coords, self.strides))
+            k = int(np.searchsorted(self.flat_keys, flat))
+            if k < len(self.flat_keys) and self.flat_keys[k] == flat:
+                return self.flat_vals[k].item()
+        if self.default is not None:
+            return self.default
+        raise KeyError(tuple(self.dims[d][c] for d, c in enumerate(coords)))
+
+    def present_positions(self, prefix: Tuple[int, ...]) -> List[int]:
+        """Positions at dimension len(prefix) that have at least one entry below `prefix`."""
+        depth = len(prefix)
+        if self.dense is not None:
+            sub = ~np.isnan(self.dense[prefix])
+            return [int(k) for k in np.flatnonzero(sub.reshape(self.shape[depth], -1).any(axis=1))]
+        inner = int(np.prod(self.shape[depth:]))
+        lo = int(np.ravel_multi_index(prefix + (0,) * (len(self.shape) - depth), self.shape)) if prefix else 0
+        a = int(np.searchsorted(self.flat_keys, lo))
+        b = int(np.searchsorted(self.flat_keys, lo + inner))
+        stride = inner // self.shape[depth]
+        return [int(k) for k in np.unique((self.flat_keys[a:b] - lo) // stride)]
+
+    def view(self) -> "ParamView":
+        return ParamView(self, ())
+
+
+class ParamView:
+    """
+    Read-only dict-like view over an IndexedParam (or a slice after partial
+    indexing): p[i][j][k], p[i, j, k], iteration over present keys,
+    keys()/values()/items()/get(), len(), `in`. Entries are Python floats
+    (ints when the param was given as ints only).
+    Like a defaultdict, a declared default answers lookups of missing
+    entries but does not add them to keys()/len()/`in`.
+    """
+
+    __slots__ = ("_param", "_prefix")
+
+    def __init__(self, param: IndexedParam, prefix: Tuple[int, ...]) -> None:
+        self._param = param
+        self._prefix = prefix
+
+    def __getitem__(self, key: Any) -> Any:
+        keys = key if isinstance(key, tuple) and len(key) > 1 else (key,)
+        p = self._param
+        depth = len(self._prefix)
+        if depth + len(keys) > len(p.dims):
+            raise KeyError(key)
+        coords = self._prefix + tuple(p.pos[d][k] for d, k in enumerate(keys, start=depth))
+        if len(coords) == len(p.dims):
+            return p.value(coords)
+        return ParamView(p, coords)
+
+    def lookup(self, path: List[Any]) -> Any:
+        """self[path[0]][path[1]]... without building the intermediate slice views."""
+        p = self._param
+        n = len(p.dims)
+        if not self._prefix and len(path) == n and tuple not in map(type, path):
+            # common case: one scalar key per dimension
+            return p.value(tuple([p.pos[d][k] for d, k in enumerate(path)]))
+        coords = list(self._prefix)
+        for i, key in enumerate(path):
+            if len(coords) == n:
+                obj = p.value(tuple(coords))
+                for k in path[i:]:
+                    obj = obj[k]
+                return obj
+            keys = key if isinstance(key, tuple) and len(key) > 1 else (key,)
+            if len(coords) + len(keys) > n:
+                raise KeyError(key)
+            for k in keys:
+                coords.append(p.pos[len(coords)][k])
+        if len(coords) == n:
+            return p.value(tuple(coords))
+        return ParamView(p, tuple(coords))
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except (KeyError, TypeError):
+            return default
+
+    def keys(self) -> List[Any]:
+        dim = self._param.dims[len(self._prefix)]
+        return [dim[k] for k in self._param.present_positions(self._prefix)]
+
+    def values(self) -> List[Any]:
+        return [self[k] for k in self.keys()]
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        return [(k, self[k]) for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._param.present_positions(self._prefix))
+
+    def __contains__(self, key: Any) -> bool:
+        p = self._param
+        depth = len(self._prefix)
+        if depth + 1 == len(p.dims):
+            c = p.pos[depth].get(key) if not isinstance(key, list) else None
+            return c is not None and p.has(self._prefix + (c,))
+        return self.get(key) is not None
+
+    def __repr__(self) -> str:
+        return f"ParamView({self._param.name}, depth={len(self._prefix)}, len={len(self)})"
+
+
+class DefaultParamDict(dict):
+    """1D param with a declared default: missing set elements read as the default."""
+
+    __slots__ = ("default", "domain")
+
+    def __init__(self, values: Dict[Any, Any], default: float, domain: Iterable[Any]) -> None:
+        super().__init__(values)
+        self.default = default
+        self.domain = frozenset(domain)
+
+    def __missing__(self, key: Any) -> float:
+        if key in self.domain:
+            return self.default
+        raise KeyError(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        # dict.get bypasses __missing__: in-domain keys still read as the declared default
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        return self.default if key in self.domain else default
+
+
+def _param_default(p: ParamDef) -> Optional[Union[int, float]]:
+    d = getattr(p, "default", None)
+    if d is None:
+        return None
+    if isinstance(d, bool) or not isinstance(d, (int, float)):
+        raise TypeError(f"Param '{p.name}' default must be a number.")
+    return d
+
+
+def _scalar_param_value(p: ParamDef) -> float:
+    v = p.values
+    if v is None and _param_default(p) is not None:
+        return float(_param_default(p))
+    if isinstance(v, dict) and len(v) == 1:
+        v = next(iter(v.values()))
+    if not isinstance(v, (int, float)):
+        raise TypeError(f"Scalar param '{p.name}' must be a number (or single-entry dict).")
+    return float(v)
+
+
+def build_param_env(params: List[ParamDef], env_sets: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """
+    Normalize ModelIR params into eval-ready values:
+      - 0D -> float
+      - 1D -> dict (as given; DefaultParamDict when a default is declared)
+      - rank >= 2 -> ParamView over an array-backed IndexedParam; falls back
+        to the raw (nested / tuple-key) dict when keys or values do not map
+        onto the declared sets, so indexing behaves as before.
+    """
+    env_params: Dict[str, Any] = {}
+    for p in params or []:
+        idx = list(p.indices or [])
+        if not idx:
+            env_params[p.name] = _scalar_param_value(p)
+            continue
+
+        default = _param_default(p)
+        values = p.values
+        if values is None:
+            if default is None:
+                env_params[p.name] = {}
+                continue
+            values = {}
+        if len(idx) == 1:
+            if not isinstance(values, dict):
+                raise TypeError(f"1D param '{p.name}' must be a dict.")
+            if default is not None and idx[0] in env_sets:
+                env_params[p.name] = DefaultParamDict(values, default, env_sets[idx[0]])
+            else:
+                env_params[p.name] = dict(values)
+            continue
+        if not isinstance(values, dict):
+            raise TypeError(f"{len(idx)}D param '{p.name}' must be a dict (nested or tuple-key).")
+
+        if any(s not in env_sets for s in idx):
+            env_params[p.name] = values
+            continue
+        try:
+            dims = [_unique(env_sets[s]) for s in idx]
+            env_params[p.name] = IndexedParam.from_values(p.name, dims, values, default).view()
+        except _Unpackable:
+            env_params[p.name] = values
+    return env_params
+
+
+# -----------------------------------------------------------------------------
+# Build profiling
+# -----------------------------------------------------------------------------
+PROFILE_TOP_N = 10
+
+
+class BuildProfiler:
+    """
+    Wall time and allocation counts per build phase, plus the top-N slowest
+    constraints (eval + add, summed over forall instances).
+
+    Allocations are net sys.getallocatedblocks() deltas, i.e. Python objects
+    still alive at the end of a phase; solver-side (C) memory is not counted.
+    """
+
+    def __init__(self, top_n: int = PROFILE_TOP_N) -> None:
+        self.top_n = top_n
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._slow: List[Tuple[float, int, Dict[str, Any]]] = []  # min-heap on sec
+        self._seq = 0
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        b0 = sys.getallocatedblocks()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            rec = self.phases.setdefault(name, {"sec": 0.0, "alloc_blocks": 0})
+            rec["sec"] += time.perf_counter() - t0
+            rec["alloc_blocks"] += sys.getallocatedblocks() - b0
+
+    def constraint(self, name: str, rows: int, sec: float, alloc_blocks: int) -> None:
+        item = {"name": name, "rows": rows, "sec": sec, "alloc_blocks": alloc_blocks}
+        self._seq += 1
+        if len(self._slow) < self.top_n:
+            heapq.heappush(self._slow, (sec, self._seq, item))
+        elif sec > self._slow[0][0]:
+            heapq.heapreplace(self._slow, (sec, self._seq, item))
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "total_sec": time.perf_counter() - self._t0,
+            "phases": {k: dict(v) for k, v in self.phases.items()},
+            "slowest_constraints": [it for _, _, it in sorted(self._slow, key=lambda t: -t[0])],
+        }
+
+
+@contextmanager
+def _no_phase(name: str) -> Iterator[None]:
+    yield
+
+
 # -----------------------------------------------------------------------------
 # IR -> Gurobi
 # -----------------------------------------------------------------------------
-def ir_to_gurobi(ir: ModelIR) -> gp.Model:
+BUILD_MODES = ("expr", "matrix", "stream")
+STREAM_BATCH_ROWS = 10000  # rows per addMConstr batch / update() in "stream" mode
+
+_MATRIX_SENSE = {"<=": "<", ">=": ">", "==": "="}
+
+
+def _linear_terms(x: Any) -> Optional[Tuple[List[int], List[float], float]]:
+    """
+    Split an evaluated expression side into (columns, coeffs, constant).
+    Repeated columns are not merged (addMConstr's CSR input sums them).
+    Returns None for anything that is not linear in model variables
+    (quadratic/general expressions, bools, unknown objects).
+    """
+    if isinstance(x, LinearTerms):
+        # AST evaluator output: the coefficient dict, no LinExpr in between
+        terms = x.coef.values()
+        return [t[0].index for t in terms], [t[1] for t in terms], float(x.const)
+    if isinstance(x, bool):
+        return None
+    if isinstance(x, (int, float)):
+        return [], [], float(x)
+    if isinstance(x, gp.Var):
+        return [x.index], [1.0], 0.0
+    if isinstance(x, gp.LinExpr):
+        n = x.size()
+        return [x.getVar(k).index for k in range(n)], [x.getCoeff(k) for k in range(n)], float(x.getConstant())
+    return None
+
+
+class _RowBuffer:
+    """
+    Collects linear rows as sparse (row, col, val) triplets and adds them to the
+    model with a single addMConstr call. Columns are Var.index values, so the
+    model must be updated after variable creation.
+    """
+
+    def __init__(self) -> None:
+        self.rows: List[int] = []
+        self.cols: List[int] = []
+        self.vals: List[float] = []
+        self.senses: List[str] = []
+        self.rhs: List[float] = []
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.senses)
+
+    def add(self, lhs: Any, sense: str, rhs: Any, name: str) -> bool:
+        """Append `lhs sense rhs` if both sides are linear; return False otherwise."""
+        if sense not in _MATRIX_SENSE:
+            return False
+        left = _linear_terms(lhs)
+        if left is None:
+            return False
+        right = _linear_terms(rhs)
+        if right is None:
+            return False
+        lcols, lvals, lconst = left
+        rcols, rvals, rconst = right
+        if not lcols and not rcols:
+            # constant-only row: keep the scalar path's behavior/errors
+            return False
+
+        r = len(self.senses)
+        self.rows.extend([r] * (len(lcols) + len(rcols)))
+        self.cols.extend(lcols)
+        self.cols.extend(rcols)
+        self.vals.extend(lvals)
+        self.vals.extend([-a for a in rvals])
+        self.senses.append(_MATRIX_SENSE[sense])
+        self.rhs.append(rconst - lconst)
+        self.names.append(name)
+        return True
+
+    def flush(self, m: gp.Model) -> int:
+        """Add all buffered rows to `m` in one matrix call; return the row count."""
+        n = len(self.senses)
+        if n == 0:
+            return 0
+        import scipy.sparse as sp
+
+        A = sp.csr_matrix(
+            (np.asarray(self.vals, dtype=float), (np.asarray(self.rows), np.asarray(self.cols))),
+            shape=(n, m.NumVars),
+        )
+        mc = m.addMConstr(A, None, np.asarray(self.senses), np.asarray(self.rhs, dtype=float))
+        m.setAttr("ConstrName", mc.tolist(), self.names)
+
+        self.rows, self.cols, self.vals = [], [], []
+        self.senses, self.rhs, self.names = [], [], []
+        return n
+
+
+def _add_scalar_constr(m: gp.Model, lhs: Any, sense: str, rhs: Any, name: str) -> None:
+    if sense == "<=":
+        m.addConstr(lhs <= rhs, name=name)
+    elif sense == ">=":
+        m.addConstr(lhs >= rhs, name=name)
+    elif sense == "==":
+        m.addConstr(lhs == rhs, name=name)
+    else:
+        raise ValueError(f"Unknown constraint sense '{sense}' in '{name}'.")
+
+
+def build_set_env(ir: ModelIR) -> Dict[str, List[Any]]:
+    return {s.name: list(s.elements) for s in (ir.sets or [])}
+
+
+def var_block_dims(v: VarDef, env_sets: Dict[str, List[Any]]) -> List[List[Any]]:
+    """Per-dimension element lists of an indexed var ([] for a scalar var)."""
+    idx = list(v.indices or [])
+    missing = [s for s in idx if s not in env_sets]
+    if missing:
+        raise KeyError(f"Var '{v.name}' refers to undefined set(s) {missing}.")
+    return [_unique(env_sets[s]) for s in idx]
+
+
+def make_eval_globals(
+    env_sets: Dict[str, Any],
+    env_params: Dict[str, Any],
+    env_vars: Dict[str, Any],
+    quicksum: Callable[..., Any],
+) -> Dict[str, Any]:
+    """Restricted eval globals: IR names + the small set of allowed helpers."""
+    global_env: Dict[str, Any] = {"__builtins__": {}}
+    global_env.update(env_sets)
+    global_env.update(env_params)
+    global_env.update(env_vars)
+    global_env["quicksum"] = quicksum
+    global_env.update(
+        {"sum": sum, "enumerate": enumerate, "range": range, "len": len, "max": max, "min": min, "abs": abs}
+    )
+    return global_env
+
+
+def iter_constraint_rows(
+    constraints: Iterable[ConstraintDef],
+    global_env: Dict[str, Any],
+    env_sets: Dict[str, List[Any]],
+    evaluate: Callable[[str, Dict[str, Any]], Any] = eval_expr,
+) -> Iterator[Tuple[str, Any, str, Any]]:
+    """
+    Evaluate constraints into (name, lhs, sense, rhs) rows.
+
+    A constraint with `forall` is compiled once and evaluated per binding;
+    bound symbols are placed in the globals (generator bodies inside eval
+    cannot see eval locals) and removed again afterwards.
+    evaluate(expr, global_env): eval_expr, or LinearEvaluator.evaluate.
+    """
+    for c in constraints:
+        lhs, rhs = c.expr_lhs, c.expr_rhs
+        bindings = forall_bindings(c)
+        if not bindings:
+            yield c.name, evaluate(lhs, global_env), c.sense, evaluate(rhs, global_env)
+            continue
+
+        syms = [sym for sym, _ in bindings]
+        for sym, set_name in bindings:
+            if set_name not in env_sets:
+                raise KeyError(f"Constraint '{c.name}' forall refers to undefined set '{set_name}'.")
+            if sym in global_env:
+                raise ValueError(f"Constraint '{c.name}' forall symbol '{sym}' shadows a defined name.")
+        domains = [_unique(env_sets[set_name]) for _, set_name in bindings]
+
+        try:
+            for values in itertools.product(*domains):
+                global_env.update(zip(syms, values))
+                name = f"{c.name}[{','.join(str(v) for v in values)}]"
+                yield name, evaluate(lhs, global_env), c.sense, evaluate(rhs, global_env)
+        finally:
+            for sym in syms:
+                global_env.pop(sym, None)
+
+
+def ir_to_gurobi(
+    ir: ModelIR,
+    build_mode: str = "expr",
+    build_info: Optional[Dict[str, Any]] = None,
+    env: Optional[gp.Env] = None,
+    profile: bool = False,
+    constraints: Optional[Iterable[ConstraintDef]] = None,
+    lazy_vars: bool = False,
+    expr_eval: str = "eval",
+) -> gp.Model:
     """
     Build a Gurobi model from ModelIR.
 
     Assumptions (kept intentionally strict and simple):
-      - constraints are scalar expressions (already unrolled)
+      - constraints are scalar expressions, or scalar templates with a
+        `forall` binding that is instantiated per set element here
       - expressions use Python syntax and only reference:
           sets, params, vars, and safe helper functions
+
+    build_mode:
+      - "expr":   one m.addConstr per constraint (default)
+      - "matrix": linear constraints are collected as sparse triplets and added
+                  with a single addMConstr call; nonlinear/constant rows fall
+                  back to the "expr" path. With expr_eval="ast" rows go from
+                  the evaluator's coefficient dict straight to triplets; with
+                  "eval" each row is still built as a LinExpr first and then
+                  taken apart, which is no faster than "expr"
+                  (compare with run_build_benchmark.py).
+      - "stream": like "matrix", but rows are flushed in batches of
+                  STREAM_BATCH_ROWS with an update() after each batch, so
+                  buffered triplets and pending modifications stay bounded
+                  no matter how many rows the IR expands to.
+    build_info: optional dict filled with build statistics.
+    env: Gurobi environment to create the model in (default environment if None).
+    profile: record per-phase timings into build_info["profile"] (see BuildProfiler).
+    constraints: optional iterable (e.g. a generator) consumed instead of
+                 ir.constraints; it is read once, one constraint at a time.
+    lazy_vars: create indexed variables on first access from the objective or
+               constraints instead of one bulk call per block; the number of
+               declared-but-unused variables goes to build_info["lazy_vars"].
+    expr_eval: "eval" (Python eval + gurobipy operators) or "ast" (LinearEvaluator:
+               one coefficient dict + addTerms per linear expression, eval()
+               fallback otherwise); AST/fallback counts go to build_info["expr_eval"].
     """
-    m = gp.Model(ir.meta.problem_id or "ir2solve_model")
+    if build_mode not in BUILD_MODES:
+        raise ValueError(f"Unknown build_mode '{build_mode}' (expected one of {BUILD_MODES}).")
+    if expr_eval not in EXPR_EVAL_MODES:
+        raise ValueError(f"Unknown expr_eval '{expr_eval}' (expected one of {EXPR_EVAL_MODES}).")
+    evaluator = LinearEvaluator(eval_expr) if expr_eval == "ast" else None
+    evaluate = evaluator.evaluate if evaluator is not None else eval_expr
 
-    # 1) sets
-    env_sets: Dict[str, List[Any]] = {s.name: list(s.elements) for s in (ir.sets or [])}
+    prof = BuildProfiler() if profile else None
+    phase = prof.phase if prof is not None else _no_phase
 
-    # 2) params (support 0/1/2D)
-    env_params: Dict[str, Any] = {}
-    for p in ir.params or []:
-        if not (p.indices or []):  # scalar
-            v = p.values
-            if isinstance(v, dict) and len(v) == 1:
-                v = next(iter(v.values()))
-            if not isinstance(v, (int, float)):
-                raise TypeError(f"Scalar param '{p.name}' must be a number (or single-entry dict).")
-            env_params[p.name] = float(v)
-
-        elif len(p.indices) == 1:
-            if p.values is None:
-                env_params[p.name] = {}
-            elif isinstance(p.values, dict):
-                env_params[p.name] = dict(p.values)
-            else:
-                raise TypeError(f"1D param '{p.name}' must be a dict.")
+    with phase("model"):
+        m = gp.Model(ir.meta.problem_id or "ir2solve_model", env=env)
 
-        elif len(p.indices) == 2:
-            if p.values is None:
-                env_params[p.name] = {}
-            elif isinstance(p.values, dict):
-                # accept either nested dict or tuple-key dict (verifier may normalize)
-                env_params[p.name] = p.values
-            else:
-                raise TypeError(f"2D param '{p.name}' must be a dict (nested or tuple-key).")
+    # 1) sets
+    with phase("sets"):
+        env_sets = build_set_env(ir)
 
-        else:
-            raise NotImplementedError("Params >2D are not supported.")
+    # 2) params (0D float, 1D dict, ND array-backed)
+    with phase("params"):
+        env_params = build_param_env(ir.params or [], env_sets)
 
-    # 3) vars (0/1/2D)
+    # 3) vars (0D Var; indexed blocks of any rank -> VarView over a VarBlock)
     def _vtype(vt: str):
         if vt == "binary":
             return GRB.BINARY
@@ -131,66 +1046,116 @@ def ir_to_gurobi(ir: ModelIR) -> gp.Model:
         return GRB.CONTINUOUS
 
     env_vars: Dict[str, Any] = {}
-    for v in ir.vars or []:
-        vt = _vtype(v.vartype)
-        ub = v.ub if v.ub is not None else GRB.INFINITY
-
-        if not (v.indices or []):
-            env_vars[v.name] = m.addVar(lb=v.lb, ub=ub, vtype=vt, name=v.name)
-
-        elif len(v.indices) == 1:
-            s = v.indices[0]
-            if s not in env_sets:
-                raise KeyError(f"Var '{v.name}' refers to undefined set '{s}'.")
-            d: Dict[Any, gp.Var] = {}
-            for i in env_sets[s]:
-                d[i] = m.addVar(lb=v.lb, ub=ub, vtype=vt, name=f"{v.name}[{i}]")
-            env_vars[v.name] = d
-
-        elif len(v.indices) == 2:
-            s1, s2 = v.indices
-            if s1 not in env_sets or s2 not in env_sets:
-                raise KeyError(f"Var '{v.name}' refers to undefined sets {v.indices}.")
-            d2: Dict[Any, Dict[Any, gp.Var]] = {}
-            for i in env_sets[s1]:
-                inner: Dict[Any, gp.Var] = {}
-                for j in env_sets[s2]:
-                    inner[j] = m.addVar(lb=v.lb, ub=ub, vtype=vt, name=f"{v.name}[{i},{j}]")
-                d2[i] = inner
-            env_vars[v.name] = d2
+    lazy_blocks: List[LazyVarBlock] = []
+    lazy_created = [0]  # total lazily created vars (Var.index needs update() in matrix modes)
 
-        else:
-            raise NotImplementedError("Vars >2D are not supported.")
+    def _lazy_factory(lb: float, ub: float, vt: str) -> Callable[[str], Any]:
+        def make(cell_name: str) -> Any:
+            lazy_created[0] += 1
+            return m.addVar(lb=lb, ub=ub, vtype=vt, name=cell_name)
 
-    # 4) eval env (safe)
-    eval_env: Dict[str, Any] = {}
-    eval_env.update(env_sets)
-    eval_env.update(env_params)
-    eval_env.update(env_vars)
-    eval_env["quicksum"] = gp.quicksum
-    eval_env.update(
-        {"sum": sum, "enumerate": enumerate, "range": range, "len": len, "max": max, "min": min, "abs": abs}
-    )
+        return make
 
-    global_env: Dict[str, Any] = {"__builtins__": {}}
-    global_env.update(eval_env)
+    with phase("vars"):
+        for v in ir.vars or []:
+            vt = _vtype(v.vartype)
+            ub = v.ub if v.ub is not None else GRB.INFINITY
+            dims = var_block_dims(v, env_sets)
+
+            if not dims:
+                env_vars[v.name] = m.addVar(lb=v.lb, ub=ub, vtype=vt, name=v.name)
+                continue
+
+            if lazy_vars:
+                block = LazyVarBlock(v.name, dims, _lazy_factory(v.lb, ub, vt))
+                lazy_blocks.append(block)
+                env_vars[v.name] = block.view()
+                continue
+
+            # one bulk call per block; names follow the x[i] / x[i,j] convention
+            env_vars[v.name] = VarBlock.create(m, v.name, dims, v.lb, ub, vt).view()
+
+    # 4) eval env (safe)
+    global_env = make_eval_globals(env_sets, env_params, env_vars, gp.quicksum)
 
     # 5) objective
-    obj = eval(ir.objective.expr, global_env, {})
-    m.setObjective(obj, GRB.MINIMIZE if ir.objective.sense.lower() == "min" else GRB.MAXIMIZE)
-
-    # 6) constraints
-    for c in ir.constraints or []:
-        lhs = eval(c.expr_lhs, global_env, {})
-        rhs = eval(c.expr_rhs, global_env, {})
-        if c.sense == "<=":
-            m.addConstr(lhs <= rhs, name=c.name)
-        elif c.sense == ">=":
-            m.addConstr(lhs >= rhs, name=c.name)
-        elif c.sense == "==":
-            m.addConstr(lhs == rhs, name=c.name)
-        else:
-            raise ValueError(f"Unknown constraint sense '{c.sense}' in '{c.name}'.")
+    with phase("objective"):
+        obj = evaluate(ir.objective.expr, global_env)
+        m.setObjective(obj, GRB.MINIMIZE if ir.objective.sense.lower() == "min" else GRB.MAXIMIZE)
+
+    # 6) constraints (forall templates are instantiated here)
+    stream = build_mode == "stream"
+    matrix = _RowBuffer() if build_mode in ("matrix", "stream") else None
+    if matrix is not None:
+        with phase("update"):
+            m.update()  # Var.index must be valid for column ids
+    indexed_upto = lazy_created[0]
+
+    # matrix modes read LinearTerms from the AST evaluator (no LinExpr per row)
+    row_evaluate = evaluator.evaluate_terms if (evaluator is not None and matrix is not None) else evaluate
+
+    n_scalar = 0
+    n_matrix = 0
+    nnz = 0
+    n_batches = 0
+    pending = 0  # scalar rows added since the last update() (stream mode)
+
+    def _flush() -> None:
+        nonlocal n_matrix, nnz, n_batches
+        nnz += len(matrix.vals)
+        n_matrix += matrix.flush(m)
+        n_batches += 1
+
+    with phase("constraints"):
+        for c in constraints if constraints is not None else (ir.constraints or []):
+            if prof is not None:
+                b0 = sys.getallocatedblocks()
+                t0 = time.perf_counter()
+            n_rows = 0
+            for name, lhs, sense, rhs in iter_constraint_rows([c], global_env, env_sets, row_evaluate):
+                n_rows += 1
+                if matrix is not None and lazy_created[0] != indexed_upto:
+                    m.update()  # vars created by this row need a valid Var.index
+                    indexed_upto = lazy_created[0]
+                if matrix is not None and matrix.add(lhs, sense, rhs, name):
+                    if stream and len(matrix) >= STREAM_BATCH_ROWS:
+                        _flush()
+                        m.update()
+                    continue
+                _add_scalar_constr(m, as_expr(lhs), sense, as_expr(rhs), name)
+                n_scalar += 1
+                if stream:
+                    pending += 1
+                    if pending >= STREAM_BATCH_ROWS:
+                        m.update()
+                        pending = 0
+            if prof is not None:
+                prof.constraint(c.name, n_rows, time.perf_counter() - t0, sys.getallocatedblocks() - b0)
+
+    if matrix is not None and len(matrix):
+        with phase("matrix_flush"):
+            _flush()
+
+    with phase("update"):
+        m.update()
 
-    m.update()
+    if build_info is not None:
+        build_info.update(
+            {
+                "build_mode": build_mode,
+                "num_vars": int(m.NumVars),
+                "num_constrs": int(m.NumConstrs),
+                "matrix_rows": n_matrix,
+                "matrix_nnz": nnz,
+                "scalar_rows": n_scalar,
+            }
+        )
+        if stream:
+            build_info["stream_batches"] = n_batches
+        if lazy_vars:
+            build_info["lazy_vars"] = lazy_var_report(lazy_blocks)
+        if evaluator is not None:
+            build_info["expr_eval"] = evaluator.report()
+        if prof is not None:
+            build_info["profile"] = prof.report()
     return m
@@ -0,0 +1,396 @@
+# ir2solve_lineval.py
+# AST evaluator for IR expressions that builds Gurobi linear expressions directly.
+#
+# eval() of "quicksum(c[i][j] * x[i][j] for i in I for j in J)" goes through
+# gurobipy operator overloading: one temporary LinExpr per product and per
+# partial sum, one generator frame per element and one intermediate row view
+# per partial subscript (x[i] before x[i][j]).
+#
+# LinearEvaluator translates the expression AST once (cached) into a Python
+# function that runs in the same restricted globals as eval() and, per
+# evaluation, accumulates coefficients in ONE dict {id(Var): [Var, coeff]}
+# (Var.__hash__ needs an updated model, id() does not):
+#   - + - and unary +/-, products and divisions by plain numbers, and
+#     quicksum/sum over generator expressions or list comprehensions are
+#     unrolled into statements and plain `for` loops;
+#   - every other sub-expression is evaluated exactly as eval() would, except
+#     that subscript chains x[i][j] are resolved with one lookup(path) call
+#     on VarView / ParamView.
+# The result is a single LinExpr filled with addTerms (a plain number for
+# constant expressions). evaluate_terms() returns the coefficient dict itself
+# (LinearTerms), which the matrix build modes turn into (col, coeff) triplets
+# without building a LinExpr.
+#
+# Expressions outside the grammar are evaluated with eval(). A product of two
+# variable terms (or any other non-linear value) is detected at evaluation time
+# and that evaluation is redone with eval(), so results never differ from the
+# eval path except for term order and merged duplicate terms.
+
+from __future__ import annotations
+
+from functools import lru_cache
+from types import FunctionType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import ast
+import math
+
+import gurobipy as gp
+import numpy as np
+
+
+EXPR_EVAL_MODES = ("eval", "ast")
+LINEAR_CACHE_MAXSIZE = 8192
+
+
+class _NotLinear(Exception):
+    """Raised at evaluation time when the expression is not linear in the vars."""
+
+
+class _Unsupported(Exception):
+    """Raised at translation time: the expression is left to eval()."""
+
+
+# -----------------------------------------------------------------------------
+# Runtime helpers (closure variables of the generated functions)
+# -----------------------------------------------------------------------------
+_NUMBER = (int, float, np.number)
+# exact classes taken by the inlined fast path; other numbers go through _mul_value
+_NUM_CLASSES = frozenset([int, float, np.float64, np.float32, np.int64, np.int32])
+
+
+def _add_value(v: Any, s: float, coef: Dict[int, List[Any]]) -> float:
+    """Add s * v into coef; returns the constant contribution."""
+    if isinstance(v, _NUMBER):
+        return s * v
+    if isinstance(v, gp.Var):
+        e = coef.get(id(v))
+        if e is None:
+            coef[id(v)] = [v, s]  # holding v keeps its id unique for this evaluation
+        else:
+            e[1] += s
+        return 0.0
+    if isinstance(v, gp.LinExpr):
+        for k in range(v.size()):
+            _add_value(v.getVar(k), s * v.getCoeff(k), coef)
+        return s * v.getConstant()
+    raise _NotLinear(type(v).__name__)
+
+
+def _mul_value(a: Any, b: Any, s: float, coef: Dict[int, List[Any]]) -> float:
+    """Add s * a * b into coef; at most one factor may be linear."""
+    if isinstance(a, _NUMBER):
+        return _add_value(b, s * a, coef)
+    if isinstance(b, _NUMBER):
+        return _add_value(a, s * b, coef)
+    raise _NotLinear("product of non-numeric factors")
+
+
+def _scalar(v: Any) -> Any:
+    if isinstance(v, _NUMBER):
+        return v
+    raise _NotLinear("non-numeric divisor")
+
+
+def _lookup(obj: Any, path: Tuple[Any, ...]) -> Any:
+    """obj[path[0]][path[1]]...; a single lookup(path) call for VarView / ParamView."""
+    lookup = getattr(obj, "lookup", None)
+    if lookup is not None:
+        return lookup(path)
+    for k in path:
+        obj = obj[k]
+    return obj
+
+
+def _check_sum(f: Any) -> None:
+    # sum/quicksum calls are unrolled: the name must still mean a plain sum
+    if f is not sum and f is not gp.quicksum:
+        raise _NotLinear("summation helper was rebound")
+
+
+_HELPERS: Dict[str, Any] = {
+    "_add_value": _add_value,
+    "_mul_value": _mul_value,
+    "_scalar": _scalar,
+    "_lookup": _lookup,
+    "_check_sum": _check_sum,
+    "_id": id,
+    "_Var": gp.Var,
+    "_NUMCLS": _NUM_CLASSES,
+}
+
+
+# -----------------------------------------------------------------------------
+# Translation: expression AST -> Python source
+# -----------------------------------------------------------------------------
+def _target_names(t: ast.AST) -> List[str]:
+    return [n.id for n in ast.walk(t) if isinstance(n, ast.Name)]
+
+
+class _ValueRewriter(ast.NodeTransformer):
+    """
+    Value context: names of unrolled loop variables -> generated locals, and
+    subscript chains -> _lookup(base, (k1, k2, ...)). Comprehensions left to
+    Python keep its scoping (their own targets shadow the outer names).
+    """
+
+    def __init__(self, names: Dict[str, str]) -> None:
+        self.names = names
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        new = self.names.get(node.id)
+        if new is None:
+            return node
+        return ast.copy_location(ast.Name(id=new, ctx=node.ctx), node)
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        keys = []
+        base: ast.AST = node
+        while isinstance(base, ast.Subscript):
+            keys.append(base.slice)
+            base = base.value
+        if len(keys) < 2:
+            return self.generic_visit(node)
+        call = ast.Call(
+            func=ast.Name(id="_lookup", ctx=ast.Load()),
+            args=[self.visit(base), ast.Tuple(elts=[self.visit(k) for k in reversed(keys)], ctx=ast.Load())],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+    def _visit_comp(self, node: Any) -> ast.AST:
+        saved = self.names
+        gens = []
+        for gen in node.generators:
+            it = self.visit(gen.iter)  # evaluated before this generator's targets are bound
+            bound = set(_target_names(gen.target))
+            self.names = {k: v for k, v in self.names.items() if k not in bound}
+            gens.append(ast.comprehension(target=gen.target, iter=it, ifs=[self.visit(c) for c in gen.ifs], is_async=0))
+        elt = self.visit(node.elt)
+        self.names = saved
+        return ast.copy_location(type(node)(elt=elt, generators=gens), node)
+
+    visit_GeneratorExp = _visit_comp
+    visit_ListComp = _visit_comp
+    visit_SetComp = _visit_comp
+
+
+class _Translator:
+    """Emits the body of `_lin(_c)`: statements adding scale * node into (_c, _k)."""
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.depth = 2
+        self.count = 0
+        self.names: Dict[str, str] = {}  # unrolled loop variable -> generated local
+
+    def tmp(self, prefix: str) -> str:
+        self.count += 1
+        return f"{prefix}{self.count}"
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.depth + line)
+
+    def value(self, node: ast.AST) -> str:
+        return ast.unparse(ast.fix_missing_locations(_ValueRewriter(self.names).visit(node)))
+
+    def neg(self, sc: str) -> str:
+        s = self.tmp("_s")
+        self.emit(f"{s} = -{sc}")
+        return s
+
+    def acc(self, node: ast.AST, sc: str) -> None:
+        if isinstance(node, ast.BinOp):
+            op = type(node.op)
+            if op is ast.Add:
+                self.acc(node.left, sc)
+                self.acc(node.right, sc)
+                return
+            if op is ast.Sub:
+                self.acc(node.left, sc)
+                self.acc(node.right, self.neg(sc))
+                return
+            if op is ast.Div:
+                s = self.tmp("_s")
+                self.emit(f"{s} = {sc} / _scalar({self.value(node.right)})")
+                self.acc(node.left, s)
+                return
+            if op is ast.Mult:
+                a, s = self.tmp("_t"), self.tmp("_s")
+                self.emit(f"{a} = {self.value(node.left)}")
+                self.emit(f"if {a}.__class__ in _NUMCLS:")
+                self.depth += 1
+                self.emit(f"{s} = {sc} * {a}")
+                self.acc(node.right, s)
+                self.depth -= 1
+                self.emit("else:")
+                self.emit(f"    _k += _mul_value({a}, {self.value(node.right)}, {sc}, _c)")
+                return
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            self.acc(node.operand, self.neg(sc) if isinstance(node.op, ast.USub) else sc)
+            return
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in ("quicksum", "sum")
+            and node.func.id not in self.names
+            and len(node.args) == 1
+            and not node.keywords
+            and isinstance(node.args[0], (ast.GeneratorExp, ast.ListComp))
+        ):
+            self.acc_comprehension(node.func.id, node.args[0], sc)
+            return
+        self.acc_value(self.value(node), sc)
+
+    def acc_value(self, expr: str, sc: str) -> None:
+        t = self.tmp("_t")
+        self.emit(f"{t} = {expr}")
+        self.emit(f"if {t}.__class__ is _Var:")
+        self.emit(f"    _e = _c.get(_id({t}))")
+        self.emit("    if _e is None:")
+        self.emit(f"        _c[_id({t})] = [{t}, {sc}]")
+        self.emit("    else:")
+        self.emit(f"        _e[1] += {sc}")
+        self.emit(f"elif {t}.__class__ in _NUMCLS:")
+        self.emit(f"    _k += {sc} * {t}")
+        self.emit("else:")
+        self.emit(f"    _k += _add_value({t}, {sc}, _c)")
+
+    def acc_comprehension(self, func: str, comp: Any, sc: str) -> None:
+        self.emit(f"_check_sum({func})")
+        saved_names, saved_depth = dict(self.names), self.depth
+        for gen in comp.generators:
+            it = self.value(gen.iter)
+            for name in _target_names(gen.target):
+                self.names[name] = self.tmp("_v")
+            self.emit(f"for {self.target(gen.target)} in {it}:")
+            self.depth += 1
+            for cond in gen.ifs:
+                self.emit(f"if {self.value(cond)}:")
+                self.depth += 1
+        self.acc(comp.elt, sc)
+        self.names, self.depth = saved_names, saved_depth
+
+    def target(self, t: ast.AST) -> str:
+        if isinstance(t, ast.Name):
+            return self.names[t.id]
+        if isinstance(t, (ast.Tuple, ast.List)):
+            return "(" + "".join(self.target(e) + ", " for e in t.elts) + ")"
+        raise _Unsupported(type(t).__name__)
+
+
+def _supported(tree: ast.AST) -> bool:
+    for n in ast.walk(tree):
+        # generated names start with "_"; IR names do not
+        if isinstance(n, ast.Name) and n.id.startswith("_"):
+            return False
+        if isinstance(n, ast.Attribute) and n.attr.startswith("_"):
+            return False
+        if isinstance(n, (ast.Lambda, ast.NamedExpr, ast.Await, ast.Yield, ast.YieldFrom, ast.DictComp)):
+            return False
+        if isinstance(n, ast.comprehension) and n.is_async:
+            return False
+        if isinstance(n, ast.Constant) and isinstance(n.value, float) and not math.isfinite(n.value):
+            return False
+    return True
+
+
+def translate_linear(expr: str) -> Optional[str]:
+    """Source of the accumulating function for `expr`; None if it is left to eval()."""
+    try:
+        tree = ast.parse((expr or "").strip(), mode="eval")
+    except SyntaxError:
+        return None
+    if not _supported(tree):
+        return None
+    tr = _Translator()
+    try:
+        tr.acc(tree.body, "1.0")
+    except _Unsupported:
+        return None
+    head = [f"def _factory({', '.join(_HELPERS)}):", "    def _lin(_c):", "        _k = 0.0"]
+    return "\n".join(head + tr.lines + ["        return _k", "    return _lin", ""])
+
+
+@lru_cache(maxsize=LINEAR_CACHE_MAXSIZE)
+def compile_linear(expr: str) -> Optional[FunctionType]:
+    """Accumulating function for `expr` (cached); None if it is left to eval()."""
+    src = translate_linear(expr)
+    if src is None:
+        return None
+    ns: Dict[str, Any] = {"__builtins__": {}}
+    try:
+        exec(compile(src, "<ir-expr>", "exec"), ns)
+    except (SyntaxError, RecursionError):  # e.g. too many statically nested loops
+        return None
+    return ns["_factory"](**_HELPERS)
+
+
+# -----------------------------------------------------------------------------
+# Evaluator
+# -----------------------------------------------------------------------------
+class LinearTerms(NamedTuple):
+    """Result of a translated evaluation: sum of coeff * Var over coef, plus const."""
+
+    coef: Dict[int, List[Any]]  # id(Var) -> [Var, coeff]
+    const: float
+
+    def to_expr(self) -> Any:
+        """gp.LinExpr (a plain number when there are no terms), as evaluate() returns."""
+        if not self.coef:
+            return self.const
+        e = gp.LinExpr(self.const)
+        e.addTerms([t[1] for t in self.coef.values()], [t[0] for t in self.coef.values()])
+        return e
+
+
+def as_expr(v: Any) -> Any:
+    """LinearTerms -> LinExpr / number; anything else unchanged."""
+    return v.to_expr() if isinstance(v, LinearTerms) else v
+
+
+class LinearEvaluator:
+    """
+    evaluate(expr, global_env) -> gp.LinExpr (a plain number for constant
+    expressions), with the same globals eval() gets in ir_to_gurobi.
+    evaluate_terms(expr, global_env) -> LinearTerms, or the eval() value when
+    the expression had to fall back.
+    Counts translated evaluations vs eval() fallbacks.
+    """
+
+    def __init__(self, fallback: Callable[[str, Dict[str, Any]], Any]) -> None:
+        self.fallback = fallback
+        self.ast_evals = 0
+        self.fallback_evals = 0
+        self._bound: Dict[Tuple[str, int], Callable[[Dict[int, List[Any]]], float]] = {}
+
+    def _function(self, expr: str, global_env: Dict[str, Any]) -> Optional[Callable[[Dict[int, List[Any]]], float]]:
+        key = (expr, id(global_env))
+        f = self._bound.get(key)
+        if f is None:
+            g = compile_linear(expr)
+            if g is None:
+                return None
+            # same code, resolved against this build's globals (as eval() would)
+            f = FunctionType(g.__code__, global_env, g.__name__, None, g.__closure__)
+            self._bound[key] = f
+        return f
+
+    def evaluate_terms(self, expr: str, global_env: Dict[str, Any]) -> Any:
+        f = self._function(expr, global_env)
+        if f is not None:
+            coef: Dict[int, List[Any]] = {}
+            try:
+                const = f(coef)
+            except _NotLinear:
+                pass
+            else:
+                self.ast_evals += 1
+                return LinearTerms(coef, const)
+        self.fallback_evals += 1
+        return self.fallback(expr, global_env)
+
+    def evaluate(self, expr: str, global_env: Dict[str, Any]) -> Any:
+        return as_expr(self.evaluate_terms(expr, global_env))
+
+    def report(self) -> Dict[str, int]:
+        return {"ast": self.ast_evals, "fallback": self.fallback_evals}
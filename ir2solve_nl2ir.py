@@ -1,12 +1,13 @@
 # ir2solve_nl2ir.py
 # NL -> JSON IR text -> ModelIR parsing utilities
-#   - NL2IR prompt provides a *compile-safe baseline* (strict JSON, scalar constraints,
-#     canonical indexing, conservative integrality).
+#   - NL2IR prompt provides a *compile-safe baseline* (strict JSON, scalar constraints
+#     or forall templates, canonical indexing, conservative integrality).
 
 from __future__ import annotations
 
 import json
 import re
+import sys
 from dataclasses import fields
 from typing import Any, Dict, Optional
 
@@ -23,6 +24,10 @@ from ir2solve_ir import (
 # =============================================================================
 # 1) Prompt Constants (compile-safe baseline)
 # =============================================================================
+# Layout for provider-side prefix caching: everything static (instructions +
+# schema) is the system message, byte-identical for every request; the user
+# message holds only what varies, most-shared first (L3 type block, then the
+# problem text). Repeated requests then hit the cached prefix.
 
 BASE_SYSTEM_PROMPT = """
 You are an expert in mathematical modeling and optimization.
@@ -69,21 +74,26 @@ A list of sets. Each set is:
 A list of parameters. Each param is:
 {
   "name": "string",
-  "indices": [] | ["SetName"] | ["SetName1","SetName2"],  // 0D/1D/2D only
-  "values": number | {key:number,...} | {i:{j:number,...},...},   // recommended canonical forms below
-  "description": "string or null"
+  "indices": [] | ["SetName"] | ["SetName1","SetName2", ...],  // 0D/1D/2D/... (one set per dimension)
+  "values": number | {key:number,...} | {i:{j:number,...},...} | deeper nesting,   // recommended canonical forms below
+  "description": "string or null",
+  "default": null | number   // optional: value of every entry omitted from "values"
 }
 
 Canonical forms for values:
 - Scalar (0D): a number (or a single-entry dict is tolerated by the compiler)
 - 1D over set I: {"i1": 1.0, "i2": 2.0, ...}
 - 2D over sets I,J (RECOMMENDED): {"i1": {"j1": 1.0, "j2": 3.0}, "i2": {...}, ...}
+- 3D+ over sets I,J,K: one nesting level per index, e.g. {"i1": {"j1": {"k1": 1.0, ...}, ...}, ...}
+- Sparse params (most entries share one value, e.g. 0 for "no arc"): set "default" to that value and
+  list ONLY the other entries; do NOT spell out the default entries. Without "default", every entry
+  that an expression reads must be listed.
 
 4) vars
 A list of decision variables. Each var is:
 {
   "name": "string",
-  "indices": [] | ["SetName"] | ["SetName1","SetName2"],  // 0D/1D/2D only
+  "indices": [] | ["SetName"] | ["SetName1","SetName2", ...],  // 0D/1D/2D/... (one set per dimension)
   "vartype": "continuous" | "integer" | "binary",
   "lb": number,
   "ub": number or null,
@@ -110,7 +120,8 @@ A list of constraints. Each constraint is:
   "expr_lhs": "Python expression string",
   "sense": "<=" | ">=" | "==",
   "expr_rhs": "Python expression string",
-  "description": "string or null"
+  "description": "string or null",
+  "forall": null | [["i","I"], ["j","J"], ...]   // optional: the constraint holds for every i in I (and j in J, ...)
 }
 
 ==== Expression rules (compile-safe baseline) ====
@@ -122,10 +133,12 @@ Allowed building blocks inside expr strings:
   (You may nest sums, e.g., quicksum(quicksum(x[i][j] for j in J) for i in I))
 
 Hard constraints (must follow):
-- Every constraint must be a SINGLE SCALAR constraint (lhs and rhs each evaluate to a scalar).
-- Do NOT write implicit "for all" constraints inside one constraint (e.g., "for i in I: ...").
-  If a constraint must hold for each i, EXPAND it into multiple entries in the constraints list.
-- Do NOT use free index symbols (i/j/t/...) outside of a sum/generator that binds them.
+- Every constraint must be a SINGLE SCALAR constraint (lhs and rhs each evaluate to a scalar)
+  for each binding of its "forall" symbols.
+- Do NOT write implicit "for all" constraints inside one expression (e.g., "for i in I: ...").
+  If a constraint must hold for each i in I, write ONE entry with "forall": [["i","I"]] and use i
+  freely in expr_lhs/expr_rhs. Do NOT expand it into one entry per element.
+- Do NOT use free index symbols (i/j/t/...) unless they are bound by "forall" or by a sum/generator.
 - Do NOT use list comprehensions that build lists; only generator expressions inside sum/quicksum.
 
 ==== Output template (fill it; keep keys exactly) ====
@@ -175,7 +188,16 @@ Hard constraints (must follow):
       "expr_lhs": "x['A'] + x['B']",
       "sense": ">=",
       "expr_rhs": "1.0",
-      "description": null
+      "description": null,
+      "forall": null
+    },
+    {
+      "name": "cap",
+      "expr_lhs": "cost[i] * x[i]",
+      "sense": "<=",
+      "expr_rhs": "10.0",
+      "description": null,
+      "forall": [["i", "I"]]
     }
   ]
 }
@@ -183,18 +205,27 @@ Hard constraints (must follow):
 Before outputting, self-check:
 - JSON parses; keys match schema; no extra keys.
 - All referenced names (sets/params/vars) are defined.
-- No free indices; per-index constraints are expanded.
+- No free indices; every index symbol is bound by "forall" or by a generator.
 """.strip()
 
 
+STATIC_SYSTEM_PROMPT = BASE_SYSTEM_PROMPT + "\n\n" + SCHEMA_AND_INSTRUCTIONS
+
+
 def build_system_prompt() -> str:
-    return BASE_SYSTEM_PROMPT
+    return STATIC_SYSTEM_PROMPT
 
 
-def build_user_prompt(question_text: str) -> str:
+def build_user_prompt(question_text: str, type_instructions: Optional[str] = None) -> str:
+    """
+    Instance part of the NL2IR request. type_instructions: L3 type-specific
+    block, placed ahead of the problem text so requests of the same type
+    share it as part of the cached prefix.
+    """
+    head = f"TYPE-SPECIFIC INSTRUCTIONS:\n{type_instructions}\n\n" if type_instructions else ""
     return (
-        SCHEMA_AND_INSTRUCTIONS
-        + "\n\nNow read the following optimization problem and output the JSON IR (JSON ONLY):\n\n"
+        head
+        + "Now read the following optimization problem and output the JSON IR (JSON ONLY):\n\n"
         + (question_text or "")
     )
 
@@ -278,25 +309,58 @@ def _filter_kwargs_for(cls, data: Dict[str, Any]) -> Dict[str, Any]:
     return {k: v for k, v in data.items() if k in valid}
 
 
-def json_to_model_ir(data: Dict[str, Any]) -> ModelIR:
+def _intern(x: Any) -> Any:
+    return sys.intern(x) if type(x) is str else x
+
+
+def _intern_values(v: Any) -> Any:
+    """Param values with every (nested) dict key interned; leaves are kept as-is."""
+    if isinstance(v, dict):
+        return {_intern(k): _intern_values(x) for k, x in v.items()}
+    return v
+
+
+def _compact_kwargs(kw: Dict[str, Any]) -> Dict[str, Any]:
+    """Intern names, index lists, set elements and param keys (shared str objects across the IR)."""
+    out = dict(kw)
+    for k in ("name", "sense", "vartype"):
+        if k in out:
+            out[k] = _intern(out[k])
+    for k in ("indices", "elements"):
+        if isinstance(out.get(k), list):
+            out[k] = [_intern(x) for x in out[k]]
+    if "values" in out:
+        out["values"] = _intern_values(out["values"])
+    return out
+
+
+def json_to_model_ir(data: Dict[str, Any], compact: bool = False) -> ModelIR:
     """
     Convert a parsed JSON dict into ModelIR dataclasses.
     Unknown fields are ignored (minimal robustness); schema violations should be caught by verifier.
+
+    compact: intern set elements, param keys, names and index lists, so every
+    distinct element string is stored once per process instead of once per
+    occurrence (useful when many IRs are kept in memory).
     """
     if not isinstance(data, dict):
         raise TypeError("ModelIR JSON must be an object (dict).")
 
+    def _kw(cls, d: Any) -> Dict[str, Any]:
+        kw = _filter_kwargs_for(cls, d)
+        return _compact_kwargs(kw) if compact else kw
+
     meta = MetaInfo(**_filter_kwargs_for(MetaInfo, data.get("meta") or {}))
 
-    sets = [SetDef(**_filter_kwargs_for(SetDef, s)) for s in (data.get("sets") or [])]
-    params = [ParamDef(**_filter_kwargs_for(ParamDef, p)) for p in (data.get("params") or [])]
-    vars_ = [VarDef(**_filter_kwargs_for(VarDef, v)) for v in (data.get("vars") or [])]
+    sets = [SetDef(**_kw(SetDef, s)) for s in (data.get("sets") or [])]
+    params = [ParamDef(**_kw(ParamDef, p)) for p in (data.get("params") or [])]
+    vars_ = [VarDef(**_kw(VarDef, v)) for v in (data.get("vars") or [])]
 
     obj_raw = data.get("objective") or {}
-    obj = ObjectiveDef(**_filter_kwargs_for(ObjectiveDef, obj_raw))
+    obj = ObjectiveDef(**_kw(ObjectiveDef, obj_raw))
 
     constraints = [
-        ConstraintDef(**_filter_kwargs_for(ConstraintDef, c))
+        ConstraintDef(**_kw(ConstraintDef, c))
         for c in (data.get("constraints") or [])
     ]
 
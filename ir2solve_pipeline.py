@@ -1,15 +1,23 @@
 # ir2solve_pipeline.py
-# NL -> LLM -> JSON IR -> ModelIR -> verifier (L1/L2/L3) -> Gurobi
+# NL -> LLM -> JSON IR -> ModelIR -> verifier (L1/L2/L3) -> presolve -> solver backend (Gurobi / HiGHS)
+# run_ir2solve_pipeline (OpenAI) / run_ir2solve_pipeline_async (AsyncOpenAI) drive the same stages.
+# Requests yielded with stream=True are consumed through ir2solve_stream (StreamedCompletion).
 
 from __future__ import annotations
 
+from concurrent.futures import Executor
 from dataclasses import dataclass, is_dataclass
-from typing import Any, Dict, Optional, List, Tuple
+from types import SimpleNamespace
+from typing import Any, Dict, Generator, Optional, List, Tuple
+import asyncio
 
-from openai import OpenAI
-from gurobipy import GRB
+from openai import AsyncOpenAI, OpenAI
 
-from ir2solve_ir import ModelIR, ir_to_gurobi
+from ir2solve_ir import ModelIR, expr_cache_info, expr_cache_delta
+from ir2solve_presolve import presolve_ir
+from ir2solve_cache import get_model_cache, get_solve_cache, solve_cache_key
+from ir2solve_fingerprint import ir_fingerprints
+from ir2solve_backend import BuiltModel, GurobiBackend, SolveOutcome, configure_env_pool, get_backend
 from ir2solve_nl2ir import (
     build_system_prompt,
     build_user_prompt,
@@ -17,6 +25,8 @@ from ir2solve_nl2ir import (
     json_to_model_ir,
 )
 from ir2solve_verifier_core import run_verifier, VerifierConfig
+from ir2solve_ratelimit import LLMScope, current_llm_scope, llm_scope
+from ir2solve_stream import StreamedCompletion, stream_completion, stream_completion_async
 
 from llm2code import build_generate_message, llm_to_gurobi
 
@@ -30,12 +40,47 @@ class PipelineConfig:
     model_name: str = "gpt-4o"
     temperature: float = 0.0
     timelimit_sec: float = 60.0
+    build_mode: str = "expr"  # "expr" | "matrix" | "stream" (see ir_to_gurobi)
+    solver_backend: str = "gurobi"  # "gurobi" | "highs" (see ir2solve_backend)
+    solver_threads: int = 0  # Gurobi Threads per solve (0 = all cores)
+    env_pool_size: int = 2  # shared Gurobi environments (>= concurrent workers)
+    solver_log: bool = False
+    profile_build: bool = False  # per-phase build timings -> trace["build"]["profile"]
+    lazy_vars: bool = False  # create indexed vars on first use; unused counts -> trace["build"]["lazy_vars"]
+    compact_ir: bool = True  # intern element/key strings when parsing the IR (json_to_model_ir(compact=True))
+    # "eval" | "ast": how IR expressions become LinExprs (Gurobi, see ir2solve_lineval);
+    # "ast" is opt-in, compare both with run_build_benchmark.py first
+    expr_eval: str = "eval"
+
+    # compiled-model cache (Gurobi backend; None disables, see ir2solve_cache)
+    model_cache_dir: Optional[str] = None
+    model_cache_max_mb: float = 512.0
+    model_cache_max_age_days: float = 7.0
+
+    # solve-result cache (SQLite file; None disables, see ir2solve_cache.SolveCache)
+    solve_cache_path: Optional[str] = None
+    # on a solve-cache miss, use the latest solution of a structurally identical IR
+    # (same template, other numbers) as a MIP start (Gurobi only)
+    warm_start_on: bool = True
+    # reuse the L3 acceptance solve of a rebuilt IR (OPTIMAL -> no final solve,
+    # FEASIBLE -> its solution is the MIP start of the final solve)
+    reuse_acceptance_on: bool = True
+
+    # total time this instance may spend in LLM calls, including rate-limiter
+    # waits and retry backoff (enforced by ir2solve_ratelimit.LLMThrottle; None = no limit)
+    llm_deadline_sec: Optional[float] = None
+    # stream the NL->IR completion and check sets/params/vars as each closes;
+    # a fatal schema error stops generation early (see ir2solve_stream, trace["stream"])
+    stream_nl2ir: bool = False
 
     # switches for ablation
     layer1_on: bool = True
     layer2_on: bool = True
     layer3_on: bool = True
     repairs_on: bool = True
+    # IR presolve before the deterministic build (see ir2solve_presolve); off by
+    # default: it evaluates every row in Python, about the cost of the build itself
+    presolve_on: bool = False
     determine_on: bool = True
     estimate_on: bool = True
 
@@ -74,7 +119,31 @@ def _safe_meta_fill(data: Dict[str, Any], problem_id: Optional[str], meta_overri
         data["meta"]["problem_id"] = "ir2solve_instance"
 
 
-def _build_verifier_config(cfg: PipelineConfig) -> VerifierConfig:
+def _accepted_solve(report: Dict[str, Any], fingerprint: str, backend: str) -> Optional[Dict[str, Any]]:
+    """Acceptance record of the L3 repair that produced exactly this IR on this backend, if any."""
+    if not fingerprint or not isinstance(report, dict):
+        return None
+    for rep in reversed(report.get("repairs", []) or []):
+        acc = rep.get("acceptance") if isinstance(rep, dict) else None
+        if not isinstance(acc, dict) or not isinstance(acc.get("outcome"), dict):
+            continue
+        if acc.get("fingerprint") == fingerprint and acc.get("backend") == backend:
+            return acc
+    return None
+
+
+def _drop_acceptance_solutions(report: Dict[str, Any]) -> None:
+    """Replace acceptance solution vectors by their length; the report is written to JSON per instance."""
+    if not isinstance(report, dict):
+        return
+    for rep in report.get("repairs", []) or []:
+        acc = rep.get("acceptance") if isinstance(rep, dict) else None
+        out = acc.get("outcome") if isinstance(acc, dict) else None
+        if isinstance(out, dict) and "solution" in out:
+            out["solution_vars"] = len(out.pop("solution") or ())
+
+
+def _build_verifier_config(cfg: PipelineConfig, client: Optional[OpenAI] = None) -> VerifierConfig:
     """
     Pass fields that exist on VerifierConfig.
     """
@@ -83,6 +152,8 @@ def _build_verifier_config(cfg: PipelineConfig) -> VerifierConfig:
         "layer2_on": cfg.layer2_on,
         "layer3_on": cfg.layer3_on,
         "repairs_on": cfg.repairs_on,
+        "solver_backend": cfg.solver_backend,
+        "llm_client": client,
     }
     if is_dataclass(VerifierConfig):
         fset = set(VerifierConfig.__dataclass_fields__.keys())
@@ -90,19 +161,6 @@ def _build_verifier_config(cfg: PipelineConfig) -> VerifierConfig:
     return VerifierConfig(**kwargs)
 
 
-def _status_name(code: int) -> str:
-    status_map = {
-        GRB.OPTIMAL: "OPTIMAL",
-        GRB.INFEASIBLE: "INFEASIBLE",
-        GRB.UNBOUNDED: "UNBOUNDED",
-        GRB.INF_OR_UNBD: "INF_OR_UNBD",
-        GRB.TIME_LIMIT: "TIME_LIMIT",
-        GRB.INTERRUPTED: "INTERRUPTED",
-        GRB.SUBOPTIMAL: "SUBOPTIMAL",
-    }
-    return status_map.get(code, str(code))
-
-
 def _extract_kinds(report: Dict[str, Any]) -> Tuple[List[str], List[str]]:
     issues_k: List[str] = []
     repairs_k: List[str] = []
@@ -131,6 +189,112 @@ def run_ir2solve_pipeline(
     if config is None:
         config = PipelineConfig()
 
+    with llm_scope(config.llm_deadline_sec) as scope:
+        steps = _pipeline_steps(question_text, config, problem_id, meta_override, client, scope)
+        value: Any = None
+        exc: Optional[BaseException] = None
+        while True:
+            done, item = _advance(steps, value, exc)
+            if done:
+                return item
+            try:
+                if item.get("stream"):
+                    value, exc = stream_completion(client, **item), None
+                else:
+                    value, exc = client.chat.completions.create(**item), None
+            except Exception as e:
+                value, exc = None, e
+
+
+async def run_ir2solve_pipeline_async(
+    question_text: str,
+    client: Optional[AsyncOpenAI] = None,
+    config: Optional[PipelineConfig] = None,
+    problem_id: Optional[str] = None,
+    meta_override: Optional[Dict[str, Any]] = None,
+    executor: Optional[Executor] = None,
+) -> PipelineResult:
+    """
+    Same stages and result as run_ir2solve_pipeline. LLM requests are awaited
+    on the event loop; everything between them (parsing, verifier, build,
+    solve) runs on `executor` (None -> the loop's default executor).
+    The verifier is sync code: its L3 rebuild reaches `client` through
+    _SyncClientBridge and blocks only its executor thread meanwhile.
+    """
+    if client is None:
+        client = AsyncOpenAI()
+    if config is None:
+        config = PipelineConfig()
+
+    loop = asyncio.get_running_loop()
+    # the scope lives in this task's context; executor threads do not see it
+    with llm_scope(config.llm_deadline_sec) as scope:
+        steps = _pipeline_steps(
+            question_text, config, problem_id, meta_override, _SyncClientBridge(client, loop), scope
+        )
+        value: Any = None
+        exc: Optional[BaseException] = None
+        while True:
+            done, item = await loop.run_in_executor(executor, _advance, steps, value, exc)
+            if done:
+                return item
+            try:
+                if item.get("stream"):
+                    value, exc = await stream_completion_async(client, **item), None
+                else:
+                    value, exc = await client.chat.completions.create(**item), None
+            except Exception as e:
+                value, exc = None, e
+
+
+def _advance(steps: Generator[Dict[str, Any], Any, PipelineResult], value: Any, exc: Optional[BaseException]) -> Tuple[bool, Any]:
+    """
+    Run the pipeline up to its next LLM request, sending in the previous
+    response (or raising the previous call's exception at the yield).
+    Returns (False, request kwargs) or (True, PipelineResult).
+    """
+    try:
+        return False, (steps.throw(exc) if exc is not None else steps.send(value))
+    except StopIteration as stop:
+        return True, stop.value
+
+
+class _SyncClientBridge:
+    """
+    Blocking client.chat.completions.create() for sync code on an executor
+    thread, forwarded to an AsyncOpenAI client running on `loop`.
+    """
+
+    def __init__(self, client: AsyncOpenAI, loop: asyncio.AbstractEventLoop) -> None:
+        self._client = client
+        self._loop = loop
+        # calls run as new tasks on the loop: carry over the instance's LLM scope
+        self._scope = current_llm_scope()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs: Any) -> Any:
+        async def call() -> Any:
+            with llm_scope(scope=self._scope):
+                return await self._client.chat.completions.create(**kwargs)
+
+        return asyncio.run_coroutine_threadsafe(call(), self._loop).result()
+
+
+def _pipeline_steps(
+    question_text: str,
+    config: PipelineConfig,
+    problem_id: Optional[str],
+    meta_override: Optional[Dict[str, Any]],
+    client: Any,
+    scope: Optional[LLMScope] = None,
+) -> Generator[Dict[str, Any], Any, PipelineResult]:
+    """
+    The pipeline stages. Yields chat.completions.create kwargs and receives
+    the response, so the same code runs under the sync and async drivers
+    (a StreamedCompletion for requests with stream=True).
+    `client` is only used by the verifier (L3 rebuild); `scope` is the
+    instance's LLM scope, reported in the trace.
+    """
     failure_stage = ""
     error = ""
 
@@ -141,6 +305,17 @@ def run_ir2solve_pipeline(
     gurobi_status: Optional[int] = None
     gurobi_status_name: str = "NONE"
     gurobi_obj_value: Optional[float] = None
+    build_info: Dict[str, Any] = {}
+    presolve_report: Dict[str, Any] = {}
+    fingerprint: Dict[str, str] = {}
+    solve_cache_info: Dict[str, Any] = {}
+
+    # Gurobi environments are shared by the final solve and L3 acceptance tests
+    configure_env_pool(size=config.env_pool_size, threads=config.solver_threads)
+
+    # compiled-expression cache is process-wide; report this instance's share
+    # (includes other instances' compiles when pipelines run concurrently)
+    expr_cache_before = expr_cache_info()
 
     # --- 1) prompts ---
     system_prompt = ""
@@ -154,9 +329,10 @@ def run_ir2solve_pipeline(
 
     # --- 2) LLM ---
     raw_llm_text = ""
+    stream_info: Dict[str, Any] = {}
     if not failure_stage:
         try:
-            completion = client.chat.completions.create(
+            request: Dict[str, Any] = dict(
                 model=config.model_name,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -164,7 +340,20 @@ def run_ir2solve_pipeline(
                 ],
                 temperature=config.temperature,
             )
-            raw_llm_text = completion.choices[0].message.content or ""
+            if config.stream_nl2ir:
+                request["stream"] = True
+            completion = yield request
+            if isinstance(completion, StreamedCompletion):
+                raw_llm_text = completion.text
+                stream_info = completion.stream
+                # the usage chunk bypasses LLMThrottle; count it here
+                if scope is not None:
+                    scope.add_usage(completion)
+                if completion.aborted:
+                    failure_stage = "llm_stream_abort"
+                    error = str((completion.fatal or {}).get("message", ""))
+            else:
+                raw_llm_text = completion.choices[0].message.content or ""
         except Exception as e:
             failure_stage = "llm_call"
             error = f"{type(e).__name__}: {e}"
@@ -196,7 +385,7 @@ def run_ir2solve_pipeline(
     # --- 5) JSON -> ModelIR ---
     if not failure_stage:
         try:
-            ir = json_to_model_ir(data)
+            ir = json_to_model_ir(data, compact=config.compact_ir)
         except Exception as e:
             failure_stage = "ir_parse"
             error = f"{type(e).__name__}: {e}"
@@ -205,51 +394,164 @@ def run_ir2solve_pipeline(
     # --- 6) verifier ---
     if not failure_stage and ir is not None:
         try:
-            vcfg = _build_verifier_config(config)
+            vcfg = _build_verifier_config(config, client)
             ir, verifier_report = run_verifier(ir, config=vcfg)
         except Exception as e:
             failure_stage = "verifier"
             error = f"{type(e).__name__}: {e}"
 
-    # --- 7) Gurobi build + optimize ---
-    if not failure_stage and ir is not None:
+    if ir is not None:
+        try:
+            fingerprint = ir_fingerprints(ir)
+        except Exception:
+            pass
+
+    # --- 7a) solve cache (deterministic build path only) ---
+    solve_cache = None
+    cache_key = ""
+    if not failure_stage and ir is not None and config.determine_on and config.solve_cache_path and fingerprint:
+        try:
+            solve_cache = get_solve_cache(config.solve_cache_path)
+            # the solver settings that can change the outcome are part of the key
+            cache_key = solve_cache_key(
+                fingerprint["full"],
+                config.solver_backend,
+                params={"timelimit_sec": float(config.timelimit_sec), "solver_threads": int(config.solver_threads)},
+            )
+            cached = solve_cache.get(cache_key)
+        except Exception as e:
+            solve_cache, cached = None, None
+            solve_cache_info["error"] = f"{type(e).__name__}: {e}"
+        if cached is not None:
+            gurobi_status = cached["status"]
+            gurobi_status_name = cached["status_name"]
+            gurobi_obj_value = cached["obj_value"]
+        solve_cache_info["hit"] = cached is not None
+
+    # --- 7b) reuse the L3 acceptance solve of this exact IR ---
+    solver_source = "solve_cache" if solve_cache_info.get("hit") else ""
+    mip_start = None
+    warm_start = ""
+    if (
+        not failure_stage
+        and ir is not None
+        and config.determine_on
+        and config.reuse_acceptance_on
+        and not solver_source
+    ):
+        acc = _accepted_solve(verifier_report, fingerprint.get("full", ""), config.solver_backend)
+        if acc is not None:
+            acc_out = acc["outcome"]
+            if acc.get("status") == "OPTIMAL":
+                gurobi_status = acc_out.get("status")
+                gurobi_status_name = "OPTIMAL"
+                gurobi_obj_value = acc_out.get("obj_value")
+                solver_source = "l3_acceptance"
+                if solve_cache is not None:
+                    solve_cache_info["stored"] = solve_cache.put(
+                        cache_key,
+                        SolveOutcome(
+                            status=int(gurobi_status),
+                            status_name=gurobi_status_name,
+                            obj_value=gurobi_obj_value,
+                            sol_count=int(acc_out.get("sol_count") or 0),
+                            runtime_sec=float(acc.get("sec") or 0.0),
+                            solution=acc_out.get("solution"),
+                        ),
+                        fingerprint=fingerprint["full"],
+                        backend=config.solver_backend,
+                        structure=fingerprint["structure"],
+                    )
+            elif acc_out.get("solution"):
+                mip_start = {"fingerprint": fingerprint["full"], "solution": acc_out["solution"]}
+                warm_start = "l3_acceptance"
+    # the acceptance solution has been consumed (solve cache / MIP start); keep it out of the report
+    _drop_acceptance_solutions(verifier_report)
+
+    if mip_start is None and solve_cache is not None and config.warm_start_on and not solver_source:
+        mip_start = solve_cache.find_start(
+            fingerprint["structure"], config.solver_backend, exclude=fingerprint["full"]
+        )
+        solve_cache_info["warm_start_from"] = mip_start["fingerprint"] if mip_start else ""
+        warm_start = "solve_cache" if mip_start else ""
+
+    # --- 7) solver build + optimize ---
+    if not failure_stage and ir is not None and not solver_source:
+        solver_source = "solve"
+        built: Optional[BuiltModel] = None
         if config.determine_on:
-            # 确定性构造Gurobi模型
+            # 确定性构造求解模型
+            build_ir = ir
+            if config.presolve_on:
+                # never fails: on error presolve_ir returns the IR unchanged
+                build_ir, presolve_report = presolve_ir(ir)
             try:
-                model = ir_to_gurobi(ir)
+                model_cache = None
+                if config.model_cache_dir:
+                    model_cache = get_model_cache(
+                        config.model_cache_dir,
+                        max_bytes=int(config.model_cache_max_mb * 1024 * 1024),
+                        max_age_sec=config.model_cache_max_age_days * 86400.0,
+                    )
+                backend = get_backend(config.solver_backend, model_cache=model_cache)
+                built = backend.build(
+                    build_ir,
+                    build_mode=config.build_mode,
+                    build_info=build_info,
+                    profile=config.profile_build,
+                    lazy_vars=config.lazy_vars,
+                    expr_eval=config.expr_eval,
+                )
             except Exception as e:
                 failure_stage = "solver_build"
                 error = f"{type(e).__name__}: {e}"
-                model = None
         else:
+            # LLM-generated code is gurobipy code, so this path always solves with Gurobi
             try:
+                backend = GurobiBackend()
                 generate_messages = build_generate_message(question_text, ir)
                 # call LLM to build Gurobi model
-                generate_completion = client.chat.completions.create(
+                generate_completion = yield dict(
                     model=config.model_name,
                     messages=generate_messages,
                     temperature=config.temperature,
                 )
                 model_generate_code: str = generate_completion.choices[0].message.content or ""
-                model = llm_to_gurobi(model_generate_code)
+                built = backend.wrap(llm_to_gurobi(model_generate_code))
             except Exception as e:
                 failure_stage = "solver_build"
                 error = f"{type(e).__name__}: {e}"
-                model = None
 
-        if not failure_stage and model is not None:
+        if not failure_stage and built is not None:
             try:
-                model.setParam("TimeLimit", float(config.timelimit_sec))
-                model.optimize()
-
-                gurobi_status = int(model.Status)
-                gurobi_status_name = _status_name(gurobi_status)
-
-                if model.Status == GRB.OPTIMAL:
-                    gurobi_obj_value = float(model.ObjVal)
+                outcome = backend.solve(
+                    built,
+                    time_limit=float(config.timelimit_sec),
+                    log=config.solver_log,
+                    want_solution=solve_cache is not None,
+                    start=mip_start["solution"] if mip_start else None,
+                )
+                gurobi_status = outcome.status
+                gurobi_status_name = outcome.status_name
+                gurobi_obj_value = outcome.obj_value
+                if mip_start and warm_start == "solve_cache":
+                    solve_cache_info["warm_start_vars"] = outcome.start_vars
+                if solve_cache is not None:
+                    solve_cache_info["stored"] = solve_cache.put(
+                        cache_key,
+                        outcome,
+                        fingerprint=fingerprint["full"],
+                        backend=config.solver_backend,
+                        structure=fingerprint["structure"],
+                    )
             except Exception as e:
                 failure_stage = "solver_optimize"
                 error = f"{type(e).__name__}: {e}"
+            finally:
+                backend.dispose(built)
+
+    if solve_cache is not None:
+        solve_cache_info.update(solve_cache.stats())
 
     pid = (data.get("meta") or {}).get("problem_id", problem_id or "ir2solve_instance")
     issues_kinds, repairs_kinds = _extract_kinds(verifier_report)
@@ -259,10 +561,16 @@ def run_ir2solve_pipeline(
             "problem_id": pid,
             "model_name": config.model_name,
             "timelimit_sec": config.timelimit_sec,
+            "build_mode": config.build_mode,
+            "stream_nl2ir": config.stream_nl2ir,
+            "expr_eval": config.expr_eval,
+            "solver_backend": config.solver_backend,
+            "solver_threads": config.solver_threads,
             "layer1_on": config.layer1_on,
             "layer2_on": config.layer2_on,
             "layer3_on": config.layer3_on,
             "repairs_on": config.repairs_on,
+            "presolve_on": config.presolve_on,
         },
         "failure_stage": failure_stage,
         "error": error,
@@ -274,7 +582,25 @@ def run_ir2solve_pipeline(
         "solver": {
             "status_name": gurobi_status_name,
             "obj_value": gurobi_obj_value,
+            # "solve" | "solve_cache" | "l3_acceptance" (L3 already solved this IR) | "" (no solve)
+            "source": solver_source,
+            # MIP start origin: "l3_acceptance" | "solve_cache" | ""
+            "warm_start": warm_start,
         },
+        "presolve": presolve_report,
+        "build": build_info,
+        # {hit, stored, warm_start_from, warm_start_vars, hits, misses, stores, hit_rate, path};
+        # empty when disabled
+        "solve_cache": solve_cache_info,
+        "expr_cache": expr_cache_delta(expr_cache_before),
+        # LLM calls/retries/limiter waits and prompt/cached/completion tokens of this instance
+        # (counted by LLMThrottle, zeros without one; streamed NL->IR usage is always counted)
+        "llm": {"deadline_sec": config.llm_deadline_sec, **(scope.stats if scope is not None else {})},
+        # streamed NL->IR call: {aborted, first_token_sec, first_verdict_sec, sections,
+        # issues, chars, total_sec, usage}; empty unless config.stream_nl2ir
+        "stream": stream_info,
+        # canonical IR hashes (see ir2solve_fingerprint); empty if no IR was parsed
+        "fingerprint": fingerprint,
         # keep IR dict for replay
         "ir_dict": data,
     }
@@ -0,0 +1,349 @@
+# ir2solve_presolve.py
+# IR-level presolve: runs between run_verifier and model construction.
+#
+# Works on a deepcopy of the IR and only removes what is provably redundant:
+# 1) Constant folding:
+#    - literal arithmetic inside expression strings is folded ("2*3*x" -> "6*x");
+#    - constraints whose rows are all constant and satisfied are dropped
+#      (violated constant rows are kept so the solver reports infeasibility).
+# 2) Duplicate constraints:
+#    - constraints whose rows have the same canonical linear form
+#      (scaled, sorted, <= / == normalized) as an earlier constraint are dropped.
+# 3) Bound rows:
+#    - a constraint whose rows are each `a*x[k] (<=|>=|==) b` with the same bound
+#      for EVERY cell of one var is folded into VarDef.lb / VarDef.ub.
+#
+# Rows are evaluated with the solver-free linear evaluator from ir2solve_backend,
+# in pure Python: presolve costs about as much as a build. It is off by default
+# in the pipeline, and IRs with more than max_total_rows rows (estimated from
+# the forall sets, before copying anything) are returned unchanged.
+# Constraints that are nonlinear, fail to evaluate, or are larger than
+# max_rows are kept as they are and reported in report["skipped"] (plus one
+# warning per IR, not per constraint).
+# presolve_ir never raises.
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+import ast
+import copy
+import math
+import warnings
+
+from ir2solve_ir import ModelIR, forall_bindings, iter_constraint_rows
+from ir2solve_backend import as_linear, build_linear_env
+
+
+PRESOLVE_MAX_ROWS = 20000  # rows per constraint evaluated by presolve
+PRESOLVE_MAX_TOTAL_ROWS = 20000  # larger IRs are not presolved at all
+_COEF_DIGITS = 12          # significant digits in canonical keys
+_FLIP = {">=": "<=", "<=": ">=", "==": "=="}
+
+
+# -----------------------------------------------------------------------------
+# Constant folding in expression strings
+# -----------------------------------------------------------------------------
+_FOLD_BINOPS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+}
+
+
+def _is_num(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+    )
+
+
+class _ConstantFolder(ast.NodeTransformer):
+    def __init__(self) -> None:
+        self.folded = 0
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        op = _FOLD_BINOPS.get(type(node.op))
+        if op is None or not (_is_num(node.left) and _is_num(node.right)):
+            return node
+        try:
+            value = op(node.left.value, node.right.value)
+        except (ZeroDivisionError, OverflowError):
+            return node
+        if not math.isfinite(value):
+            return node
+        self.folded += 1
+        return ast.copy_location(ast.Constant(value), node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        # signed literals ("-2") are not counted: only BinOp folds change the expression
+        self.generic_visit(node)
+        if isinstance(node.op, ast.USub) and _is_num(node.operand):
+            return ast.copy_location(ast.Constant(-node.operand.value), node)
+        if isinstance(node.op, ast.UAdd) and _is_num(node.operand):
+            return node.operand
+        return node
+
+
+class _SignedLiterals(ast.NodeTransformer):
+    # folded negative constants go back to -(c): ast.unparse writes Constant(-2)
+    # as "-2" without parentheses, and "-2 ** 2" is -(2 ** 2)
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if _is_num(node) and node.value < 0:
+            return ast.copy_location(ast.UnaryOp(ast.USub(), ast.Constant(-node.value)), node)
+        return node
+
+
+def fold_expr(expr: str) -> Tuple[str, int]:
+    """Fold literal arithmetic; returns (expr, number of folds). Unparseable input is returned as-is."""
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError:
+        return expr, 0
+    folder = _ConstantFolder()
+    tree = folder.visit(tree)
+    if not folder.folded:
+        return expr, 0
+    return ast.unparse(_SignedLiterals().visit(tree)), folder.folded
+
+
+# -----------------------------------------------------------------------------
+# Row canonical forms
+# -----------------------------------------------------------------------------
+def _round(x: float) -> float:
+    if x == 0.0 or not math.isfinite(x):
+        return x
+    return round(x, _COEF_DIGITS - 1 - int(math.floor(math.log10(abs(x)))))
+
+
+def _canonical_row(terms: Dict[int, float], sense: str, rhs: float) -> Tuple[Any, ...]:
+    """(sorted terms, sense, rhs) scaled so the first coefficient is +1; '>=' is written as '<='."""
+    items = sorted(terms.items())
+    scale = 1.0 / items[0][1]
+    if scale < 0 and sense != "==":
+        sense = _FLIP[sense]
+    if sense == ">=":
+        scale, sense = -scale, "<="
+    return (
+        tuple((j, _round(a * scale)) for j, a in items),
+        sense,
+        _round(rhs * scale),
+    )
+
+
+def _constant_row_holds(const: float, sense: str, tol: float = 1e-9) -> bool:
+    # row is `const sense 0`
+    if sense == "<=":
+        return const <= tol
+    if sense == ">=":
+        return const >= -tol
+    return abs(const) <= tol
+
+
+# -----------------------------------------------------------------------------
+# Presolve
+# -----------------------------------------------------------------------------
+def _empty_report() -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "error": "",
+        "folded_exprs": 0,
+        "constraints_before": 0,
+        "constraints_after": 0,
+        "rows_before": 0,
+        "rows_after": 0,
+        "removed_constant": [],
+        "infeasible_constant": [],
+        "removed_duplicate": [],
+        "bounds_from_rows": [],
+        "skipped": [],
+        # set when the whole IR was left alone (e.g. too many rows)
+        "skipped_ir": "",
+    }
+
+
+def estimate_rows(ir: ModelIR) -> int:
+    """Rows the IR's constraints expand to (product of forall set sizes; 1 per scalar constraint)."""
+    sizes = {s.name: len(s.elements or []) for s in ir.sets or []}
+    total = 0
+    for c in ir.constraints or []:
+        n = 1
+        try:
+            for _, set_name in forall_bindings(c):
+                n *= sizes.get(set_name, 0)
+        except ValueError:
+            pass
+        total += n
+    return total
+
+
+def _opt_round(x: Optional[float]) -> Optional[float]:
+    return None if x is None else _round(x)
+
+
+def _bound_from_rows(
+    rows: List[Tuple[Dict[int, float], str, float]],
+    owner: List[str],
+    var_cols: Dict[str, int],
+) -> Optional[Tuple[str, Optional[float], Optional[float]]]:
+    """(var, lb, ub) if the rows bound every cell of one var by the same value, else None."""
+    var = None
+    bound: Optional[Tuple[Optional[float], Optional[float]]] = None
+    seen = set()
+    for terms, sense, rhs in rows:
+        if len(terms) != 1:
+            return None
+        (j, a), = terms.items()
+        if var is None:
+            var = owner[j]
+        elif owner[j] != var:
+            return None
+        seen.add(j)
+
+        b = rhs / a
+        s = sense if a > 0 else _FLIP[sense]
+        row_bound = (b if s in (">=", "==") else None, b if s in ("<=", "==") else None)
+        if bound is None:
+            bound = row_bound
+        elif tuple(map(_opt_round, row_bound)) != tuple(map(_opt_round, bound)):
+            return None
+    if var is None or bound is None or len(seen) != var_cols[var]:
+        return None
+    return var, bound[0], bound[1]
+
+
+def presolve_ir(
+    ir: ModelIR,
+    max_rows: int = PRESOLVE_MAX_ROWS,
+    max_total_rows: Optional[int] = PRESOLVE_MAX_TOTAL_ROWS,
+) -> Tuple[ModelIR, Dict[str, Any]]:
+    """
+    Returns (presolved copy of IR, report). On any internal error the original
+    IR is returned with report["ok"] = False. IRs estimated above max_total_rows
+    rows (None = no limit) are returned as-is with report["skipped_ir"] set.
+    """
+    report = _empty_report()
+    try:
+        if max_total_rows is not None:
+            n = estimate_rows(ir)
+            if n > max_total_rows:
+                report["skipped_ir"] = f"{n} rows > max_total_rows={max_total_rows}"
+                report["constraints_before"] = report["constraints_after"] = len(ir.constraints or [])
+                return ir, report
+        out = copy.deepcopy(ir)
+        _presolve_in_place(out, report, max_rows)
+        return out, report
+    except Exception as e:
+        report = _empty_report()
+        report["ok"] = False
+        report["error"] = f"{type(e).__name__}: {e}"
+        n = len(ir.constraints or [])
+        report["constraints_before"] = report["constraints_after"] = n
+        return ir, report
+
+
+def _presolve_in_place(ir: ModelIR, report: Dict[str, Any], max_rows: int) -> None:
+    # 1) fold literal arithmetic
+    ir.objective.expr, n = fold_expr(ir.objective.expr)
+    report["folded_exprs"] += n
+    for c in ir.constraints or []:
+        c.expr_lhs, n1 = fold_expr(c.expr_lhs)
+        c.expr_rhs, n2 = fold_expr(c.expr_rhs)
+        report["folded_exprs"] += n1 + n2
+
+    global_env, env_sets, cols = build_linear_env(ir)
+    var_cols: Dict[str, int] = {}
+    for name in cols.owner:
+        var_cols[name] = var_cols.get(name, 0) + 1
+
+    constraints = list(ir.constraints or [])
+    report["constraints_before"] = len(constraints)
+
+    dropped: Dict[int, Tuple[str, Optional[str]]] = {}  # id(c) -> (reason, bounded var)
+    n_rows: Dict[int, int] = {}
+    seen_forms: Dict[Any, str] = {}
+    bounds: Dict[str, List[float]] = {}  # var -> [lb, ub] collected from rows
+
+    for c in constraints:
+        # evaluate this constraint's rows; anything unexpected -> keep as-is
+        rows: List[Tuple[Dict[int, float], str, float]] = []
+        try:
+            for _, lhs, sense, rhs in iter_constraint_rows([c], global_env, env_sets):
+                if len(rows) >= max_rows:
+                    raise OverflowError(f"more than {max_rows} rows")
+                if sense not in _FLIP:
+                    raise ValueError(f"unknown sense '{sense}'")
+                row = as_linear(lhs) - as_linear(rhs)
+                rows.append(({j: a for j, a in row.terms.items() if a != 0.0}, sense, -row.const))
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+            report["skipped"].append({"constraint": c.name, "reason": reason})
+            continue
+        n_rows[id(c)] = len(rows)
+        if not rows:
+            continue
+
+        # 2) constant rows
+        if all(not t for t, _, _ in rows):
+            if all(_constant_row_holds(-b, s) for _, s, b in rows):
+                dropped[id(c)] = ("constant", None)
+                report["removed_constant"].append(c.name)
+            else:
+                report["infeasible_constant"].append(c.name)
+            continue
+
+        # 3) single-var rows covering a whole var -> bounds
+        bnd = _bound_from_rows(rows, cols.owner, var_cols)
+        if bnd is not None:
+            var, lo, hi = bnd
+            cur = bounds.setdefault(var, [-math.inf, math.inf])
+            if lo is not None:
+                cur[0] = max(cur[0], lo)
+            if hi is not None:
+                cur[1] = min(cur[1], hi)
+            dropped[id(c)] = ("bound", var)
+            report["bounds_from_rows"].append({"constraint": c.name, "var": var, "lb": lo, "ub": hi})
+            continue
+
+        # 4) duplicates (the constraint's rows as a set of canonical forms)
+        if all(t for t, _, _ in rows):
+            form = frozenset(_canonical_row(t, s, b) for t, s, b in rows)
+            if form in seen_forms:
+                dropped[id(c)] = ("duplicate", None)
+                report["removed_duplicate"].append({"constraint": c.name, "duplicate_of": seen_forms[form]})
+                continue
+            seen_forms[form] = c.name
+
+    # apply collected bounds (only ever tightening the declared ones)
+    for v in ir.vars or []:
+        if v.name not in bounds:
+            continue
+        lo, hi = bounds[v.name]
+        new_lo = max(float(v.lb), lo)
+        new_hi = min(float(v.ub), hi) if v.ub is not None else hi
+        if new_lo > new_hi:
+            # contradictory bounds: keep the rows so the solver reports infeasibility
+            for k, (reason, var) in list(dropped.items()):
+                if reason == "bound" and var == v.name:
+                    del dropped[k]
+            report["bounds_from_rows"] = [r for r in report["bounds_from_rows"] if r["var"] != v.name]
+            continue
+        v.lb = new_lo
+        v.ub = new_hi if math.isfinite(new_hi) else None
+
+    ir.constraints = [c for c in constraints if id(c) not in dropped]
+
+    if report["skipped"]:
+        names = [s["constraint"] for s in report["skipped"]]
+        more = f" (+{len(names) - 5} more)" if len(names) > 5 else ""
+        warnings.warn(
+            f"presolve: {len(names)} constraint(s) kept without presolve: {', '.join(names[:5])}{more}; "
+            "see report['skipped']"
+        )
+
+    report["constraints_after"] = len(ir.constraints)
+    # row counts cover evaluated constraints only (skipped ones are not counted)
+    report["rows_before"] = sum(n_rows.values())
+    report["rows_after"] = sum(n for k, n in n_rows.items() if k not in dropped)
@@ -0,0 +1,400 @@
+# ir2solve_ratelimit.py
+# Client-side rate limiting and retry for chat.completions.create.
+#
+# LLMThrottle is shared by every call of a run (sync or async clients):
+#   - two token buckets, requests per minute (rpm) and tokens per minute (tpm).
+#     A call reserves 1 request and its estimated tokens up front; buckets may
+#     go negative, and the caller then waits until they refill.
+#   - token estimates come from the same response.usage fields the runners'
+#     LLMUsageTracker reads: prompt tokens per prompt character and the average
+#     completion size are learned from every response, and the tpm bucket is
+#     corrected by (actual - estimated) once the usage is known.
+#   - retryable failures (429, timeouts, connection errors, 5xx) are retried
+#     with full-jitter exponential backoff, honoring Retry-After when the
+#     server sends one.
+#
+# Per-instance deadline: llm_scope(deadline_sec) (used by the pipeline) bounds
+# the total time an instance spends in LLM calls, limiter waits and backoff.
+# A wait or retry that would cross the deadline raises LLMDeadlineExceeded (or
+# the last API error) instead, and each request's `timeout` is capped by the
+# remaining time. The scope also collects per-instance call stats for the trace,
+# including prompt tokens served from the provider's prefix cache
+# (usage.prompt_tokens_details.cached_tokens).
+#
+# attach_llm_throttle() wraps a client the same way attach_llm_usage_tracker
+# does. Order in the runners: usage tracker, then throttle, then response
+# cache, so cache hits skip the limiter and each retry is one tracked call.
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple
+import asyncio
+import random
+import threading
+import time
+
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """The instance's LLM deadline would be exceeded by waiting any longer."""
+
+
+# -----------------------------------------------------------------------------
+# Per-instance scope (deadline + stats)
+# -----------------------------------------------------------------------------
+@dataclass
+class LLMScope:
+    deadline: Optional[float] = None  # time.monotonic() value; None = no deadline
+    stats: Dict[str, Any] = field(
+        default_factory=lambda: {
+            "calls": 0,
+            "retries": 0,
+            "limiter_wait_sec": 0.0,
+            "backoff_sec": 0.0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+    )
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def add_usage(self, resp: Any) -> None:
+        """Count resp.usage (for responses that bypass LLMThrottle, e.g. streamed ones)."""
+        tokens = usage_tokens(resp)
+        if tokens is None:
+            return
+        self.stats["prompt_tokens"] += tokens[0]
+        self.stats["completion_tokens"] += tokens[1]
+        self.stats["cached_tokens"] += cached_tokens(resp)
+
+
+_SCOPE: ContextVar[Optional[LLMScope]] = ContextVar("ir2solve_llm_scope", default=None)
+
+
+def current_llm_scope() -> Optional[LLMScope]:
+    return _SCOPE.get()
+
+
+@contextmanager
+def llm_scope(deadline_sec: Optional[float] = None, scope: Optional[LLMScope] = None) -> Iterator[LLMScope]:
+    """
+    Make `scope` (or a new one with the given deadline) current for LLM calls
+    made from this context. Pass an existing scope to continue it in another
+    thread or task.
+    """
+    if scope is None:
+        deadline = time.monotonic() + float(deadline_sec) if deadline_sec else None
+        scope = LLMScope(deadline=deadline)
+    token = _SCOPE.set(scope)
+    try:
+        yield scope
+    finally:
+        _SCOPE.reset(token)
+
+
+# -----------------------------------------------------------------------------
+# Token buckets
+# -----------------------------------------------------------------------------
+class TokenBucket:
+    """
+    Continuous-refill bucket of `per_minute` units (burst = one minute's worth).
+    reserve() debits immediately and returns how long the caller must wait for
+    the balance to be non-negative again.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.rate = float(per_minute) / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+        self._t = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Debit (amount > 0) or refund (amount < 0) without waiting."""
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+
+def usage_tokens(resp: Any) -> Optional[Tuple[int, int]]:
+    """(prompt_tokens, completion_tokens) from response.usage (dict- or object-like), or None."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else (lambda k, d=None: getattr(usage, k, d))
+    return int(get("prompt_tokens", 0) or 0), int(get("completion_tokens", 0) or 0)
+
+
+def cached_tokens(resp: Any) -> int:
+    """usage.prompt_tokens_details.cached_tokens (prompt tokens served from the provider's prefix cache), 0 if absent."""
+    usage = getattr(resp, "usage", None)
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    value = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    return int(value or 0)
+
+
+def _prompt_chars(request: Dict[str, Any]) -> int:
+    n = 0
+    for m in request.get("messages") or []:
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", "")
+        n += len(content) if isinstance(content, str) else len(str(content or ""))
+    return n
+
+
+def is_retryable(e: BaseException) -> bool:
+    try:
+        import openai
+
+        if isinstance(e, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+            return True  # APITimeoutError is an APIConnectionError
+    except ImportError:
+        pass
+    return getattr(e, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # HTTP-date form: fall back to backoff
+    return None
+
+
+# -----------------------------------------------------------------------------
+# Throttle
+# -----------------------------------------------------------------------------
+class LLMThrottle:
+    """
+    rpm / tpm: limits (None disables that bucket).
+    max_retries: retries per call after the first attempt (0 disables retry).
+    base_delay / max_delay: backoff before retry k is uniform(0, min(max_delay, base_delay * 2**k)).
+    """
+
+    # initial estimates until responses have been seen
+    PROMPT_TOKENS_PER_CHAR = 0.3
+    COMPLETION_TOKENS = 800
+    EMA = 0.2  # weight of the latest response in the completion-size average
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.rpm = TokenBucket(rpm) if rpm else None
+        self.tpm = TokenBucket(tpm) if tpm else None
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.tokens_per_char = self.PROMPT_TOKENS_PER_CHAR
+        self.completion_tokens = float(self.COMPLETION_TOKENS)
+        self._seen_prompt_tokens = 0
+        self._seen_prompt_chars = 0
+        self.counts: Dict[str, Any] = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "limiter_wait_sec": 0.0,
+            "backoff_sec": 0.0,
+            "estimated_tokens": 0,
+            "actual_tokens": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    # --- token accounting ---
+    def estimate(self, request: Dict[str, Any]) -> int:
+        chars = _prompt_chars(request)
+        completion = request.get("max_tokens") or request.get("max_completion_tokens") or self.completion_tokens
+        return int(chars * self.tokens_per_char + min(float(completion), self.completion_tokens * 4))
+
+    def reserve(self, request: Dict[str, Any]) -> Tuple[float, int]:
+        """(seconds to wait, reserved token estimate) for one request."""
+        est = self.estimate(request) if self.tpm is not None else 0
+        wait = 0.0
+        if self.rpm is not None:
+            wait = self.rpm.reserve(1)
+        if self.tpm is not None:
+            wait = max(wait, self.tpm.reserve(est))
+        return wait, est
+
+    def settle(self, request: Dict[str, Any], est: int, resp: Any, scope: Optional[LLMScope] = None) -> None:
+        """Correct the tpm bucket with the actual usage (resp None: the call failed, refund)."""
+        tokens = usage_tokens(resp) if resp is not None else None
+        actual = sum(tokens) if tokens is not None else 0
+        if self.tpm is not None:
+            if resp is None:
+                self.tpm.adjust(-est)
+            elif tokens is not None:
+                self.tpm.adjust(actual - est)
+        if tokens is not None:
+            self._count(scope, "prompt_tokens", tokens[0])
+            self._count(scope, "completion_tokens", tokens[1])
+            self._count(scope, "cached_tokens", cached_tokens(resp))
+        with self._lock:
+            self.counts["estimated_tokens"] += est
+            self.counts["actual_tokens"] += actual
+            if tokens is None:
+                return
+            prompt, completion = tokens
+            chars = _prompt_chars(request)
+            if chars and prompt:
+                # ratio of totals: short prompts (fixed per-message overhead) do not skew it
+                self._seen_prompt_tokens += prompt
+                self._seen_prompt_chars += chars
+                self.tokens_per_char = self._seen_prompt_tokens / self._seen_prompt_chars
+            if completion:
+                self.completion_tokens += self.EMA * (completion - self.completion_tokens)
+
+    def backoff(self, attempt: int, e: BaseException) -> float:
+        with self._lock:
+            delay = self._rng.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        after = _retry_after(e)
+        return max(delay, after) if after is not None else delay
+
+    # --- bookkeeping ---
+    def _count(self, scope: Optional[LLMScope], key: str, value: Any = 1) -> None:
+        with self._lock:
+            self.counts[key] += value
+        if scope is not None and key in scope.stats:
+            scope.stats[key] += value
+
+    def _check_wait(self, scope: Optional[LLMScope], wait: float, error: Optional[BaseException] = None) -> None:
+        remaining = scope.remaining() if scope is not None else None
+        if remaining is not None and wait >= remaining:
+            self._count(None, "deadline_exceeded")
+            if error is not None:
+                raise error
+            raise LLMDeadlineExceeded(f"LLM deadline reached (needed to wait {wait:.1f}s, {max(remaining, 0.0):.1f}s left).")
+
+    @staticmethod
+    def _with_timeout(scope: Optional[LLMScope], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        remaining = scope.remaining() if scope is not None else None
+        if remaining is None:
+            return kwargs
+        timeout = kwargs.get("timeout")
+        if isinstance(timeout, (int, float)) and timeout <= remaining:
+            return kwargs
+        return {**kwargs, "timeout": max(remaining, 1.0)}
+
+    def _next_delay(self, scope: Optional[LLMScope], attempt: int, e: Exception) -> float:
+        """Backoff before the next attempt; re-raises e when out of retries / time."""
+        if attempt >= self.max_retries or not is_retryable(e):
+            self._count(None, "failures")
+            raise e
+        delay = self.backoff(attempt, e)
+        self._check_wait(scope, delay, error=e)
+        self._count(scope, "retries")
+        self._count(scope, "backoff_sec", delay)
+        return delay
+
+    # --- wrappers ---
+    def wrap(self, method: Any) -> Any:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            scope = _SCOPE.get()
+            attempt = 0
+            while True:
+                wait, est = self.reserve(kwargs)
+                if wait > 0:
+                    try:
+                        self._check_wait(scope, wait)
+                    except LLMDeadlineExceeded:
+                        self.settle(kwargs, est, None)
+                        raise
+                    self._count(scope, "limiter_wait_sec", wait)
+                    time.sleep(wait)
+                self._count(scope, "calls")
+                try:
+                    resp = method(*args, **self._with_timeout(scope, kwargs))
+                except Exception as e:
+                    self.settle(kwargs, est, None)
+                    time.sleep(self._next_delay(scope, attempt, e))
+                    attempt += 1
+                    continue
+                self.settle(kwargs, est, resp, scope)
+                return resp
+
+        return wrapper
+
+    def wrap_async(self, method: Any) -> Any:
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            scope = _SCOPE.get()
+            attempt = 0
+            while True:
+                wait, est = self.reserve(kwargs)
+                if wait > 0:
+                    try:
+                        self._check_wait(scope, wait)
+                    except LLMDeadlineExceeded:
+                        self.settle(kwargs, est, None)
+                        raise
+                    self._count(scope, "limiter_wait_sec", wait)
+                    await asyncio.sleep(wait)
+                self._count(scope, "calls")
+                try:
+                    resp = await method(*args, **self._with_timeout(scope, kwargs))
+                except Exception as e:
+                    self.settle(kwargs, est, None)
+                    await asyncio.sleep(self._next_delay(scope, attempt, e))
+                    attempt += 1
+                    continue
+                self.settle(kwargs, est, resp, scope)
+                return resp
+
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.counts)
+        out["rpm"] = self.rpm.capacity if self.rpm is not None else None
+        out["tpm"] = self.tpm.capacity if self.tpm is not None else None
+        out["tokens_per_char"] = self.tokens_per_char
+        out["completion_tokens_avg"] = self.completion_tokens
+        return out
+
+
+def attach_llm_throttle(client: Any, throttle: LLMThrottle) -> None:
+    """Monkey-patch client.chat.completions.create (OpenAI or AsyncOpenAI) with `throttle`."""
+    from openai import AsyncOpenAI
+
+    try:
+        completions = client.chat.completions
+        if isinstance(client, AsyncOpenAI):
+            completions.create = throttle.wrap_async(completions.create)  # type: ignore
+        else:
+            completions.create = throttle.wrap(completions.create)  # type: ignore
+    except AttributeError:
+        pass
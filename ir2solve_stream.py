@@ -0,0 +1,294 @@
+# ir2solve_stream.py
+# Streaming NL -> IR generation with incremental validation.
+#
+# With PipelineConfig.stream_nl2ir the NL->IR completion is requested with
+# stream=True and consumed here chunk by chunk:
+#   - StreamingIRWatcher scans the text as it arrives (string/escape/depth
+#     state, same rules as nl2ir._find_first_balanced_json_object) and notices
+#     when the top-level "sets", "params" and "vars" arrays close.
+#   - each closed array is json.loads-ed and checked right away (check_section).
+#     Only violations that json_to_model_ir would reject anyway are fatal:
+#     invalid JSON, a section that is not a list, an entry that is not an
+#     object or lacks a required field. Everything else (duplicate names,
+#     unknown vartype, indices over undeclared sets, ...) is a warning and is
+#     left to the verifier, so aborting never fails an instance that would
+#     otherwise have been parsed.
+#   - on the first fatal verdict the stream is closed, which stops generation
+#     (and its completion tokens) instead of waiting for objective/constraints.
+#
+# stream_completion() / stream_completion_async() return a StreamedCompletion:
+# the assembled text, the final usage chunk (stream_options.include_usage;
+# absent when aborted) and the watcher's report for trace["stream"]
+# (time to first token, time to first verdict, per-section timings).
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+from types import SimpleNamespace
+import json
+import time
+
+from ir2solve_ratelimit import cached_tokens
+from ir2solve_verifier_core import mk_issue
+
+
+# top-level arrays checked as soon as they close, and their required fields
+# (the dataclass fields without defaults in ir2solve_ir)
+WATCHED_SECTIONS: Dict[str, tuple] = {
+    "sets": ("name", "elements"),
+    "params": ("name", "indices"),
+    "vars": ("name", "indices", "vartype"),
+}
+VARTYPES = ("binary", "integer", "continuous")
+
+
+# -----------------------------------------------------------------------------
+# Section checks
+# -----------------------------------------------------------------------------
+def _issue(kind: str, severity: str, message: str, nodes: Optional[List[str]] = None) -> Dict[str, Any]:
+    return mk_issue(layer="stream", kind=kind, severity=severity, message=message, nodes=nodes)
+
+
+def check_section(key: str, value: Any, declared_sets: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Cheap schema checks of one top-level section ("sets" | "params" | "vars").
+    severity "error" = json_to_model_ir would fail on it; "warning" otherwise.
+    declared_sets: set names seen so far (None = "sets" not closed yet, skip index checks).
+    """
+    if not isinstance(value, list):
+        return [_issue("section_not_list", "error", f"'{key}' must be a list, got {type(value).__name__}.", [key])]
+
+    issues: List[Dict[str, Any]] = []
+    required = WATCHED_SECTIONS[key]
+    seen: Set[str] = set()
+    for pos, entry in enumerate(value):
+        node = f"{key}[{pos}]"
+        if not isinstance(entry, dict):
+            issues.append(_issue("entry_not_object", "error", f"{node} must be an object, got {type(entry).__name__}.", [node]))
+            continue
+        name = entry.get("name")
+        if isinstance(name, str) and name:
+            node = f"{key}[{name}]"
+        missing = [f for f in required if f not in entry]
+        if missing:
+            issues.append(_issue("missing_field", "error", f"{node} lacks required field(s) {missing}.", [node]))
+
+        if not isinstance(name, str) or not name:
+            issues.append(_issue("bad_name", "warning", f"{node} has no usable name ({name!r}).", [node]))
+        elif name in seen:
+            issues.append(_issue("duplicate_name", "warning", f"{key} declares '{name}' more than once.", [node]))
+        else:
+            seen.add(name)
+
+        if key == "sets":
+            if "elements" in entry and not isinstance(entry["elements"], list):
+                issues.append(_issue("elements_not_list", "warning", f"{node}.elements is not a list.", [node]))
+            continue
+
+        idx = entry.get("indices")
+        if "indices" in entry and not (isinstance(idx, list) and all(isinstance(s, str) for s in idx)):
+            issues.append(_issue("bad_indices", "warning", f"{node}.indices must be a list of set names.", [node]))
+        elif isinstance(idx, list) and declared_sets is not None:
+            unknown = [s for s in idx if s not in declared_sets]
+            if unknown:
+                issues.append(_issue("undeclared_set", "warning", f"{node} is indexed by undeclared set(s) {unknown}.", [node]))
+
+        if key == "vars" and "vartype" in entry and entry["vartype"] not in VARTYPES:
+            issues.append(_issue("bad_vartype", "warning", f"{node}.vartype {entry['vartype']!r} is not one of {list(VARTYPES)}.", [node]))
+    return issues
+
+
+# -----------------------------------------------------------------------------
+# Incremental watcher
+# -----------------------------------------------------------------------------
+class StreamingIRWatcher:
+    """
+    Fed with text deltas; checks each watched top-level array when it closes.
+    `fatal` is set to the first error-severity issue; callers stop reading then.
+    Times are seconds since `t0` (the request start, time.perf_counter()).
+    """
+
+    def __init__(self, t0: Optional[float] = None) -> None:
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.text = ""
+        self.fatal: Optional[Dict[str, Any]] = None
+        self.issues: List[Dict[str, Any]] = []
+        self.sections: Dict[str, Dict[str, Any]] = {}
+        self.first_token_sec: Optional[float] = None
+        self.first_verdict_sec: Optional[float] = None
+        self.declared_sets: Optional[Set[str]] = None
+
+        # scanner state
+        self._pos = 0
+        self._started = False  # seen the opening '{' of the top-level object
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._str_start = -1
+        self._last_key: Optional[str] = None
+        self._pending_key: Optional[str] = None  # key whose value comes next
+        self._value_key: Optional[str] = None  # watched section being scanned
+        self._value_start = -1
+
+    def _now(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def feed(self, delta: str) -> Optional[Dict[str, Any]]:
+        """Append a text delta; returns the fatal issue once there is one."""
+        if not delta or self.fatal is not None:
+            return self.fatal
+        if self.first_token_sec is None:
+            self.first_token_sec = self._now()
+        self.text += delta
+        self._scan()
+        return self.fatal
+
+    def _scan(self) -> None:
+        raw = self.text
+        for i in range(self._pos, len(raw)):
+            ch = raw[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last_key = raw[self._str_start + 1 : i]
+                continue
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._depth == 0:
+                continue  # past the top-level object
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch == ":" and self._depth == 1:
+                self._pending_key, self._last_key = self._last_key, None
+            elif ch == "," and self._depth == 1:
+                self._pending_key = None
+            elif ch in "[{":
+                if self._depth == 1 and self._pending_key in WATCHED_SECTIONS:
+                    self._value_key, self._value_start = self._pending_key, i
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._value_key is not None:
+                    self._close_section(self._value_key, raw[self._value_start : i + 1])
+                    self._value_key = None
+                    if self.fatal is not None:
+                        self._pos = i + 1
+                        return
+        self._pos = len(raw)
+
+    def _close_section(self, key: str, text: str) -> None:
+        t = self._now()
+        try:
+            value = json.loads(text)
+        except ValueError as e:
+            issues = [_issue("invalid_json", "error", f"'{key}' is not valid JSON: {e}", [key])]
+        else:
+            issues = check_section(key, value, None if key == "sets" else self.declared_sets)
+            if key == "sets" and isinstance(value, list):
+                self.declared_sets = {s["name"] for s in value if isinstance(s, dict) and isinstance(s.get("name"), str)}
+        if self.first_verdict_sec is None:
+            self.first_verdict_sec = t
+        self.sections[key] = {
+            "closed_sec": t,
+            "chars": len(text),
+            "errors": sum(1 for x in issues if x["severity"] == "error"),
+            "warnings": sum(1 for x in issues if x["severity"] != "error"),
+        }
+        self.issues.extend(issues)
+        for x in issues:
+            if x["severity"] == "error":
+                self.fatal = x
+                break
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "aborted": self.fatal is not None,
+            "first_token_sec": self.first_token_sec,
+            "first_verdict_sec": self.first_verdict_sec,
+            "sections": self.sections,
+            "issues": self.issues,
+            "chars": len(self.text),
+        }
+
+
+# -----------------------------------------------------------------------------
+# Stream consumption
+# -----------------------------------------------------------------------------
+@dataclass
+class StreamedCompletion:
+    text: str
+    usage: Any  # CompletionUsage of the final chunk, None if the stream was aborted
+    aborted: bool
+    fatal: Optional[Dict[str, Any]]
+    stream: Dict[str, Any] = field(default_factory=dict)  # watcher report + total_sec
+
+
+def _delta_text(chunk: Any) -> str:
+    choices = getattr(chunk, "choices", None) or []
+    if not choices:
+        return ""
+    delta = getattr(choices[0], "delta", None)
+    return (getattr(delta, "content", None) or "") if delta is not None else ""
+
+
+def _stream_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    kw = dict(kwargs, stream=True)
+    kw.setdefault("stream_options", {"include_usage": True})
+    return kw
+
+
+def _finish(watcher: StreamingIRWatcher, usage: Any) -> StreamedCompletion:
+    rep = watcher.report()
+    rep["total_sec"] = watcher._now()
+    # the usage chunk only reaches us here, not the client wrappers (usage
+    # tracker, throttle); runners add it to their totals from the trace
+    if usage is not None:
+        rep["usage"] = {k: int(getattr(usage, k, 0) or 0) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+        rep["usage"]["cached_tokens"] = cached_tokens(SimpleNamespace(usage=usage))
+    return StreamedCompletion(
+        text=watcher.text, usage=usage, aborted=watcher.fatal is not None, fatal=watcher.fatal, stream=rep
+    )
+
+
+def stream_completion(client: Any, **kwargs: Any) -> StreamedCompletion:
+    """client.chat.completions.create(stream=True, ...) consumed through a StreamingIRWatcher."""
+    watcher = StreamingIRWatcher()
+    stream = client.chat.completions.create(**_stream_kwargs(kwargs))
+    usage = None
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if watcher.feed(_delta_text(chunk)) is not None:
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return _finish(watcher, usage)
+
+
+async def stream_completion_async(client: Any, **kwargs: Any) -> StreamedCompletion:
+    """Async counterpart of stream_completion (AsyncOpenAI client)."""
+    watcher = StreamingIRWatcher()
+    stream = await client.chat.completions.create(**_stream_kwargs(kwargs))
+    usage = None
+    try:
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if watcher.feed(_delta_text(chunk)) is not None:
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+    return _finish(watcher, usage)
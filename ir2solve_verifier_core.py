@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from typing import Any, Dict, List, Optional, Tuple
 import copy
 
@@ -19,6 +19,13 @@ class VerifierConfig:
     layer3_on: bool = True
     repairs_on: bool = True  # if False: report-only, do not mutate original IR
 
+    # backend used by L3 acceptance solves ("gurobi" | "highs")
+    solver_backend: str = "gurobi"
+
+    # OpenAI client for the L3 rebuild (None -> a new OpenAI()); the pipeline
+    # passes its own so usage tracking / response caching cover L3 calls too
+    llm_client: Any = None
+
 
 def mk_issue(
     layer: str,
@@ -178,7 +185,7 @@ def run_verifier(ir: Any, config: Optional[VerifierConfig] = None) -> Tuple[Any,
 
         if config.layer3_on:
             layer_ran["L3"] = True
-            layer_changed["L3"] = run_rules(working_ir, get_layer3_rules(), config.repairs_on, issues, repairs)
+            layer_changed["L3"] = run_rules(working_ir, get_layer3_rules(config), config.repairs_on, issues, repairs)
 
         report_ok = True
 
@@ -196,7 +203,8 @@ def run_verifier(ir: Any, config: Optional[VerifierConfig] = None) -> Tuple[Any,
 
     report: Dict[str, Any] = {
         "ok": report_ok,
-        "config": asdict(config),
+        # the client object is not part of the (JSON) report
+        "config": {f.name: getattr(config, f.name) for f in fields(config) if f.name != "llm_client"},
         "layers": {
             "L1": {"ran": layer_ran["L1"], "changed_ir": layer_changed["L1"] if config.repairs_on else False},
             "L2": {"ran": layer_ran["L2"], "changed_ir": layer_changed["L2"] if config.repairs_on else False},
@@ -2,8 +2,9 @@
 # Layer 1: Compile-safety & canonicalization
 #
 # Scope:
-# 1) KeyError fixes: key canonicalization; 2D param canonicalization; missing diagonal fill.
-# 2) NameError fixes: unroll constraints with free index symbols over inferred sets.
+# 1) KeyError fixes: key canonicalization; 2D param canonicalization; missing diagonal fill
+#    (params with a declared "default" are left sparse).
+# 2) NameError fixes: bind free index symbols of constraints to inferred sets (forall).
 # 3) TypeError fixes: quicksum/sum call normalization.
 
 from __future__ import annotations
@@ -12,7 +13,7 @@ from typing import Any, Dict, List, Optional, Tuple
 import ast
 import re
 
-from ir2solve_ir import ConstraintDef
+from ir2solve_ir import forall_bindings
 from ir2solve_verifier_core import (
     VerifierRule,
     RuleDetection,
@@ -362,6 +363,9 @@ class FillMissingDiagonalForSquare2DParams(VerifierRule):
             idx = getattr(p, "indices", []) or []
             if len(idx) != 2 or idx[0] != idx[1]:
                 continue
+            if getattr(p, "default", None) is not None:
+                # missing entries resolve to the declared default; nothing to fill
+                continue
             vals = getattr(p, "values", None)
             if not is_dict_of_dict(vals):
                 continue
@@ -436,16 +440,11 @@ class FillMissingDiagonalForSquare2DParams(VerifierRule):
 
 
 # -----------------------------------------------------------------------------
-# Rule 4: Unroll free-index constraints over inferred sets (NameError)
+# Rule 4: Bind free-index constraints over inferred sets (NameError)
+# - the compiler instantiates `forall` templates with bound Python values,
+#   so there is no string rewriting and no cap on the set size.
 # -----------------------------------------------------------------------------
 
-def _sanitize_for_name(x: str) -> str:
-    x = str(x)
-    x = re.sub(r"[^A-Za-z0-9_]+", "_", x)
-    x = re.sub(r"_+", "_", x).strip("_")
-    return x or "elem"
-
-
 def _infer_set_for_index_symbol(ir: Any, sym: str, expr: str) -> Optional[str]:
     """
     Infer which set `sym` ranges over.
@@ -495,15 +494,16 @@ def _infer_set_for_index_symbol(ir: Any, sym: str, expr: str) -> Optional[str]:
     return None
 
 
-def _replace_index_symbol_with_literal(expr: str, sym: str, literal: str) -> str:
-    # [sym] -> ['literal']
-    return re.sub(rf"\[\s*{re.escape(sym)}\s*\]", f"['{literal}']", expr)
+def _forall_symbols(c: Any) -> set[str]:
+    try:
+        return {sym for sym, _ in forall_bindings(c)}
+    except ValueError:
+        return set()
 
 
 class UnrollFreeIndexConstraintsOverSet(VerifierRule):
     layer = "L1"
     kind = "unroll_free_index_constraints"
-    MAX_UNROLL = 50
 
     def detect(self, ir: Any) -> Optional[RuleDetection]:
         defined = _collect_defined_names(ir)
@@ -516,13 +516,14 @@ class UnrollFreeIndexConstraintsOverSet(VerifierRule):
             if not isinstance(lhs, str) or not isinstance(rhs, str):
                 continue
 
+            already_bound = _forall_symbols(c)
             undefined: List[str] = []
             for s in (lhs, rhs):
                 names, perr, bound = _extract_load_names(s)
                 if perr is not None:
                     continue
                 for n in names:
-                    if n in bound:
+                    if n in bound or n in already_bound:
                         continue
                     if n not in env_names:
                         undefined.append(n)
@@ -548,8 +549,6 @@ class UnrollFreeIndexConstraintsOverSet(VerifierRule):
                 elems = getattr(s_obj, "elements", []) if s_obj is not None else []
                 if not isinstance(elems, list) or not elems:
                     continue
-                if len(elems) > self.MAX_UNROLL:
-                    continue
                 sym_to_set[sym] = set_name
 
             if sym_to_set:
@@ -570,7 +569,7 @@ class UnrollFreeIndexConstraintsOverSet(VerifierRule):
                 layer=self.layer,
                 kind=self.kind,
                 severity="warning",
-                message="Detected constraints with free index symbols; unroll over inferred sets to avoid NameError.",
+                message="Detected constraints with free index symbols; bind them over inferred sets to avoid NameError.",
                 nodes=names,
             ),
             data={"candidates": candidates},
@@ -581,73 +580,39 @@ class UnrollFreeIndexConstraintsOverSet(VerifierRule):
         if not candidates:
             return None
 
-        cand_by_idx = {c["constraint_index"]: c for c in candidates}
-        new_constraints: List[Any] = []
+        constraints = getattr(ir, "constraints", []) or []
         changed_fields: List[str] = []
-        unrolled_names: List[str] = []
+        bound_names: List[str] = []
 
-        for idx, c in enumerate(getattr(ir, "constraints", []) or []):
-            if idx not in cand_by_idx:
-                new_constraints.append(c)
+        for info in candidates:
+            idx = info["constraint_index"]
+            if idx >= len(constraints):
                 continue
-
-            info = cand_by_idx[idx]
-            sym_to_set: Dict[str, str] = info["sym_to_set"]
+            c = constraints[idx]
             cname = getattr(c, "name", f"c{idx}")
 
-            lhs0 = getattr(c, "expr_lhs", "")
-            rhs0 = getattr(c, "expr_rhs", "")
-            sense0 = getattr(c, "sense", "==")
-            desc0 = getattr(c, "description", None)
-
-            # Choose ONE symbol to unroll: prefer a symbol not bound by a generator in this constraint.
-            def _is_bound(sym: str, s: Any) -> bool:
-                return isinstance(s, str) and (f"for {sym} in" in s)
-
-            sym = None
-            set_name = None
-            for cand_sym, cand_set in sym_to_set.items():
-                if (not _is_bound(cand_sym, lhs0)) and (not _is_bound(cand_sym, rhs0)):
-                    sym, set_name = cand_sym, cand_set
-                    break
-            if sym is None:
-                sym, set_name = list(sym_to_set.items())[0]
-
-            s_obj = find_set(ir, set_name)
-            elems = getattr(s_obj, "elements", []) if s_obj is not None else []
-            if not isinstance(elems, list) or not elems or len(elems) > self.MAX_UNROLL:
-                new_constraints.append(c)
+            try:
+                forall = [[sym, set_name] for sym, set_name in forall_bindings(c)]
+            except ValueError:
+                forall = []
+            have = {b[0] for b in forall}
+            added = [[sym, set_name] for sym, set_name in info["sym_to_set"].items() if sym not in have]
+            if not added:
                 continue
 
-            for e in elems:
-                e_str = str(e)
-                lhs = _replace_index_symbol_with_literal(lhs0, sym, e_str)
-                rhs = _replace_index_symbol_with_literal(rhs0, sym, e_str)
-                suffix = _sanitize_for_name(e_str)
-                new_name = f"{cname}__{sym}_{suffix}"
-                new_constraints.append(
-                    ConstraintDef(
-                        name=new_name,
-                        expr_lhs=lhs,
-                        sense=sense0,
-                        expr_rhs=rhs,
-                        description=desc0,
-                    )
-                )
-
-            unrolled_names.append(cname)
-            changed_fields.append(f"constraints[{idx}] ({cname}) -> unrolled over {set_name} by {sym}")
+            setattr(c, "forall", forall + added)
+            bound_names.append(cname)
+            changed_fields.append(
+                f"constraints[{idx}] ({cname}).forall += " + ", ".join(f"{sym} in {st}" for sym, st in added)
+            )
 
-        if not unrolled_names:
+        if not bound_names:
             return None
 
-        setattr(ir, "constraints", new_constraints)
-        changed_fields.append("constraints (list replaced)")
-
         return mk_repair(
             layer=self.layer,
             kind=self.kind,
-            message=f"Unrolled {len(unrolled_names)} constraint(s) over inferred sets: {unrolled_names}",
+            message=f"Bound free indices of {len(bound_names)} constraint(s) over inferred sets (forall): {bound_names}",
             changed_fields=changed_fields,
         )
 
@@ -8,8 +8,15 @@
 # 2) Full rebuild via LLM using:
 #    - Base NL2IR prompts (ir2solve_nl2ir.py) +
 #    - Type-specific instruction block (this file).
-# 3) Acceptance test:
-#    - Build succeeds (ir_to_gurobi) AND solver returns FEASIBLE/OPTIMAL (short time limit).
+# 3) Acceptance test (tiered):
+#    - Build succeeds (configured solver backend);
+#    - tier "relaxation": the LP relaxation (~ms) rejects infeasible/unbounded
+#      models, and accepts when its optimum is already integral;
+#    - tier "mip": otherwise the full model must reach FEASIBLE/OPTIMAL (short time limit).
+#    The deciding tier is recorded in the repair record ("acceptance"), together
+#    with the outcome (status, objective, solution, IR fingerprint) so the
+#    pipeline can reuse it instead of solving the accepted IR again. The
+#    pipeline drops the solution vector once read, before the report is saved.
 #
 # Types supported:
 # - max_flow (network flow / maximum flow)
@@ -20,6 +27,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional, Tuple
 import re
+import time
 
 from ir2solve_verifier_core import VerifierRule, RuleDetection, mk_issue, mk_repair
 
@@ -180,7 +188,7 @@ Model requirements:
 - Capacity on existing arcs only:
     For each existing arc (i,j): 0 <= flow[i][j] <= capacity[i][j]
     Missing arcs: either do NOT create variables for them OR enforce flow[i][j] == 0.
-- UNROLL constraints into explicit scalar constraints (no implicit "for all").
+- Per-node / per-arc constraints: use ONE constraint with a "forall" binding (no implicit "for all" inside expressions).
 """.strip(),
 
     "assignment": r"""
@@ -251,7 +259,9 @@ def _fallback_problem_text_from_ir(ir: Any, max_chars: int = 4000) -> str:
         parts.append(f"Objective: sense={getattr(obj,'sense',None)} expr={getattr(obj,'expr','')}")
     parts.append("Constraints (sample):")
     for c in (getattr(ir, "constraints", []) or [])[:10]:
-        parts.append(f"- {getattr(c,'name','')}: {getattr(c,'expr_lhs','')} {getattr(c,'sense','')} {getattr(c,'expr_rhs','')}")
+        forall = getattr(c, "forall", None)
+        suffix = f" forall {forall}" if forall else ""
+        parts.append(f"- {getattr(c,'name','')}: {getattr(c,'expr_lhs','')} {getattr(c,'sense','')} {getattr(c,'expr_rhs','')}{suffix}")
 
     out = "\n".join(parts)
     return out[:max_chars]
@@ -261,43 +271,65 @@ def _fallback_problem_text_from_ir(ir: Any, max_chars: int = 4000) -> str:
 # Acceptance test
 # -----------------------------------------------------------------------------
 
-def acceptance_test(ir: Any, time_limit: float = 5.0) -> Tuple[bool, str]:
+ACCEPTANCE_RELAX_TIME_LIMIT = 1.0  # seconds for the relaxation tier
+
+
+def acceptance_test(
+    ir: Any,
+    time_limit: float = 5.0,
+    backend: str = "gurobi",
+    tiered: bool = True,
+    outcome_info: Optional[Dict[str, Any]] = None,
+) -> Tuple[bool, str, str]:
     """
     Build + optimize quickly; accept if status indicates feasible/optimal.
-    Returns (ok, status_name).
+    Returns (ok, status_name, tier) with tier "relaxation" | "mip" | "build".
+    If outcome_info is given it is filled with the deciding solve:
+    status (Gurobi code), obj_value, sol_count, solution (mip tier only).
     """
+    info = outcome_info if outcome_info is not None else {}
     try:
-        from ir2solve_ir import ir_to_gurobi
+        from ir2solve_backend import get_backend
         from gurobipy import GRB
     except Exception as e:
-        return False, f"tooling_import_error:{type(e).__name__}"
+        return False, f"tooling_import_error:{type(e).__name__}", "build"
 
     try:
-        m = ir_to_gurobi(ir)
-        try:
-            m.Params.OutputFlag = 0
-        except Exception:
-            pass
-        try:
-            m.Params.TimeLimit = float(time_limit)
-        except Exception:
-            pass
-        m.optimize()
+        be = get_backend(backend)
+        built = be.build(ir)
+    except Exception as e:
+        return False, f"build_or_opt_error:{type(e).__name__}", "build"
 
-        st = m.Status
+    try:
+        if tiered:
+            try:
+                rel, integral = be.solve_relaxation(
+                    built, time_limit=min(float(time_limit), ACCEPTANCE_RELAX_TIME_LIMIT)
+                )
+            except NotImplementedError:
+                rel, integral = None, False
+            if rel is not None:
+                # an infeasible/unbounded relaxation means the full model cannot be OPTIMAL/FEASIBLE
+                if rel.status in (GRB.INFEASIBLE, GRB.UNBOUNDED, GRB.INF_OR_UNBD):
+                    return False, rel.status_name, "relaxation"
+                # integral relaxation optimum is optimal for the full model too
+                if rel.status == GRB.OPTIMAL and integral:
+                    info.update(status=rel.status, obj_value=rel.obj_value, sol_count=1, solution=None)
+                    return True, "OPTIMAL", "relaxation"
+
+        out = be.solve(built, time_limit=float(time_limit), log=False, want_solution=True)
+        st = out.status
+        info.update(status=st, obj_value=out.obj_value, sol_count=out.sol_count, solution=out.solution)
         # Accept OPTIMAL; also accept FEASIBLE if stopped early.
         if st == GRB.OPTIMAL:
-            return True, "OPTIMAL"
-        if st in (GRB.SUBOPTIMAL, GRB.TIME_LIMIT):
-            # Check feasibility
-            try:
-                if m.SolCount and m.SolCount > 0:
-                    return True, "FEASIBLE"
-            except Exception:
-                pass
-        return False, str(st)
+            return True, "OPTIMAL", "mip"
+        if st in (GRB.SUBOPTIMAL, GRB.TIME_LIMIT) and out.sol_count > 0:
+            return True, "FEASIBLE", "mip"
+        return False, out.status_name, "mip"
     except Exception as e:
-        return False, f"build_or_opt_error:{type(e).__name__}"
+        return False, f"build_or_opt_error:{type(e).__name__}", "mip"
+    finally:
+        be.dispose(built)
 
 
 # -----------------------------------------------------------------------------
@@ -311,6 +343,10 @@ class TypeTemplateRescue(VerifierRule):
     # High-confidence threshold
     THRESHOLD = 0.75
 
+    def __init__(self, solver_backend: str = "gurobi", client: Any = None) -> None:
+        self.solver_backend = solver_backend
+        self.client = client
+
     def detect(self, ir: Any) -> Optional[RuleDetection]:
         kind, score, scores = identify_type(ir)
         if kind is None:
@@ -352,12 +388,14 @@ class TypeTemplateRescue(VerifierRule):
             )
 
         system_prompt = build_system_prompt()
-        user_prompt = build_user_prompt(base_text) + "\n\n" + "TYPE-SPECIFIC INSTRUCTIONS:\n" + TYPE_PROMPTS[kind]
+        user_prompt = build_user_prompt(base_text, type_instructions=TYPE_PROMPTS[kind])
 
         # Call LLM
         try:
-            from openai import OpenAI
-            client = OpenAI()
+            client = self.client
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI()
             resp = client.chat.completions.create(
                 model="gpt-4o",
                 temperature=0,
@@ -379,7 +417,9 @@ class TypeTemplateRescue(VerifierRule):
             return None
 
         # Acceptance test
-        ok, st = acceptance_test(new_ir, time_limit=5.0)
+        t0 = time.perf_counter()
+        outcome: Dict[str, Any] = {}
+        ok, st, tier = acceptance_test(new_ir, time_limit=5.0, backend=self.solver_backend, outcome_info=outcome)
         if not ok:
             return None
 
@@ -391,13 +431,32 @@ class TypeTemplateRescue(VerifierRule):
         setattr(ir, "objective", getattr(new_ir, "objective", getattr(ir, "objective", None)))
         setattr(ir, "constraints", getattr(new_ir, "constraints", getattr(ir, "constraints", [])))
 
-        return mk_repair(
+        repair = mk_repair(
             layer=self.layer,
             kind=self.kind,
-            message=f"L3 rebuilt model as {kind} and passed acceptance test ({st}).",
+            message=f"L3 rebuilt model as {kind} and passed acceptance test ({st}, tier={tier}).",
             changed_fields=["meta", "sets", "params", "vars", "objective", "constraints"],
         )
+        repair["acceptance"] = {
+            "status": st,
+            "tier": tier,
+            "sec": time.perf_counter() - t0,
+            "backend": self.solver_backend,
+            "fingerprint": _fingerprint_or_empty(ir),
+            "outcome": outcome,
+        }
+        return repair
+
+
+def _fingerprint_or_empty(ir: Any) -> str:
+    try:
+        from ir2solve_fingerprint import ir_fingerprint
+
+        return ir_fingerprint(ir)
+    except Exception:
+        return ""
 
 
-def get_layer3_rules() -> List[VerifierRule]:
-    return [TypeTemplateRescue()]
+def get_layer3_rules(config: Any = None) -> List[VerifierRule]:
+    backend = getattr(config, "solver_backend", None) or "gurobi"
+    return [TypeTemplateRescue(solver_backend=backend, client=getattr(config, "llm_client", None))]
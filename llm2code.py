@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from typing import Any, Dict, List, Optional
 
 from ir2solve_ir import ModelIR
@@ -56,6 +56,7 @@ def build_gurobi_model():
 
 # Build the model
 model = build_gurobi_model()
+```
 """.strip()
 
 SCHEMA_FOR_IR = r"""
@@ -75,21 +76,23 @@ A list of sets. Each set is:
 A list of parameters. Each param is:
 {
   "name": "string",
-  "indices": [] | ["SetName"] | ["SetName1","SetName2"],  // 0D/1D/2D only
-  "values": number | {key:number,...} | {i:{j:number,...},...},   // recommended canonical forms below
-  "description": "string or null"
+  "indices": [] | ["SetName"] | ["SetName1","SetName2", ...],  // 0D/1D/2D/... (one set per dimension)
+  "values": number | {key:number,...} | {i:{j:number,...},...} | deeper nesting,   // recommended canonical forms below
+  "description": "string or null",
+  "default": null | number   // if set: every entry missing from "values" equals this number
 }
 
 Canonical forms for values:
 - Scalar (0D): a number (or a single-entry dict is tolerated by the compiler)
 - 1D over set I: {"i1": 1.0, "i2": 2.0, ...}
 - 2D over sets I,J (RECOMMENDED): {"i1": {"j1": 1.0, "j2": 3.0}, "i2": {...}, ...}
+- 3D+ over sets I,J,K: one nesting level per index, e.g. {"i1": {"j1": {"k1": 1.0, ...}, ...}, ...}
 
 3) vars
 A list of decision variables. Each var is:
 {
   "name": "string",
-  "indices": [] | ["SetName"] | ["SetName1","SetName2"],  // 0D/1D/2D only
+  "indices": [] | ["SetName"] | ["SetName1","SetName2", ...],  // 0D/1D/2D/... (one set per dimension)
   "vartype": "continuous" | "integer" | "binary",
   "lb": number,
   "ub": number or null,
@@ -111,10 +114,23 @@ A list of constraints. Each constraint is:
   "expr_lhs": "Python expression string",
   "sense": "<=" | ">=" | "==",
   "expr_rhs": "Python expression string",
-  "description": "string or null"
+  "description": "string or null",
+  "forall": null | [["i","I"], ...]   // optional: the constraint holds for every i in I (i is bound in the expressions)
 }
 """
 
+CRITICAL_REQUIREMENTS = r"""
+CRITICAL REQUIREMENTS:
+- Generate a Python function named `build_gurobi_model()` that takes no parameters and returns the Gurobi model
+- The function should use the provided ModelIR to build the model
+- Include all necessary imports
+- At the end of the code, call `build_gurobi_model()` to create the model
+- Do NOT include any extra explanations outside the code
+
+YOUR OUTPUT MUST BE A VALID python code that creates a Gurobi model.
+"""
+
+STATIC_SYSTEM_PROMPT = BASE_SYSTEM_PROMPT + "\n\n" + SCHEMA_FOR_IR.strip() + "\n\n" + CRITICAL_REQUIREMENTS.strip()
 
 
 def build_generate_message(question_txt: str, ir: ModelIR) -> List[Dict[str, str]]:
@@ -125,34 +141,25 @@ def build_generate_message(question_txt: str, ir: ModelIR) -> List[Dict[str, str
     if ir is not None:
         # 取ir中的sets/params/vars/obj/constrs部分上传
         ir_dict = {
-            "sets": [s.__dict__ for s in ir.sets],
-            "params": [p.__dict__ for p in ir.params],
-            "vars": [v.__dict__ for v in ir.vars],
-            "objective": ir.objective.__dict__ if ir.objective is not None else None,
-            "constraints": [c.__dict__ for c in ir.constraints],
+            "sets": [asdict(s) for s in ir.sets],
+            "params": [asdict(p) for p in ir.params],
+            "vars": [asdict(v) for v in ir.vars],
+            "objective": asdict(ir.objective) if ir.objective is not None else None,
+            "constraints": [asdict(c) for c in ir.constraints],
         }
         ir_str = json.dumps(ir_dict, ensure_ascii=False, indent=2)
 
-    system_prompt = BASE_SYSTEM_PROMPT
+    # static instructions + schema first (identical for every instance, so the
+    # provider can serve them from its prefix cache); instance content last
+    system_prompt = STATIC_SYSTEM_PROMPT
 
-    user_prompt = f"""{SCHEMA_FOR_IR}
-    
-    TASK EXECUTION:
-    1. PROBLEM DESCRIPTION:
-    {question_txt}
-
-    2. PROVIDED INTERMEDIATE REPRESENTATION (IR):
-    {ir_str}
-
-    CRITICAL REQUIREMENTS:
-    - Generate a Python function named `build_gurobi_model()` that takes no parameters and returns the Gurobi model
-    - The function should use the provided ModelIR to build the model
-    - Include all necessary imports
-    - At the end of the code, call `build_gurobi_model()` to create the model
-    - Do NOT include any extra explanations outside the code
+    user_prompt = f"""TASK EXECUTION:
+1. PROBLEM DESCRIPTION:
+{question_txt}
 
-    YOUR OUTPUT MUST BE A VALID python code that creates a Gurobi model.
-    """
+2. PROVIDED INTERMEDIATE REPRESENTATION (IR):
+{ir_str}
+"""
 
     messages = [
         {"role": "system", "content": system_prompt},
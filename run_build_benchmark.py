@@ -0,0 +1,142 @@
+# run_build_benchmark.py
+# Model-build benchmark on generated IRs (no LLM, no solve):
+# expression evaluation via eval() vs the AST linear evaluator (ir2solve_lineval),
+# for each build mode. Prints a table and optionally writes JSON.
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from ir2solve_ir import ModelIR, ir_to_gurobi
+from ir2solve_nl2ir import json_to_model_ir
+
+# (generator, size) pairs; sizes are the set cardinalities
+CASES = [("transport", 100), ("transport", 300), ("assignment_forall", 150), ("knapsack_rows", 2000)]
+BUILD_MODES = ["expr", "matrix"]
+EXPR_EVALS = ["eval", "ast"]
+REPEATS = 3
+
+
+# -------------------------
+# generated IRs
+# -------------------------
+def gen_transport(n: int) -> Dict[str, Any]:
+    """n sources x n sinks; long quicksum rows and a dense n*n objective."""
+    S = [f"s{i}" for i in range(n)]
+    D = [f"d{j}" for j in range(n)]
+    return {
+        "meta": {"problem_id": f"transport_{n}"},
+        "sets": [{"name": "S", "elements": S}, {"name": "D", "elements": D}],
+        "params": [
+            {"name": "supply", "indices": ["S"], "values": {s: 100.0 for s in S}},
+            {"name": "demand", "indices": ["D"], "values": {d: 50.0 for d in D}},
+            {
+                "name": "cost",
+                "indices": ["S", "D"],
+                "values": {s: {d: float((i * 7 + j * 3) % 11 + 1) for j, d in enumerate(D)} for i, s in enumerate(S)},
+            },
+        ],
+        "vars": [{"name": "x", "indices": ["S", "D"], "vartype": "continuous", "lb": 0}],
+        "objective": {"name": "cost", "sense": "min", "expr": "quicksum(cost[s][d] * x[s][d] for s in S for d in D)"},
+        "constraints": [
+            {"name": "sup", "expr_lhs": "quicksum(x[s][d] for d in D)", "sense": "<=", "expr_rhs": "supply[s]", "forall": [["s", "S"]]},
+            {"name": "dem", "expr_lhs": "quicksum(x[s][d] for s in S)", "sense": ">=", "expr_rhs": "demand[d]", "forall": [["d", "D"]]},
+        ],
+    }
+
+
+def gen_assignment_forall(n: int) -> Dict[str, Any]:
+    """n x n assignment with per-cell forall rows (many short expressions)."""
+    W = [f"w{i}" for i in range(n)]
+    T = [f"t{j}" for j in range(n)]
+    return {
+        "meta": {"problem_id": f"assignment_{n}"},
+        "sets": [{"name": "W", "elements": W}, {"name": "T", "elements": T}],
+        "params": [
+            {"name": "c", "indices": ["W", "T"], "values": {w: {t: float((i + 2 * j) % 13) for j, t in enumerate(T)} for i, w in enumerate(W)}},
+            {"name": "cap", "indices": ["W", "T"], "values": {w: {t: 1.0 + (i * j) % 3 for j, t in enumerate(T)} for i, w in enumerate(W)}},
+        ],
+        "vars": [{"name": "y", "indices": ["W", "T"], "vartype": "continuous", "lb": 0, "ub": 1}],
+        "objective": {"name": "o", "sense": "min", "expr": "quicksum(c[w][t] * y[w][t] for w in W for t in T)"},
+        "constraints": [
+            {"name": "row", "expr_lhs": "quicksum(y[w][t] for t in T)", "sense": "==", "expr_rhs": "1", "forall": [["w", "W"]]},
+            {"name": "col", "expr_lhs": "quicksum(y[w][t] for w in W)", "sense": "==", "expr_rhs": "1", "forall": [["t", "T"]]},
+            {"name": "cell", "expr_lhs": "2 * cap[w][t] * y[w][t] - y[w][t]", "sense": "<=", "expr_rhs": "cap[w][t] + 1", "forall": [["w", "W"], ["t", "T"]]},
+        ],
+    }
+
+
+def gen_knapsack_rows(n: int) -> Dict[str, Any]:
+    """10 knapsack rows over n items with weights indexed by (row, item)."""
+    I = [f"i{k}" for k in range(n)]
+    K = [f"k{r}" for r in range(10)]
+    return {
+        "meta": {"problem_id": f"knapsack_{n}"},
+        "sets": [{"name": "I", "elements": I}, {"name": "K", "elements": K}],
+        "params": [
+            {"name": "v", "indices": ["I"], "values": {i: float(k % 17 + 1) for k, i in enumerate(I)}},
+            {"name": "w", "indices": ["K", "I"], "values": {r: {i: float((k * (ri + 3)) % 19 + 1) for k, i in enumerate(I)} for ri, r in enumerate(K)}},
+            {"name": "W", "indices": ["K"], "values": {r: float(n * 3) for r in K}},
+        ],
+        "vars": [{"name": "b", "indices": ["I"], "vartype": "binary"}],
+        "objective": {"name": "o", "sense": "max", "expr": "quicksum(v[i] * b[i] for i in I)"},
+        "constraints": [
+            {"name": "cap", "expr_lhs": "quicksum(w[r][i] * b[i] for i in I)", "sense": "<=", "expr_rhs": "W[r]", "forall": [["r", "K"]]},
+        ],
+    }
+
+
+GENERATORS: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    "transport": gen_transport,
+    "assignment_forall": gen_assignment_forall,
+    "knapsack_rows": gen_knapsack_rows,
+}
+
+
+# -------------------------
+# benchmark
+# -------------------------
+def time_build(ir: ModelIR, build_mode: str, expr_eval: str, repeats: int) -> Dict[str, Any]:
+    best = float("inf")
+    info: Dict[str, Any] = {}
+    for _ in range(repeats):
+        info = {}
+        t0 = time.perf_counter()
+        m = ir_to_gurobi(ir, build_mode=build_mode, build_info=info, expr_eval=expr_eval)
+        best = min(best, time.perf_counter() - t0)
+        m.dispose()
+    return {"sec": best, "num_vars": info.get("num_vars"), "num_constrs": info.get("num_constrs"), "expr_eval": info.get("expr_eval")}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--repeats", type=int, default=REPEATS)
+    ap.add_argument("--json", default="", help="write results to this JSON file")
+    args = ap.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    print(f"{'case':<24}{'mode':<8}{'vars':>9}{'rows':>9}{'eval s':>10}{'ast s':>10}{'speedup':>9}")
+    for gen, n in CASES:
+        ir = json_to_model_ir(GENERATORS[gen](n))
+        for mode in BUILD_MODES:
+            row: Dict[str, Any] = {"case": f"{gen}_{n}", "build_mode": mode}
+            for ev in EXPR_EVALS:
+                row[ev] = time_build(ir, mode, ev, args.repeats)
+            speedup = row["eval"]["sec"] / row["ast"]["sec"] if row["ast"]["sec"] > 0 else float("nan")
+            row["speedup"] = speedup
+            results.append(row)
+            print(
+                f"{row['case']:<24}{mode:<8}{row['eval']['num_vars']:>9}{row['eval']['num_constrs']:>9}"
+                f"{row['eval']['sec']:>10.3f}{row['ast']['sec']:>10.3f}{speedup:>8.2f}x"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
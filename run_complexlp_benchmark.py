@@ -8,11 +8,17 @@ from __future__ import annotations
 import os
 import json
 import csv
+import argparse
+import asyncio
 import traceback
+from concurrent.futures import Executor, ThreadPoolExecutor
 from typing import Any, Dict, Optional, Tuple, List
 
-from openai import OpenAI
-from ir2solve_pipeline import run_ir2solve_pipeline, PipelineConfig
+from openai import AsyncOpenAI
+from ir2solve_pipeline import run_ir2solve_pipeline_async, PipelineConfig
+from ir2solve_backend import threads_per_worker
+from ir2solve_cache import attach_llm_response_cache, get_llm_cache, get_solve_cache
+from ir2solve_ratelimit import LLMThrottle, attach_llm_throttle
 
 # -------------------------
 # Config
@@ -36,6 +42,40 @@ LAYER3_ON = True
 REPAIRS_ON = True
 DETERMINE_ON = True
 
+# Gurobi thread budget per solve (0 = all cores); None splits the cores
+# between the --concurrency workers (max(1, cpu_count // concurrency))
+SOLVER_THREADS = None
+
+# per-phase build timings in each trace + a roll-up in the summary
+PROFILE_BUILD = False
+
+# compiled-model cache shared by reruns/ablation sweeps (None disables)
+MODEL_CACHE_DIR = None  # e.g. os.path.join(RESULT_DIR, "model_cache")
+
+# solve-result cache (SQLite); reruns of unchanged IRs skip the solver (None disables)
+SOLVE_CACHE_PATH = None  # e.g. os.path.join(RESULT_DIR, "solve_cache.sqlite")
+
+# LLM response cache (SQLite); temperature-0 requests seen before are answered
+# from disk, e.g. when rerunning after a verifier change (None disables)
+LLM_CACHE_PATH = None  # e.g. os.path.join(RESULT_DIR, "llm_cache.sqlite")
+
+# client-side LLM rate limits shared by all instances (None disables a bucket);
+# set them to the account quota when running with --concurrency
+LLM_RPM = None  # requests per minute, e.g. 500
+LLM_TPM = None  # tokens per minute, e.g. 300000
+# retries of 429 / timeout / 5xx failures (jittered exponential backoff)
+LLM_MAX_RETRIES = 6
+# per-instance budget for LLM calls incl. limiter waits and backoff (None = unlimited)
+LLM_DEADLINE_SEC = 600.0
+
+# stream the NL->IR completion and stop it on a fatal sets/params/vars schema
+# error (failure_stage "llm_stream_abort"; timings in trace["stream"])
+STREAM_NL2IR = False
+
+# instances in flight at once (overridden by --concurrency); LLM calls are
+# awaited concurrently, builds/solves run on a thread pool of this size
+CONCURRENCY = 1
+
 # -------------------------
 # Utils
 # -------------------------
@@ -64,6 +104,63 @@ def is_close(a: float, b: float, atol: float = 1e-4, rtol: float = 1e-6) -> bool
     return abs(a - b) <= (atol + rtol * max(1.0, abs(b)))
 
 
+def _new_build_profile_rollup() -> Dict[str, Any]:
+    return {"instances": 0, "total_sec": 0.0, "phases": {}, "slowest_constraints": []}
+
+
+def _rollup_build_profile(agg: Dict[str, Any], trace: Any, problem_id: str, top_n: int = 10) -> None:
+    """Accumulate trace["build"]["profile"] (PipelineConfig.profile_build) across instances."""
+    prof = ((trace or {}).get("build") or {}).get("profile") if isinstance(trace, dict) else None
+    if not isinstance(prof, dict):
+        return
+    agg["instances"] += 1
+    agg["total_sec"] += float(prof.get("total_sec", 0.0) or 0.0)
+    for name, rec in (prof.get("phases") or {}).items():
+        cur = agg["phases"].setdefault(name, {"sec": 0.0, "alloc_blocks": 0})
+        cur["sec"] += float(rec.get("sec", 0.0) or 0.0)
+        cur["alloc_blocks"] += int(rec.get("alloc_blocks", 0) or 0)
+    slow = agg["slowest_constraints"]
+    for it in prof.get("slowest_constraints") or []:
+        slow.append(dict(it, problem_id=problem_id))
+    slow.sort(key=lambda it: -float(it.get("sec", 0.0) or 0.0))
+    del slow[top_n:]
+
+
+def _format_build_profile(agg: Dict[str, Any]) -> List[str]:
+    n = agg["instances"]
+    if n == 0:
+        return []
+    lines = ["====== BUILD PROFILE ======", f"Profiled builds: {n}, total={agg['total_sec']:.3f}s, avg={agg['total_sec']/n:.4f}s"]
+    for name, rec in sorted(agg["phases"].items(), key=lambda kv: -kv[1]["sec"]):
+        lines.append(f"  {name}: {rec['sec']:.3f}s (avg {rec['sec']/n:.4f}s), alloc_blocks={rec['alloc_blocks']}")
+    if agg["slowest_constraints"]:
+        lines.append("Slowest constraints:")
+        for it in agg["slowest_constraints"]:
+            lines.append(f"  {it.get('problem_id')}:{it.get('name')} rows={it.get('rows')} {float(it.get('sec', 0.0)):.4f}s")
+    return lines
+
+
+def _rollup_stream(agg: Dict[str, Any], trace: Any) -> None:
+    info = trace.get("stream") if isinstance(trace, dict) else None
+    if not info:
+        return
+    agg["streamed"] += 1
+    agg["aborted"] += int(bool(info.get("aborted")))
+    if info.get("first_verdict_sec") is not None:
+        agg["first_verdict_sec"].append(float(info["first_verdict_sec"]))
+
+
+def _format_stream(agg: Dict[str, Any]) -> List[str]:
+    if agg["streamed"] == 0:
+        return []
+    ttfv = agg["first_verdict_sec"]
+    avg = f"{sum(ttfv)/len(ttfv):.2f}s" if ttfv else "n/a"
+    return [
+        "====== NL->IR STREAM ======",
+        f"Streamed: {agg['streamed']}, aborted on schema error: {agg['aborted']}, avg time to first verdict: {avg}",
+    ]
+
+
 def _safe_problem_id(name: str) -> str:
     return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
 
@@ -85,11 +182,13 @@ def _extract_kinds(report: Any, key: str) -> List[str]:
 # -------------------------
 # Per-instance solve
 # -------------------------
-def solve_one_instance(
+async def solve_one_instance(
     idx: int,
     question_text: str,
     gt_answer_raw: Any,
-    client: OpenAI,
+    client: AsyncOpenAI,
+    executor: Optional[Executor] = None,
+    concurrency: int = 1,
 ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
     instance_id = f"mamo_complex_lp_{idx}"
     gt_value = safe_float(gt_answer_raw)
@@ -119,15 +218,24 @@ def solve_one_instance(
             layer2_on=bool(LAYER2_ON),
             layer3_on=bool(LAYER3_ON),
             repairs_on=bool(REPAIRS_ON),
+            solver_threads=threads_per_worker(concurrency) if SOLVER_THREADS is None else int(SOLVER_THREADS),
+            profile_build=bool(PROFILE_BUILD),
+            model_cache_dir=MODEL_CACHE_DIR,
+            solve_cache_path=SOLVE_CACHE_PATH,
+            llm_deadline_sec=LLM_DEADLINE_SEC,
+            stream_nl2ir=bool(STREAM_NL2IR),
             determine_on=bool(DETERMINE_ON),
+            # one Gurobi environment per concurrent instance
+            env_pool_size=max(2, concurrency),
         )
 
-        res = run_ir2solve_pipeline(
+        res = await run_ir2solve_pipeline_async(
             question_text=question_text,
             client=client,
             config=cfg,
             problem_id=instance_id,
             meta_override={"source": "Mamo_complex_lp"},
+            executor=executor,
         )
 
         ir_dict = getattr(res, "ir_dict", None) or {}
@@ -178,11 +286,59 @@ def solve_one_instance(
 # -------------------------
 # Main
 # -------------------------
+def _input_error(idx: int, error: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """(row, ir_dict, trace) of a dataset line that could not be decoded."""
+    row = {
+        "index": idx,
+        "problem_id": f"mamo_complex_lp_{idx}",
+        "status": "ERROR",
+        "obj_value": "",
+        "ground_truth": "",
+        "correct": 0,
+        "issues": "",
+        "repairs": "",
+        "failure_stage": "input_json_decode",
+        "error": error,
+    }
+    return row, {}, {"meta": {"problem_id": row["problem_id"], "source": "Mamo_complex_lp"}, "error": error}
+
+
+async def run_instance(
+    idx: int,
+    line: str,
+    client: AsyncOpenAI,
+    sem: asyncio.Semaphore,
+    executor: Executor,
+    concurrency: int,
+) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    try:
+        record = json.loads(line)
+        question_text = record.get("Question", "") or ""
+        gt_answer_raw = record.get("Answer", "")
+    except Exception as e:
+        return _input_error(idx, f"{type(e).__name__}: {e}")
+
+    async with sem:
+        return await solve_one_instance(idx, question_text, gt_answer_raw, client, executor, concurrency)
+
+
 def main() -> None:
+    ap = argparse.ArgumentParser(description="ComplexLP benchmark runner")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="instances in flight at once")
+    args = ap.parse_args()
+    asyncio.run(run_benchmark(max(1, args.concurrency)))
+
+
+async def run_benchmark(concurrency: int) -> None:
     ensure_dir(RESULT_DIR)
     ensure_dir(IR_OUTPUT_DIR)
 
-    client = OpenAI()
+    # retries are done by the throttle (shared limits, per-instance deadline)
+    client = AsyncOpenAI(max_retries=0)
+    throttle = LLMThrottle(rpm=LLM_RPM, tpm=LLM_TPM, max_retries=LLM_MAX_RETRIES)
+    attach_llm_throttle(client, throttle)
+    if LLM_CACHE_PATH:
+        attach_llm_response_cache(client, get_llm_cache(LLM_CACHE_PATH))
 
     fieldnames = [
         "index",
@@ -198,6 +354,20 @@ def main() -> None:
     ]
 
     total = solved = correct_cnt = 0
+    build_profile = _new_build_profile_rollup()
+    stream_rollup = {"streamed": 0, "aborted": 0, "first_verdict_sec": []}
+
+    # at most `concurrency` pipelines in flight; each one runs its non-LLM
+    # stages (and blocks in L3 rebuild calls) on one executor thread
+    sem = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    with open(DATASET_PATH, "r", encoding="utf-8") as f_in:
+        lines = [(idx, line.strip()) for idx, line in enumerate(f_in)]
+    tasks = [
+        (idx, asyncio.create_task(run_instance(idx, line, client, sem, executor, concurrency)))
+        for idx, line in lines
+        if line
+    ]
 
     with open(RESULT_CSV_PATH, "w", newline="", encoding="utf-8") as f_csv, open(
         TRACE_JSONL_PATH, "w", encoding="utf-8"
@@ -205,58 +375,32 @@ def main() -> None:
         writer = csv.DictWriter(f_csv, fieldnames=fieldnames)
         writer.writeheader()
 
-        with open(DATASET_PATH, "r", encoding="utf-8") as f_in:
-            for idx, line in enumerate(f_in):
-                line = line.strip()
-                if not line:
-                    continue
-                total += 1
-
-                try:
-                    record = json.loads(line)
-                    question_text = record.get("Question", "") or ""
-                    gt_answer_raw = record.get("Answer", "")
-                except Exception as e:
-                    row = {
-                        "index": idx,
-                        "problem_id": f"mamo_complex_lp_{idx}",
-                        "status": "ERROR",
-                        "obj_value": "",
-                        "ground_truth": "",
-                        "correct": 0,
-                        "issues": "",
-                        "repairs": "",
-                        "failure_stage": "input_json_decode",
-                        "error": f"{type(e).__name__}: {e}",
-                    }
-                    writer.writerow(row)
-                    f_trace.write(
-                        json.dumps(
-                            {"meta": {"problem_id": row["problem_id"], "source": "Mamo_complex_lp"}, "error": row["error"]},
-                            ensure_ascii=False,
-                        )
-                        + "\n"
-                    )
-                    continue
-
-                row, ir_dict, trace = solve_one_instance(idx, question_text, gt_answer_raw, client)
-                writer.writerow(row)
-                f_trace.write(json.dumps(trace, ensure_ascii=False) + "\n")
-
-                safe_id = _safe_problem_id(row["problem_id"])
-                with open(os.path.join(IR_OUTPUT_DIR, f"{idx:03d}_{safe_id}.json"), "w", encoding="utf-8") as f_json:
-                    json.dump(ir_dict, f_json, indent=2, ensure_ascii=False)
-
-                if row["obj_value"] != "":
-                    solved += 1
-                if row["correct"]:
-                    correct_cnt += 1
-
-                print(
-                    f"[{idx}] status={row['status']} obj={row['obj_value']} gt={row['ground_truth']} "
-                    f"correct={row['correct']} issues={row['issues']} repairs={row['repairs']} "
-                    f"stage={row['failure_stage']} err={row['error']}"
-                )
+        # results are written in dataset order as they become available
+        for idx, task in tasks:
+            total += 1
+            row, ir_dict, trace = await task
+            writer.writerow(row)
+            f_trace.write(json.dumps(trace, ensure_ascii=False) + "\n")
+            if row["failure_stage"] == "input_json_decode":
+                continue
+            _rollup_build_profile(build_profile, trace, row["problem_id"])
+            _rollup_stream(stream_rollup, trace)
+
+            safe_id = _safe_problem_id(row["problem_id"])
+            with open(os.path.join(IR_OUTPUT_DIR, f"{idx:03d}_{safe_id}.json"), "w", encoding="utf-8") as f_json:
+                json.dump(ir_dict, f_json, indent=2, ensure_ascii=False)
+
+            if row["obj_value"] != "":
+                solved += 1
+            if row["correct"]:
+                correct_cnt += 1
+
+            print(
+                f"[{idx}] status={row['status']} obj={row['obj_value']} gt={row['ground_truth']} "
+                f"correct={row['correct']} issues={row['issues']} repairs={row['repairs']} "
+                f"stage={row['failure_stage']} err={row['error']}"
+            )
+    executor.shutdown()
 
     summary = [
         "====== SUMMARY ======",
@@ -267,6 +411,35 @@ def main() -> None:
     if total > 0:
         summary.append(f"Accuracy: {correct_cnt}/{total} = {correct_cnt/total:.3f}")
         summary.append(f"Solved ratio: {solved}/{total} = {solved/total:.3f}")
+    summary.extend(_format_build_profile(build_profile))
+    summary.extend(_format_stream(stream_rollup))
+
+    if SOLVE_CACHE_PATH:
+        sc = get_solve_cache(SOLVE_CACHE_PATH).stats()
+        summary.append("====== SOLVE CACHE ======")
+        summary.append(f"Hits: {sc['hits']}, misses: {sc['misses']}, stored: {sc['stores']}, hit rate: {sc['hit_rate']:.3f}")
+
+    ts = throttle.stats()
+    summary.append("====== LLM THROTTLE ======")
+    summary.append(
+        f"Calls: {ts['calls']}, retries: {ts['retries']}, failures: {ts['failures']}, "
+        f"deadline exceeded: {ts['deadline_exceeded']}"
+    )
+    summary.append(f"Waited: limiter={ts['limiter_wait_sec']:.1f}s, backoff={ts['backoff_sec']:.1f}s (rpm={ts['rpm']}, tpm={ts['tpm']})")
+    summary.append(f"Tokens: estimated={ts['estimated_tokens']}, actual={ts['actual_tokens']}")
+    if ts["prompt_tokens"]:
+        summary.append(
+            f"Prompt cache: {ts['cached_tokens']}/{ts['prompt_tokens']} prompt tokens cached "
+            f"({ts['cached_tokens']/ts['prompt_tokens']:.3f})"
+        )
+
+    if LLM_CACHE_PATH:
+        lc = get_llm_cache(LLM_CACHE_PATH).stats()
+        summary.append("====== LLM CACHE ======")
+        summary.append(f"Hits: {lc['hits']}, misses: {lc['misses']}, stored: {lc['stores']}, hit rate: {lc['hit_rate']:.3f}")
+        summary.append(
+            f"Saved tokens: total={lc['saved_total_tokens']} (prompt={lc['saved_prompt_tokens']}, completion={lc['saved_completion_tokens']})"
+        )
 
     print("\n" + "\n".join(summary))
     with open(SUMMARY_TXT_PATH, "w", encoding="utf-8") as f:
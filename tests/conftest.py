@@ -0,0 +1,7 @@
+# tests/conftest.py
+# The ir2solve_* modules live at the repository root.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+# tests/test_fingerprint.py
+
+import pytest
+
+from ir2solve_fingerprint import canonical_expr
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("2*x + 1", "2.0*x + 1.0"),
+        ("quicksum(3*x[i] for i in I)", "quicksum(3.0*x[i] for i in I)"),
+        ("min(2, y) - 1", "min(2.0, y) - 1.0"),
+    ],
+)
+def test_int_and_float_coefficients_match(a, b):
+    assert canonical_expr(a) == canonical_expr(b)
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("T[0]", "T[0.0]"),
+        ("x[T[k-1]]", "x[T[k-1.0]]"),
+        ("sum(c[i][0] * x[i] for i in I)", "sum(c[i][0.0] * x[i] for i in I)"),
+        ("quicksum(x[i] for i in range(3))", "quicksum(x[i] for i in range(3.0))"),
+    ],
+)
+def test_int_and_float_indices_differ(a, b):
+    assert canonical_expr(a) != canonical_expr(b)
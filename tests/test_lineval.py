@@ -0,0 +1,82 @@
+# tests/test_lineval.py
+# The translated evaluator (expr_eval="ast") must build the same linear
+# expressions as eval().
+
+import pytest
+
+gp = pytest.importorskip("gurobipy")
+
+from ir2solve_ir import ParamDef, build_param_env, eval_expr, make_eval_globals
+from ir2solve_lineval import LinearEvaluator, LinearTerms, compile_linear, translate_linear
+
+SETS = {"I": ["a", "b", "c"], "J": ["x", "y"]}
+PARAMS = [
+    ParamDef(name="c", indices=["I", "J"], values={i: {j: float(k + 2 * n) for n, j in enumerate(SETS["J"])} for k, i in enumerate(SETS["I"])}),
+    ParamDef(name="w", indices=["I"], values={"a": 1.0, "b": 2.0, "c": 3.0}),
+    ParamDef(name="k", indices=[], values=4.0),
+]
+
+
+@pytest.fixture
+def env():
+    m = gp.Model()
+    m.Params.OutputFlag = 0
+    x = {i: {j: m.addVar(name=f"x[{i},{j}]") for j in SETS["J"]} for i in SETS["I"]}
+    y = {i: m.addVar(name=f"y[{i}]") for i in SETS["I"]}
+    z = m.addVar(name="z")
+    m.update()
+    g = make_eval_globals(dict(SETS), build_param_env(PARAMS, SETS), {"x": x, "y": y, "z": z}, gp.quicksum)
+    yield g
+    m.dispose()
+
+
+def _terms(e):
+    """{var name: coeff} + constant of a LinExpr / number, duplicates merged."""
+    if not isinstance(e, gp.LinExpr):
+        return {}, float(e)
+    out = {}
+    for k in range(e.size()):
+        name = e.getVar(k).VarName
+        out[name] = out.get(name, 0.0) + e.getCoeff(k)
+    return {n: v for n, v in out.items() if v != 0.0}, e.getConstant()
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "quicksum(c[i][j] * x[i][j] for i in I for j in J)",
+        "sum(w[i] * y[i] for i in I if w[i] > 1) - 2 * z",
+        "quicksum(x[i][j] for i in I for j in J if j == 'y') + k",
+        "x['a']['x'] + x['a']['x'] - 0.5 * (y['b'] - z) / 2",
+        "-quicksum([c[i]['x'] * x[i]['x'] for i in I]) + len(I)",
+        "quicksum(x[i][j] * c[i][j] for i in I for j in J) + sum(w[i] for i in I)",
+        "k * 3 - 1",
+    ],
+)
+def test_translated_matches_eval(env, expr):
+    assert translate_linear(expr) is not None
+    f = compile_linear(expr)
+    assert f is not None
+    ev = LinearEvaluator(eval_expr)
+    terms = ev.evaluate_terms(expr, env)
+    assert isinstance(terms, LinearTerms)
+    assert ev.report() == {"ast": 1, "fallback": 0}
+    assert _terms(terms.to_expr()) == _terms(eval_expr(expr, env))
+    assert _terms(ev.evaluate(expr, env)) == _terms(eval_expr(expr, env))
+
+
+def test_outside_grammar_is_left_to_eval(env):
+    expr = "quicksum((lambda v: v)(y[i]) for i in I)"
+    assert translate_linear(expr) is None
+    ev = LinearEvaluator(eval_expr)
+    assert _terms(ev.evaluate(expr, env)) == _terms(eval_expr(expr, env))
+    assert ev.report() == {"ast": 0, "fallback": 1}
+
+
+def test_nonlinear_product_falls_back_to_eval(env):
+    expr = "x['a']['x'] * y['b'] + z"
+    assert compile_linear(expr) is not None  # translated; _NotLinear is raised at evaluation time
+    ev = LinearEvaluator(eval_expr)
+    out = ev.evaluate(expr, env)
+    assert isinstance(out, gp.QuadExpr)
+    assert ev.report() == {"ast": 0, "fallback": 1}
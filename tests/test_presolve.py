@@ -0,0 +1,117 @@
+# tests/test_presolve.py
+
+import math
+
+import pytest
+
+from ir2solve_nl2ir import json_to_model_ir
+from ir2solve_presolve import _canonical_row, fold_expr, presolve_ir
+
+ENV = {"x": 3.0, "y": 2.0, "a": 5.0}
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "(-2)**2 + 1*3",
+        "(1-3)**2",
+        "(2-4) ** y",
+        "2 ** (1-3)",
+        "x * (2-4)",
+        "a - (1-3)",
+        "-(2*3) + x",
+        "x / (1-5) + 2*3*x",
+    ],
+)
+def test_fold_expr_preserves_value(expr):
+    folded, n = fold_expr(expr)
+    assert n > 0
+    assert math.isclose(eval(folded, {}, dict(ENV)), eval(expr, {}, dict(ENV)))
+
+
+def _ir(constraints, ub=None):
+    return json_to_model_ir(
+        {
+            "meta": {"problem_id": "t", "sense": "min"},
+            "sets": [{"name": "I", "elements": ["a", "b", "c"]}],
+            "params": [{"name": "cap", "indices": ["I"], "values": {"a": 4.0, "b": 4.0, "c": 4.0}}],
+            "vars": [
+                {"name": "x", "indices": ["I"], "vartype": "continuous", "lb": 0, "ub": ub},
+                {"name": "y", "indices": [], "vartype": "continuous", "lb": 0, "ub": None},
+            ],
+            "objective": {"name": "o", "sense": "min", "expr": "quicksum(x[i] for i in I) + y"},
+            "constraints": [
+                {"name": name, "expr_lhs": lhs, "sense": sense, "expr_rhs": rhs, "forall": forall}
+                for name, lhs, sense, rhs, forall in constraints
+            ],
+        }
+    )
+
+
+def test_canonical_row_normalizes_scale_and_sense():
+    base = _canonical_row({0: 1.0, 1: 2.0}, "<=", 4.0)
+    assert _canonical_row({1: 4.0, 0: 2.0}, "<=", 8.0) == base
+    assert _canonical_row({0: -1.0, 1: -2.0}, ">=", -4.0) == base
+    assert _canonical_row({0: 1.0, 1: 2.0}, ">=", 4.0) != base
+    assert _canonical_row({0: 1.0, 1: 2.0}, "<=", 5.0) != base
+
+
+def test_presolve_removes_duplicate_constraints():
+    ir = _ir(
+        [
+            ("c1", "x['a'] + 2*y", "<=", "4", None),
+            ("c2", "2*x['a'] + 4*y", "<=", "8", None),
+            ("c3", "-x['a'] - 2*y", ">=", "-4", None),
+            ("c4", "x['a'] + 2*y", ">=", "4", None),
+            ("r1", "x[i] + y", "<=", "cap[i]", [["i", "I"]]),
+            ("r2", "y + x[i]", "<=", "4", [["i", "I"]]),
+        ]
+    )
+    out, report = presolve_ir(ir)
+    assert report["ok"]
+    assert [c.name for c in out.constraints] == ["c1", "c4", "r1"]
+    assert {r["constraint"]: r["duplicate_of"] for r in report["removed_duplicate"]} == {
+        "c2": "c1",
+        "c3": "c1",
+        "r2": "r1",
+    }
+    assert len(ir.constraints) == 6  # the input IR is left alone
+
+
+def test_presolve_turns_single_var_rows_into_bounds():
+    ir = _ir(
+        [
+            ("ub", "x[i]", "<=", "cap[i]", [["i", "I"]]),
+            ("lb", "-2*x[i]", "<=", "-2", [["i", "I"]]),
+            ("partial", "x['a']", "<=", "1", None),
+            ("ylim", "3*y", "==", "6", None),
+        ]
+    )
+    out, report = presolve_ir(ir)
+    assert [c.name for c in out.constraints] == ["partial"]
+    x = next(v for v in out.vars if v.name == "x")
+    y = next(v for v in out.vars if v.name == "y")
+    assert (x.lb, x.ub) == (1.0, 4.0)
+    assert (y.lb, y.ub) == (2.0, 2.0)
+    assert {r["constraint"] for r in report["bounds_from_rows"]} == {"ub", "lb", "ylim"}
+
+
+def test_presolve_keeps_rows_that_contradict_the_declared_bounds():
+    out, report = presolve_ir(_ir([("ub", "x[i]", "<=", "-1", [["i", "I"]])]))
+    assert [c.name for c in out.constraints] == ["ub"]
+    assert report["bounds_from_rows"] == []
+
+
+def test_presolve_warns_once_per_ir():
+    ir = _ir(
+        [
+            ("q1", "x['a'] * x['b']", "<=", "1", None),
+            ("q2", "x['b'] * x['c']", "<=", "1", None),
+            ("ok", "x['a'] + y", "<=", "3", None),
+        ]
+    )
+    with pytest.warns(UserWarning) as rec:
+        out, report = presolve_ir(ir)
+    assert len(rec) == 1 and "q1, q2" in str(rec[0].message)
+    assert [s["constraint"] for s in report["skipped"]] == ["q1", "q2"]
+    assert len(out.constraints) == 3
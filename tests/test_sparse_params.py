@@ -0,0 +1,48 @@
+# tests/test_sparse_params.py
+
+from ir2solve_ir import DefaultParamDict, ParamDef, build_param_env
+
+SETS = {"I": ["a", "b", "c"], "J": ["x", "y"]}
+
+
+def _env(*params):
+    return build_param_env(list(params), SETS)
+
+
+def test_1d_sparse_param_index_and_get_use_default():
+    cap = _env(ParamDef(name="cap", indices=["I"], values={"a": 5.0}, default=2.0))["cap"]
+    assert isinstance(cap, DefaultParamDict)
+    assert cap["a"] == 5.0 and cap["b"] == 2.0
+    assert cap.get("a") == 5.0
+    assert cap.get("b") == 2.0
+    assert cap.get("b", 99.0) == 2.0
+
+
+def test_1d_sparse_param_get_outside_domain():
+    cap = _env(ParamDef(name="cap", indices=["I"], values={"a": 5.0}, default=2.0))["cap"]
+    assert cap.get("zz") is None
+    assert cap.get("zz", 7.0) == 7.0
+
+
+def test_2d_sparse_param_get_uses_default():
+    c = _env(ParamDef(name="c", indices=["I", "J"], values={"a": {"x": 1.0}}, default=0.5))["c"]
+    assert c["a"]["x"] == 1.0
+    assert c["b"]["y"] == 0.5
+    assert c["a"].get("y") == 0.5
+    assert c.get("c").get("x") == 0.5
+
+
+def test_2d_int_param_reads_back_as_int():
+    dense = {i: {j: 3 for j in SETS["J"]} for i in SETS["I"]}
+    for values in (dense, {"a": {"y": 3}}):
+        p = _env(ParamDef(name="p", indices=["I", "J"], values=values))["p"]
+        assert type(p["a"]["y"]) is int
+        assert list(range(p["a"]["y"])) == [0, 1, 2]
+        assert type(p["a", "y"]) is int
+
+
+def test_2d_mixed_param_reads_back_as_float():
+    p = _env(ParamDef(name="p", indices=["I", "J"], values={"a": {"x": 1, "y": 2.5}}))["p"]
+    assert type(p["a"]["x"]) is float and p["a"]["y"] == 2.5
+    q = _env(ParamDef(name="q", indices=["I", "J"], values={"a": {"x": 1}}, default=0.5))["q"]
+    assert type(q["a"]["x"]) is float and q["b"]["y"] == 0.5